@@ -0,0 +1,138 @@
+"""Micro-benchmark for DataclassJson encoding/decoding.
+
+Compares the compiled per-class plans used by ``DataclassJson.asdict``/``_from_json`` with the reflective
+implementation they replaced (reproduced below as ``legacy_asdict``/``legacy_from_json``).
+
+Run with::
+
+    python benchmarks/bench_dataclass_json.py [--number N]
+"""
+
+import argparse
+import json
+import pathlib
+import tempfile
+import timeit
+from dataclasses import asdict
+from dataclasses import fields
+from dataclasses import is_dataclass
+from typing import get_args
+from typing import get_origin
+
+from agh.agh_data import Assignment
+from agh.agh_data import OutputSectionData
+from agh.agh_data import Submission
+from agh.agh_data import SubmissionFileData
+
+
+def legacy_asdict(obj):
+    """The ``DataclassJson.asdict`` implementation before per-class plans."""
+    restore_these = {}
+    for cur_field in fields(obj):
+        if hasattr(cur_field.type, "asdict"):
+            restore_these[cur_field.name] = getattr(obj, cur_field.name)
+            setattr(obj, cur_field.name, legacy_asdict(getattr(obj, cur_field.name)))
+        if cur_field.type is pathlib.Path and isinstance(getattr(obj, cur_field.name), pathlib.Path):
+            restore_these[cur_field.name] = getattr(obj, cur_field.name)
+            setattr(obj, cur_field.name, str(restore_these[cur_field.name]))
+        elif get_origin(cur_field.type) is list and get_args(cur_field.type)[0] is pathlib.Path:
+            restore_these[cur_field.name] = getattr(obj, cur_field.name)
+            setattr(obj, cur_field.name, [str(cur_val) for cur_val in restore_these[cur_field.name]])
+        elif get_origin(cur_field.type) is dict and hasattr(get_args(cur_field.type)[-1], "asdict"):
+            restore_these[cur_field.name] = getattr(obj, cur_field.name)
+            setattr(obj, cur_field.name, {k: legacy_asdict(v) for k, v in restore_these[cur_field.name].items()})
+    ret_val = asdict(obj)
+    for cur_key, cur_val in restore_these.items():
+        setattr(obj, cur_key, cur_val)
+    return ret_val
+
+
+def legacy_from_json(cls, data: dict):
+    """The ``DataclassJson._from_json`` implementation before per-class plans."""
+    for cur_field in fields(cls):
+        if hasattr(cur_field.type, "_from_json"):
+            data[cur_field.name] = legacy_from_json(cur_field.type, data[cur_field.name])
+        elif get_origin(cur_field.type) is list and hasattr(get_args(cur_field.type)[0], "_from_json"):
+            data[cur_field.name] = [legacy_from_json(get_args(cur_field.type)[0], p) for p in data[cur_field.name]]
+        elif get_origin(cur_field.type) is dict and hasattr(get_args(cur_field.type)[-1], "_from_json"):
+            data[cur_field.name] = {k: legacy_from_json(get_args(cur_field.type)[-1], p) for k, p in data[cur_field.name].items()}
+        elif is_dataclass(cur_field.type):
+            data[cur_field.name] = cur_field.type(**data[cur_field.name])
+        elif get_origin(cur_field.type) is list and is_dataclass(get_args(cur_field.type)[0]):
+            data[cur_field.name] = [get_args(cur_field.type)[0](**p) for p in data[cur_field.name]]
+        elif get_origin(cur_field.type) is dict and is_dataclass(get_args(cur_field.type)[-1]):
+            data[cur_field.name] = {k: get_args(cur_field.type)[-1](**p) for k, p in data[cur_field.name].items()}
+        elif cur_field.type is pathlib.Path:
+            data[cur_field.name] = pathlib.Path(data[cur_field.name])
+        elif cur_field.type is list[pathlib.Path]:
+            data[cur_field.name] = [pathlib.Path(p) for p in data[cur_field.name]]
+    return cls(**data)
+
+
+def make_assignment(base: pathlib.Path) -> Assignment:
+    assignment = Assignment(base, _name="bench")
+    for idx in range(10):
+        assignment.addRequiredFile(SubmissionFileData(path=pathlib.Path(f"req_{idx}.c"), description="A required file."))
+        assignment.addOptionalFile(SubmissionFileData(path=pathlib.Path(f"opt_{idx}.h")))
+    assignment.setMetadata("course", "info", value={"instructor": "someone", "credits": 3})
+    return assignment
+
+
+def make_submission(base: pathlib.Path) -> Submission:
+    sub_file = base / "bench.tar.gz"
+    sub_file.touch()
+    submission = Submission(submission_file=sub_file, evaluation_directory=base, anon_name="bench", original_name="bench.tar.gz")
+    for idx in range(20):
+        submission.setMetadata("TEST_INFO", f"test_{idx}", value={"passed": idx % 2 == 0, "duration": idx * 0.1})
+    return submission
+
+
+def make_section_tree(depth: int = 3, width: int = 4) -> OutputSectionData:
+    section = OutputSectionData(path=pathlib.Path(f"section_{depth}.md"), text="Some text. " * 10)
+    for idx in range(width):
+        section.included_files.append(SubmissionFileData(path=pathlib.Path(f"file_{depth}_{idx}.stdout")))
+    if depth > 0:
+        for _ in range(width):
+            section.included_sections.append(make_section_tree(depth - 1, width))
+    return section
+
+
+def bench(label: str, number: int, new_stmt, legacy_stmt):
+    new_time = timeit.timeit(new_stmt, number=number)
+    legacy_time = timeit.timeit(legacy_stmt, number=number)
+    print(
+        f"{label:<32} plan: {new_time * 1e6 / number:9.1f} us   legacy: {legacy_time * 1e6 / number:9.1f} us   x{legacy_time / new_time:5.2f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=2000, help="Iterations per measurement.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as td:
+        base = pathlib.Path(td)
+        assignment = make_assignment(base)
+        submission = make_submission(base)
+        section = make_section_tree()
+
+        for label, obj in (("Assignment", assignment), ("Submission", submission)):
+            encoded = json.dumps(obj.asdict())
+            bench(f"{label}.asdict", args.number, obj.asdict, lambda obj=obj: legacy_asdict(obj))
+            bench(
+                f"{label}._from_json",
+                args.number,
+                lambda obj=obj, encoded=encoded: type(obj)._from_json(json.loads(encoded)),
+                lambda obj=obj, encoded=encoded: legacy_from_json(type(obj), json.loads(encoded)),
+            )
+
+        # The legacy code can't decode nested sections (the forward reference isn't resolved) and leaves Paths inside
+        # ``included_files`` unconverted, so its section output isn't JSON ready. It is shown for reference only.
+        bench("OutputSectionData.asdict", max(1, args.number // 20), section.asdict, lambda: legacy_asdict(section))
+        encoded = json.dumps(section.asdict())
+        decode_time = timeit.timeit(lambda: OutputSectionData._from_json(json.loads(encoded)), number=max(1, args.number // 20))
+        print(f"{'OutputSectionData._from_json':<32} plan: {decode_time * 1e6 / max(1, args.number // 20):9.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,97 @@
+import contextlib
 import datetime
-import json
+import hashlib
+import multiprocessing
 import os
 import pathlib
+import stat
+import tarfile
+import zipfile
 from collections.abc import Callable
+from collections.abc import Container
 from collections.abc import Generator
-from dataclasses import asdict
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
 from dataclasses import dataclass
 from dataclasses import field
 from dataclasses import fields
 from dataclasses import is_dataclass
 from enum import IntEnum
+from functools import lru_cache
 from pathlib import Path
 from string import Template
+from types import UnionType
 from typing import Any
+from typing import ClassVar
 from typing import Literal
 from typing import Self
+from typing import Union
 from typing import get_args
 from typing import get_origin
+from typing import get_type_hints
 
 import agh.anonymizer as anonymizer
+import agh.archive as archive
+import agh.dir_snapshot as dir_snapshot
+import agh.file_copy as file_copy
+import agh.json_codec as json_codec
 
 DEFAULT_MAX_OUT_FILE_SIZE = 20 * 1024
 
+#: A path of keys into nested metadata dictionaries, see ``metadataKey``.
+MetadataKey = tuple[str, ...]
+
+
+@lru_cache(maxsize=4096)
+def metadataKey(*parts: str) -> MetadataKey:
+    """Build a key path for ``MetaDataclassJson.getMetadataPath``/``setMetadataPath``.
+
+    The parts are used as they are, so they may contain dots. The same tuple is returned for equal parts, so build
+    the key once (e.g. as a module constant) and reuse it in hot paths.
+
+    :param parts: The key at each level of the nested metadata, outermost first.
+    :raises ValueError: If there are no parts or one is empty.
+    """
+    if not parts or not all(isinstance(part, str) and part for part in parts):
+        raise ValueError(f"Metadata keys must be non-empty strings. key: {parts}")
+    return parts
+
+
+@lru_cache(maxsize=4096)
+def _splitMetadataKey(args: tuple[str, ...]) -> MetadataKey:
+    """Turn the arguments of the dot-separated string API (``getMetadata``/``setMetadata``) into a key path."""
+    metadata_key = ".".join(args)
+    try:
+        return metadataKey(*(key.strip() for key in metadata_key.strip().split(".")))
+    except ValueError:
+        raise ValueError("Cannot use metadata with empty key. key: " + metadata_key) from None
+
+
 META_INTERNAL_SUB_OUTPUT = "OUTPUT_INFO"
 
 META_INTERNAL_SUB_KEY = "SUBMISSION"
 
 META_AGH_INTERNAL_KEY = "AGH_INTERNAL"
-META_INTERNAL_SUB_KEYS = [META_AGH_INTERNAL_KEY, META_INTERNAL_SUB_KEY]
-META_INTERNAL_SUB_OUTPUT_COMPLETE = [META_AGH_INTERNAL_KEY, META_INTERNAL_SUB_KEY, META_INTERNAL_SUB_OUTPUT, "COMPLETED_OUTPUT"]
-META_INTERNAL_SUB_OUTPUT_GRADED = [META_AGH_INTERNAL_KEY, META_INTERNAL_SUB_KEY, META_INTERNAL_SUB_OUTPUT, "GRADED"]
-META_INTERNAL_SUB_OUTPUT_NON_ANON = [META_AGH_INTERNAL_KEY, META_INTERNAL_SUB_KEY, META_INTERNAL_SUB_OUTPUT, "NON_ANON"]
+META_INTERNAL_SUB_KEYS = metadataKey(META_AGH_INTERNAL_KEY, META_INTERNAL_SUB_KEY)
+META_INTERNAL_SUB_OUTPUT_COMPLETE = metadataKey(*META_INTERNAL_SUB_KEYS, META_INTERNAL_SUB_OUTPUT, "COMPLETED_OUTPUT")
+META_INTERNAL_SUB_OUTPUT_GRADED = metadataKey(*META_INTERNAL_SUB_KEYS, META_INTERNAL_SUB_OUTPUT, "GRADED")
+META_INTERNAL_SUB_OUTPUT_NON_ANON = metadataKey(*META_INTERNAL_SUB_KEYS, META_INTERNAL_SUB_OUTPUT, "NON_ANON")
+# The [size, mtime_ns] of each output file when it was copied to the graded directory, keyed by output file name.
+META_INTERNAL_SUB_OUTPUT_GRADED_SOURCE = metadataKey(*META_INTERNAL_SUB_KEYS, META_INTERNAL_SUB_OUTPUT, "GRADED_SOURCE")
+META_INTERNAL_SUB_ERRORS = metadataKey(*META_INTERNAL_SUB_KEYS, "errors")
+META_INTERNAL_SUB_WARNINGS = metadataKey(*META_INTERNAL_SUB_KEYS, "warnings")
+# SHA-256 of the submission file as submitted, see ``Assignment.storeSubmissionFile``.
+META_INTERNAL_SUB_SHA256 = metadataKey(*META_INTERNAL_SUB_KEYS, "sha256")
+# [size, mtime_ns] of each regular file extracted to the as submitted directory, keyed by path relative to it.
+META_INTERNAL_SUB_AS_SUBMITTED = metadataKey(*META_INTERNAL_SUB_KEYS, "as_submitted")
+# True while a submission added in triage mode still has archive members to extract.
+META_INTERNAL_SUB_EXTRACTION_DEFERRED = metadataKey(*META_INTERNAL_SUB_KEYS, "extraction_deferred")
+# Environment variable giving the pytest plugin the file descriptor to report a run's events on, see AghPtPlugin.
+PYTEST_EVENTS_FD_ENV = "AGH_EVENTS_FD"
+
+_ERR_WARN_KEYS = {"errors": META_INTERNAL_SUB_ERRORS, "warnings": META_INTERNAL_SUB_WARNINGS}
 
 _USER_DEFAULTS_FILE = Path.home() / ".config" / "agh" / ".agh_user_defaults.json"
 
@@ -51,6 +112,112 @@ def findFileInParents(path: pathlib.Path, filename: str) -> pathlib.Path | None:
     return None
 
 
+def _unwrap_optional(field_type: Any) -> Any:
+    """Returns ``X`` for an ``X | None`` type hint, any other type hint is returned unchanged."""
+    if get_origin(field_type) in (Union, UnionType):
+        non_none = [arg for arg in get_args(field_type) if arg is not type(None)]
+        if len(non_none) == 1:
+            return non_none[0]
+    return field_type
+
+
+def _json_value(val: Any) -> Any:
+    """Returns a JSON-ready copy of ``val``.
+
+    This is the fallback encoder for fields without a more specific type hint. Containers are copied so the result
+    never shares mutable state with the object being encoded.
+    """
+    if val is None or isinstance(val, (str, int, float)):
+        return val
+    if isinstance(val, dict):
+        return {key: _json_value(cur_val) for key, cur_val in val.items()}
+    if isinstance(val, (list, tuple)):
+        return [_json_value(cur_val) for cur_val in val]
+    if isinstance(val, DataclassJson):
+        return val.asdict()
+    if is_dataclass(val):
+        return {cur_field.name: _json_value(getattr(val, cur_field.name)) for cur_field in fields(val)}
+    if isinstance(val, pathlib.PurePath):
+        return str(val)
+    return val
+
+
+def _identity(val: Any) -> Any:
+    return val
+
+
+def _item_codec(item_type: Any) -> tuple[Callable[[Any], Any], Callable[[Any], Any] | None]:
+    """Returns the ``(encode, decode)`` functions for a single value of ``item_type``.
+    A ``None`` decoder means the JSON value is used as is."""
+    item_type = _unwrap_optional(item_type)
+    if not isinstance(item_type, type):
+        return _json_value, None
+    if item_type in (str, int, float, bool):
+        return _identity, None
+    if issubclass(item_type, DataclassJson):
+        return (lambda val: val.asdict()), item_type._from_json
+    if is_dataclass(item_type):
+        return _json_value, (lambda val: item_type(**val))
+    if issubclass(item_type, pathlib.PurePath):
+        return str, item_type
+    return _json_value, None
+
+
+def _field_codec(field_type: Any) -> tuple[Callable[[Any], Any], Callable[[Any], Any] | None]:
+    """Returns the ``(encode, decode)`` functions for a dataclass field, including single-level lists and dict values."""
+    field_type = _unwrap_optional(field_type)
+    origin = get_origin(field_type)
+    if origin is list or origin is dict:
+        args = get_args(field_type)
+        if not args:
+            return _json_value, None
+        encode, decode = _item_codec(args[-1])
+        if origin is list:
+            return (
+                lambda vals: [encode(val) for val in vals],
+                (lambda vals: [decode(val) for val in vals]) if decode else None,
+            )
+        return (
+            lambda vals: {key: encode(val) for key, val in vals.items()},
+            (lambda vals: {key: decode(val) for key, val in vals.items()}) if decode else None,
+        )
+    return _item_codec(field_type)
+
+
+def _none_safe(encode: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    if encode is _identity or encode is _json_value:
+        return encode
+    return lambda val: None if val is None else encode(val)
+
+
+@dataclass(frozen=True)
+class _JsonPlan:
+    """The compiled encode/decode steps for one DataclassJson subclass.
+
+    Every field has an encoder producing JSON-ready values, only fields that need converting have a decoder.
+    """
+
+    encoders: tuple[tuple[str, Callable[[Any], Any]], ...]
+    decoders: tuple[tuple[str, Callable[[Any], Any]], ...]
+    names: frozenset[str] = frozenset()
+
+    @classmethod
+    def build(cls, data_cls: type) -> "_JsonPlan":
+        try:
+            # Resolves string annotations such as ``list["OutputSectionData"]``.
+            hints = get_type_hints(data_cls)
+        except (NameError, TypeError):
+            hints = {}
+        encoders = []
+        decoders = []
+        for cur_field in fields(data_cls):
+            encode, decode = _field_codec(hints.get(cur_field.name, cur_field.type))
+            encoders.append((cur_field.name, _none_safe(encode)))
+            if decode is not None:
+                decoders.append((cur_field.name, decode))
+        return cls(encoders=tuple(encoders), decoders=tuple(decoders), names=frozenset(name for name, _ in encoders))
+
+
 class DataclassJson:
     """Parent class for dataclasses to serialize to JSON.
     This class should only be used as a parent class for dataclasses.
@@ -69,65 +236,54 @@ class DataclassJson:
         assert issubclass(self, DataclassJson), "This class should only be used as a parent class for dataclasses."
         assert is_dataclass(self), "This class should only be used as a parent class for dataclasses."
 
+    @classmethod
+    def _json_plan(cls) -> "_JsonPlan":
+        """Returns the compiled serialization plan for this class.
+
+        The plan is built from the dataclass fields and type hints the first time it is needed and then cached on the
+        class itself (subclasses get their own plan), so ``asdict``/``_from_json`` don't reflect on every call.
+        """
+        plan = cls.__dict__.get("_json_plan_cache")
+        if plan is None:
+            plan = _JsonPlan.build(cls)
+            cls._json_plan_cache = plan
+        return plan
+
     def asdict(self) -> dict[str, Any]:
-        restore_these: dict[str, Any] = {}
-        for cur_field in fields(self):
-            if hasattr(cur_field.type, "asdict"):
-                restore_these[cur_field.name] = getattr(self, cur_field.name)
-                setattr(self, cur_field.name, getattr(self, cur_field.name).asdict())
-            if cur_field.type is pathlib.Path and isinstance(getattr(self, cur_field.name), pathlib.Path):
-                restore_these[cur_field.name] = getattr(self, cur_field.name)
-                setattr(self, cur_field.name, str(restore_these[cur_field.name]))
-            elif get_origin(cur_field.type) is list and get_args(cur_field.type)[0] is pathlib.Path:
-                restore_these[cur_field.name] = getattr(self, cur_field.name)
-                setattr(self, cur_field.name, [str(cur_val) for cur_val in restore_these[cur_field.name]])
-            elif get_origin(cur_field.type) is dict and hasattr(get_args(cur_field.type)[-1], "asdict"):
-                restore_these[cur_field.name] = getattr(self, cur_field.name)
-                setattr(self, cur_field.name, {cur_key: cur_val.asdict() for cur_key, cur_val in restore_these[cur_field.name].items()})
-        # if len(restore_these) > 0:
-        #   print(self)
-        ret_val = asdict(self)
-        # if len(restore_these) > 0:
-        #   print(ret_val)
-
-        for cur_key, cur_val in restore_these.items():
-            setattr(self, cur_key, cur_val)
+        """Returns the object as a dictionary of JSON-ready values.
 
-        return ret_val
+        This is a single pass over the compiled plan; ``self`` is never modified so objects may be encoded from
+        several threads at once.
+        """
+        return {name: encode(getattr(self, name)) for name, encode in self._json_plan().encoders}
 
-    def save(self, filepath: pathlib.Path, indent: int = 2):
-        with filepath.open("w") as f:
-            data = self.asdict()
-            json.dump(data, f, indent=indent)
+    def save(self, filepath: pathlib.Path, indent: int | None = json_codec.HUMAN_INDENT):
+        """Save the object as JSON. The file is replaced atomically, so it is never left truncated.
+
+        :param filepath: The file to write.
+        :param indent: Indentation for the file, use ``json_codec.COMPACT`` for files that are only read by agh.
+        """
+        json_codec.dump_file(filepath, self.asdict(), indent=indent, atomic=True)
 
     @classmethod
     def _from_json(cls, data: dict):
-        for cur_field in fields(cls):
-            if hasattr(cur_field.type, "_from_json"):
-                data[cur_field.name] = cur_field.type._from_json(data[cur_field.name])
-            elif get_origin(cur_field.type) is list and hasattr(get_args(cur_field.type)[0], "_from_json"):
-                data[cur_field.name] = [get_args(cur_field.type)[0]._from_json(p) for p in data[cur_field.name]]
-            elif get_origin(cur_field.type) is dict and hasattr(get_args(cur_field.type)[-1], "_from_json"):
-                # print(data[cur_field.name])
-                data[cur_field.name] = {k: get_args(cur_field.type)[-1]._from_json(p) for k, p in data[cur_field.name].items()}
-            elif is_dataclass(cur_field.type):
-                data[cur_field.name] = cur_field.type(**data[cur_field.name])
-            elif get_origin(cur_field.type) is list and is_dataclass(get_args(cur_field.type)[0]):
-                data[cur_field.name] = [get_args(cur_field.type)[0](**p) for p in data[cur_field.name]]
-            elif get_origin(cur_field.type) is dict and is_dataclass(get_args(cur_field.type)[-1]):
-                data[cur_field.name] = {k: get_args(cur_field.type)[-1](**p) for k, p in data[cur_field.name].items()}
-            elif cur_field.type is pathlib.Path:
-                data[cur_field.name] = pathlib.Path(data[cur_field.name])
-            elif cur_field.type is list[pathlib.Path]:
-                data[cur_field.name] = [pathlib.Path(p) for p in data[cur_field.name]]
+        for name, decode in cls._json_plan().decoders:
+            cur_val = data.get(name)
+            if cur_val is not None:
+                data[name] = decode(cur_val)
         return cls(**data)
 
     @classmethod
-    def load_json(cls, filepath: pathlib.Path):
-        with filepath.open() as f:
-            data = json.load(f)
-            # Transform the data to the correct types.
-            return cls._from_json(data)
+    def load_json(cls, filepath: pathlib.Path, **extra_kwargs):
+        """Load an object from a JSON file.
+
+        :param filepath: The file to read.
+        :param extra_kwargs: Additional keyword arguments for the constructor that are not stored in the file.
+        """
+        data = json_codec.load_file(filepath)
+        data.update(extra_kwargs)
+        # Transform the data to the correct types.
+        return cls._from_json(data)
 
     @classmethod
     def load(cls, filepath: pathlib.Path):
@@ -252,79 +408,202 @@ class OutputSectionData(SubmissionFileData):
         return self
 
 
+def _unchanged(old_value: Any, new_value: Any) -> bool:
+    """True if setting ``new_value`` over ``old_value`` would not change anything.
+
+    Passing back the same container object is treated as a change since it was most likely modified in place.
+    """
+    if old_value is new_value:
+        return not isinstance(new_value, (dict, list))
+    return type(old_value) is type(new_value) and old_value == new_value
+
+
 @dataclass(kw_only=True)
 class MetaDataclassJson(DataclassJson):
-    """A mixin class that adds support for serializing dataclasses to JSON."""
+    """A mixin class that adds support for serializing dataclasses to JSON.
+
+    It also tracks changes since the object was last loaded or saved so that ``save`` can skip writing an unchanged
+    object back to the same file. Assigning a field or changing metadata through ``setMetadata`` is tracked
+    automatically, code that changes a field's contents in place (e.g. adding to a dict field) should call
+    ``markDirty``.
+    """
 
     _metadata: dict[str, Any] = field(default_factory=dict)
 
-    def _getMetadata(self, metadata_key: str, default: Any = None) -> dict[str, Any] | Any:
-        """Returns the metadata associated with the assignment.
-        If the key is not present in the metadata, it will return the default value.
+    def __setattr__(self, name: str, value: Any):
+        # Assigning back an equal value (e.g. an option set to what it already is) doesn't need a save.
+        changed = name not in self.__dict__ or not _unchanged(self.__dict__[name], value)
+        super().__setattr__(name, value)
+        if changed and name in self._json_plan().names:
+            self.markDirty(name)
+
+    def markDirty(self, field_name: str = "_metadata") -> Self:
+        """Record that a field changed so that the next ``save`` writes the object.
+
+        :param field_name: The field that changed.
+        :return: This object for chaining.
+        """
+        self.__dict__.setdefault("_dirty_fields", set()).add(field_name)
+        return self
+
+    def _markClean(self, filepath: pathlib.Path | None) -> None:
+        """Record that the object matches the contents of ``filepath``.
+        Nested objects are marked clean with no file since they are stored inside their parent's file."""
+        self.__dict__["_dirty_fields"] = set()
+        self.__dict__["_clean_file"] = filepath.absolute() if filepath is not None else None
+        for cur_val in self._nestedMetaObjects():
+            cur_val._markClean(None)
+
+    def _nestedMetaObjects(self) -> Generator["MetaDataclassJson"]:
+        for name in self._json_plan().names:
+            cur_val = getattr(self, name)
+            if isinstance(cur_val, MetaDataclassJson):
+                yield cur_val
+
+    @property
+    def is_dirty(self) -> bool:
+        """True if the object changed since it was last loaded or saved."""
+        if self.__dict__.get("_dirty_fields", True):
+            return True
+        return any(cur_val.is_dirty for cur_val in self._nestedMetaObjects())
+
+    def save(self, filepath: pathlib.Path | None = None, indent: int | None = json_codec.HUMAN_INDENT):
+        """Save the object as JSON, unless it is unchanged since it was last loaded from or saved to ``filepath``.
+
+        Inside a ``batch`` block the save is postponed until the block exits.
+
+        :param filepath: The file to write, defaults to the file the object was last loaded from or saved to.
+        :param indent: Indentation for the file, use ``json_codec.COMPACT`` for files that are only read by agh.
+        :raises ValueError: If no ``filepath`` is given and the object has never been loaded or saved.
+        """
+        if self._deferSave(filepath, indent=indent):
+            return
+        if filepath is None:
+            filepath = self.__dict__.get("_clean_file")
+            if filepath is None:
+                raise ValueError(f"No file to save {type(self).__name__} to.")
+        if not self.is_dirty and self.__dict__.get("_clean_file") == filepath.absolute() and filepath.exists():
+            return
+        super().save(filepath, indent=indent)
+        self._markClean(filepath)
+
+    @contextlib.contextmanager
+    def batch(self) -> Generator[Self]:
+        """Group several updates into a single save.
+
+        Inside the block ``save`` only records that a save was requested, so ``setMetadata``, ``addError``,
+        ``addWarning``, ``delError``, ``delWarning``, etc. just change the object in memory. When the outermost block
+        exits the object is saved once (with the arguments of the last requested save), or not at all if nothing
+        changed. Blocks can be nested.
+
+        Ex: ``with submission.batch(): submission.delWarning("a").delError("b").addWarning("c", "...")``
+        """
+        depth = self.__dict__.get("_batch_depth", 0)
+        self.__dict__["_batch_depth"] = depth + 1
+        try:
+            yield self
+        finally:
+            self.__dict__["_batch_depth"] = depth
+            if depth == 0:
+                save_args, save_kwargs = self.__dict__.pop("_batch_save", ((), {}))
+                if self.is_dirty:
+                    self.save(*save_args, **save_kwargs)
+
+    def _deferSave(self, *args, **kwargs) -> bool:
+        """Record a save requested inside a ``batch`` block.
+        :return: True if the save was deferred and the caller should not save now."""
+        if not self.__dict__.get("_batch_depth"):
+            return False
+        self.__dict__["_batch_save"] = (args, kwargs)
+        return True
+
+    @classmethod
+    def load_json(cls, filepath: pathlib.Path, **extra_kwargs):
+        ret_val = super().load_json(filepath, **extra_kwargs)
+        ret_val._markClean(filepath)
+        return ret_val
+
+    def getMetadataPath(self, metadata_key: MetadataKey, default: Any = None) -> dict[str, Any] | Any:
+        """Returns the metadata at ``metadata_key``, or ``default`` if it isn't present.
 
-        :param metadata_key: This should be a dot-separated string.
-            E.g. 'course.name.short' would get the following:
-            {'course': {'name': {'short': `value`}}} creating sub-dictionaries as necessary,
-            while also preserving existing keys at each level.
+        :param metadata_key: A key path from ``metadataKey``. E.g. ``metadataKey('course', 'name', 'short')`` would get
+            ``value`` from ``{'course': {'name': {'short': value}}}``.
         :param default: The default value to return if the key is not present in the metadata.
         :return: The value associated with the key, or the default value if the key is not present."""
         cur_metadata = self._metadata
-        for key in metadata_key.split("."):
-            if key in cur_metadata:
-                cur_metadata = cur_metadata[key]
-            else:
+        for key in metadata_key:
+            if not isinstance(cur_metadata, dict) or key not in cur_metadata:
                 return default
+            cur_metadata = cur_metadata[key]
         return cur_metadata
 
-    def getMetadata(self, *args, default: Any = None) -> dict[str, Any] | Any:
-        """Returns the metadata associated with the assignment.
-
-        If the key is not present in the metadata, it will return the default value.
-        :param args: This should be a series of strings.
-            E.g. ``getMetadata('course', 'name', 'short', default)`` would get the following:
-            ``{'course': {'name': {'short': value or default}}}`` creating sub-dictionaries as necessary,
-            while also preserving existing keys at each level.
-        :param default: The default value to return if the key is not present in the metadata.
-        :return: The value associated with the key, or the default value if the key is not present."""
-        return self._getMetadata(".".join(args), default=default)
-
-    def _setMetadata(self, metadata_key: str, value: Any) -> Self:
-        """This sets the metadata associated with the assignment.
+    def setMetadataPath(self, metadata_key: MetadataKey, value: Any) -> Self:
+        """Sets the metadata at ``metadata_key``, creating sub-dictionaries as necessary while preserving existing keys
+        at each level.
 
-        :param metadata_key: This should be a dot-separated string.
-            E.g. 'course.name.short' would set successive keys in dictionaries
-            {'course': {'name': {'short': `value`}}} while also preserving existing keys at each level.
+        :param metadata_key: A key path from ``metadataKey``. E.g. ``metadataKey('course', 'name', 'short')`` would set
+            ``{'course': {'name': {'short': value}}}``.
         :param value: The value to set.
         :return: This object for chaining.
-            Ex: ``obj.setMetadata('key', 'value').setMetadata('key2', 'value2')``
-        :rtype: Self
+            Ex: ``obj.setMetadataPath(KEY_1, 'value').setMetadataPath(KEY_2, 'value2')``
         """
-        metadata_keys = [key.strip() for key in metadata_key.strip().split(".")]
-        if "" in metadata_keys:
-            raise ValueError("Cannot set metadata with empty key. key: " + metadata_key)
         cur_metadata: dict[str, dict | Any] = self._metadata
         # Loop down to the last level to set.
-        for key in metadata_keys[:-1]:
+        for key in metadata_key[:-1]:
             if key not in cur_metadata:
                 cur_metadata[key] = {}
             cur_metadata = cur_metadata[key]
-        cur_metadata[metadata_keys[-1]] = value
-        return self
+        last_key = metadata_key[-1]
+        if last_key in cur_metadata and _unchanged(cur_metadata[last_key], value):
+            return self
+        cur_metadata[last_key] = value
+        return self._metadataChanged(metadata_key, value)
 
-    def setMetadata(self, *args, value: Any) -> Self:
+    def _metadataChanged(self, metadata_key: MetadataKey, value: Any) -> Self:
+        """Called after ``setMetadataPath`` changed the value at ``metadata_key``. Subclasses can override this to
+        record the change in some other way."""
+        return self.markDirty("_metadata")
+
+    def getMetadata(self, *args, default: Any = None) -> dict[str, Any] | Any:
         """Returns the metadata associated with the assignment.
 
         If the key is not present in the metadata, it will return the default value.
-        :param args: This should be a series of strings.
-            E.g. ``setMetadata('course', 'name', 'short', default)`` would set the following:
-            ``{'course': {'name': {'short': value or default}}}`` creating sub-dictionaries as necessary,
-            while also preserving existing keys at each level.
+        :param args: This should be a series of strings, each may also be a dot-separated string.
+            E.g. ``getMetadata('course', 'name', 'short', default)`` or ``getMetadata('course.name.short', default)``
+            would get ``value or default`` from ``{'course': {'name': {'short': value}}}``.
+            Use ``getMetadataPath`` for keys that contain dots.
+        :param default: The default value to return if the key is not present in the metadata.
+        :return: The value associated with the key, or the default value if the key is not present."""
+        try:
+            metadata_key = _splitMetadataKey(args)
+        except ValueError:
+            return default
+        return self.getMetadataPath(metadata_key, default=default)
+
+    def setMetadata(self, *args, value: Any) -> Self:
+        """Sets the metadata associated with the assignment.
+
+        :param args: This should be a series of strings, each may also be a dot-separated string.
+            E.g. ``setMetadata('course', 'name', 'short', value=value)`` or ``setMetadata('course.name.short', value=value)``
+            would set ``{'course': {'name': {'short': value}}}`` creating sub-dictionaries as necessary,
+            while also preserving existing keys at each level. Use ``setMetadataPath`` for keys that contain dots.
         :param value: The value to set.
         :return: This object for chaining.
-            Ex: ``obj.setMetadata('key', 'value').setMetadata('key2', 'value2')``
+            Ex: ``obj.setMetadata('key', value='value').setMetadata('key2', value='value2')``
         :rtype: Self
         """
-        return self._setMetadata(".".join(args), value=value)
+        return self.setMetadataPath(_splitMetadataKey(args), value=value)
+
+
+def _mergeMetadata(defaults: dict[str, Any], overrides: dict[str, Any]) -> dict[str, Any]:
+    """Merge nested metadata dictionaries, values in ``overrides`` take precedence."""
+    merged = dict(defaults)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _mergeMetadata(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
 
 
 def _gen_prop_methods(parameter: str, default: Any):
@@ -367,19 +646,95 @@ class GraderOptions(MetaDataclassJson):
         *_gen_prop_methods("_general_editor_command", "subl $files"), doc="A command to open a submission file in a text editor."
     )
 
+    _journal_metadata: bool | None = None
+    journal_metadata = property(
+        *_gen_prop_methods("_journal_metadata", False),
+        doc="Append submission metadata changes made while testing to a journal instead of rewriting submission.json.",
+    )
+
+    _test_jobs: int | None = None
+    test_jobs = property(
+        *_gen_prop_methods("_test_jobs", None),
+        doc="How many submissions run, test, build and render work on at once. None for one per CPU.",
+    )
+
+    _pytest_pool: bool | None = None
+    pytest_pool = property(
+        *_gen_prop_methods("_pytest_pool", False),
+        doc="Run pytest in forks of a server that has already imported pytest and the agh plugin (see agh.pytest_pool).",
+    )
+
+    _pytest_single_session: bool | None = None
+    pytest_single_session = property(
+        *_gen_prop_methods("_pytest_single_session", False),
+        doc="Collect the tests once per pytest session and parametrize them over the submissions (one session per job), "
+        "instead of running pytest once per submission.",
+    )
+
+    _extract_max_bytes: int | None = None
+    extract_max_bytes = property(
+        *_gen_prop_methods("_extract_max_bytes", 512 * 1024 * 1024),
+        doc="The most bytes extracted from one submission archive. Larger members are skipped with a warning.",
+    )
+
+    _extract_max_members: int | None = None
+    extract_max_members = property(
+        *_gen_prop_methods("_extract_max_members", 10000),
+        doc="The most members extracted from one submission archive. Extraction stops there with a warning.",
+    )
+
+    _extract_max_ratio: float | None = None
+    extract_max_ratio = property(
+        *_gen_prop_methods("_extract_max_ratio", 100.0),
+        doc="The most bytes extracted per byte of submission archive, to stop zip bombs.",
+    )
+
+    _extract_ignore: list[str] | None = None
+    extract_ignore = property(
+        *_gen_prop_methods("_extract_ignore", [".git", ".svn", "__MACOSX"]),
+        doc="fnmatch patterns of archive paths not to extract. A pattern matching a directory skips everything in it.",
+    )
+
+    _extract_ignore_files: list[str] | None = None
+    extract_ignore_files = property(
+        *_gen_prop_methods("_extract_ignore_files", [".DS_Store", "*.o", "*.obj", "core", "core.[0-9]*"]),
+        doc="fnmatch patterns of file names not to extract (object files, core dumps...). Directories never match.",
+    )
+
     # This is a dictionary of metadata associated with the assignment.
     # _metadata: dict[str, Any] = field(default_factory=dict)
 
+    # The parsed user defaults shared by every GraderOptions in the process: ((path, mtime_ns, size), options).
+    _user_defaults_cache: ClassVar[tuple[tuple[pathlib.Path, int, int] | None, "GraderOptions"] | None] = None
+
+    def markDirty(self, field_name: str = "_metadata") -> Self:
+        # Any change to these options invalidates the merged view.
+        self.__dict__.pop("_merged", None)
+        return super().markDirty(field_name)
+
+    def _mergedView(self) -> dict[str, Any]:
+        """The values of these options merged with the user defaults and the built-in defaults.
+
+        Values are filled in as they are first looked up, the metadata is merged on first use. The view is rebuilt when
+        these options change (see ``markDirty``) or the user defaults file changes on disk.
+        """
+        user_defaults = self._cachedUserDefaults()
+        merged = self.__dict__.get("_merged")
+        if merged is None or merged["user_defaults"] is not user_defaults:
+            merged = {"user_defaults": user_defaults, "values": {}, "metadata": None}
+            self.__dict__["_merged"] = merged
+        return merged
+
     def _getValue(self, property, default):
         # This function should be used to construct the property getter.
-        if getattr(self, property) is not None:
-            return getattr(self, property)
-        else:
-            user_defaults = self.loadUserDefaults()
-            if getattr(user_defaults, property, default) is not None:
-                return getattr(user_defaults, property, default)
-            else:
-                return default
+        merged = self._mergedView()
+        values = merged["values"]
+        if property not in values:
+            value = getattr(self, property)
+            if value is None:
+                value = getattr(merged["user_defaults"], property, None)
+            values[property] = default if value is None else value
+        return values[property]
 
     def _setValue(self, property, value):
         # This function should be used to construct the property setter.
@@ -388,22 +743,30 @@ class GraderOptions(MetaDataclassJson):
     def _delValue(self, property):
         # This function should be used to construct the property deleter.
         delattr(self, property)
+        self.markDirty(property)
+
+    def extractionLimits(self) -> archive.ExtractionLimits:
+        """The limits to enforce extracting submission archives."""
+        return archive.ExtractionLimits(
+            max_bytes=self.extract_max_bytes,
+            max_members=self.extract_max_members,
+            max_ratio=self.extract_max_ratio,
+            ignore=tuple(self.extract_ignore),
+            ignore_files=tuple(self.extract_ignore_files),
+        )
 
-    def _getMetadata(self, metadata_key: str, default: Any = None) -> dict[str, Any]:
-        """Returns the metadata associated with the assignment.
-        If the key is not present in the metadata, it will return the default value."""
-        cur_metadata = self._metadata
-        user_defaults = self.loadUserDefaults()
-        user_metadata = user_defaults._metadata
-        for key in metadata_key.split("."):
-            user_metadata = user_metadata.get(key, {})
-            if key in cur_metadata:
-                cur_metadata = cur_metadata[key]
-            elif user_metadata:
-                cur_metadata = user_metadata
-            else:
+    def getMetadataPath(self, metadata_key: MetadataKey, default: Any = None) -> dict[str, Any] | Any:
+        """Returns the metadata associated with the assignment, falling back to the user defaults.
+        Nested dictionaries are merged, with the assignment's values taking precedence.
+        If the key is not present in either, it will return the default value."""
+        merged = self._mergedView()
+        if merged["metadata"] is None:
+            merged["metadata"] = _mergeMetadata(merged["user_defaults"]._metadata, self._metadata)
+        cur_metadata = merged["metadata"]
+        for key in metadata_key:
+            if not isinstance(cur_metadata, dict) or key not in cur_metadata:
                 return default
-
+            cur_metadata = cur_metadata[key]
         return cur_metadata
 
     # @property
@@ -425,17 +788,38 @@ class GraderOptions(MetaDataclassJson):
     def loadUserDefaults(cls):
         """This function loads the user defaults from the user's default configuration file.
 
-        :return: GraderOptions object with the loaded user defaults.
+        :return: A new GraderOptions object with the loaded user defaults, which can be changed and saved with
+            ``saveAsUserDefaults``.
         """
         user_defaults_file = _USER_DEFAULTS_FILE
-        user_defaults_file.parent.mkdir(parents=True, exist_ok=True)
         if user_defaults_file.exists():
             return cls.load_json(user_defaults_file)
         else:
             return cls()
 
+    @staticmethod
+    def _cachedUserDefaults() -> "GraderOptions":
+        """The user defaults used for option and metadata lookups.
+
+        The file is parsed once per process and again only when its modification time or size changes. The returned
+        object is shared and must not be changed, use ``loadUserDefaults`` to edit the user defaults.
+        """
+        user_defaults_file = _USER_DEFAULTS_FILE
+        try:
+            stat = user_defaults_file.stat()
+            stamp = (user_defaults_file, stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            stamp = None
+        cached = GraderOptions._user_defaults_cache
+        if cached is None or cached[0] != stamp:
+            user_defaults = GraderOptions.load_json(user_defaults_file) if stamp is not None else GraderOptions()
+            cached = GraderOptions._user_defaults_cache = (stamp, user_defaults)
+        return cached[1]
+
     def saveAsUserDefaults(self):
+        _USER_DEFAULTS_FILE.parent.mkdir(parents=True, exist_ok=True)
         self.save(_USER_DEFAULTS_FILE)
+        GraderOptions._user_defaults_cache = None
 
     # def editTemplate(self) -> None:
     #     """Open the assignment's output template in the user's default editor."""
@@ -468,6 +852,57 @@ class AssignmentData(MetaDataclassJson):
     # metadata: dict[str, Any] = field(default_factory=dict)
 
 
+@dataclass(kw_only=True)
+class SubmissionIndexEntry(DataclassJson):
+    # The evaluation directory, relative to the assignment's evaluation directory.
+    evaluation_directory: pathlib.Path
+    # Modification time of the submission file when it was indexed.
+    mtime_ns: int
+    # SHA-256 of the submission file as submitted. None for submissions added before it was recorded.
+    sha256: str | None = None
+
+
+@dataclass(kw_only=True)
+class SubmissionIndex(DataclassJson):
+    """A manifest of an assignment's submissions (anon name -> evaluation directory).
+
+    It is kept up to date by ``Assignment.indexSubmission`` so the submissions can be listed without walking the
+    assignment tree. ``eval_dir_mtime_ns`` is the modification time of the evaluation directory when the index was
+    written, if the directory changed since (a submission directory was added, removed or renamed outside agh) the
+    index is stale and not used.
+    """
+
+    eval_dir_mtime_ns: int = 0
+    submissions: dict[str, SubmissionIndexEntry] = field(default_factory=dict)
+
+
+def _ingestSubmissionWorker(
+    assignment_directory: pathlib.Path,
+    submission_file: pathlib.Path,
+    override_anon: bool | None,
+    link_plan: list["LinkPlanItem"],
+    triage: bool,
+) -> tuple[pathlib.Path, list[str]]:
+    """Add one submission in a worker process for ``Assignment.AddSubmissions``.
+    :return: The new submission's evaluation directory and the warnings raised while adding it."""
+    warnings = []
+    submission = Assignment.load(assignment_directory)._ingestSubmission(submission_file, override_anon, warnings.append, link_plan, triage)
+    return submission.evaluation_directory, warnings
+
+
+@dataclass(frozen=True)
+class LinkPlanItem:
+    """A link ``Assignment.PostProcessSubmission`` creates in an evaluation directory, see ``Assignment.linkPlan``."""
+
+    # Name of the link in the evaluation directory.
+    name: str
+    # Absolute path the link points to.
+    target: pathlib.Path
+    is_dir: bool
+    # Only link if nothing with this name is in the evaluation directory (optional files the student may provide).
+    only_if_missing: bool = False
+
+
 class Assignment(AssignmentData):
     """Represents an assignment.
     At its core, an assignment is a collection of required files and optional files,
@@ -478,6 +913,11 @@ class Assignment(AssignmentData):
     """
 
     ASSIGNMENT_FILE_NAME = "assignment.json"
+    # Assignments loaded by this process: (class, absolute assignment file) -> ((mtime_ns, size), assignment).
+    _load_cache: ClassVar[dict[tuple[type, pathlib.Path], tuple[tuple[int, int], "Assignment"]]] = {}
+    # Stored in the submissions directory, next to (not in) the evaluation directory so writing it doesn't change the
+    # evaluation directory's modification time.
+    SUBMISSION_INDEX_FILE_NAME = "submission_index.json"
 
     def __init__(self, assignment_directory: pathlib.Path | None = None, *args, **kwargs):
         """Create a new Assignment object.
@@ -546,6 +986,7 @@ class Assignment(AssignmentData):
         self._directories.add(self._unprocessed_dir)
         self._eval_dir = input_dir / "evaluations/"
         self._directories.add(self._eval_dir)
+        self._submission_index_file = input_dir / self.SUBMISSION_INDEX_FILE_NAME
 
         # Output
         self._complete_eval_dir = output_dir / "as_rendered"
@@ -566,14 +1007,19 @@ class Assignment(AssignmentData):
         self._directories.add(self._tests_dir)
 
     @classmethod
-    def load(cls, filepath: pathlib.Path | None = None):
+    def load(cls, filepath: pathlib.Path | None = None, use_cache: bool = True):
         """Load an assignment from a JSON file or a directory.
 
         These objects are stored in JSON files in the same directory as the assignment.
         They are intended to be short lived and dynamically loaded from any sub-directory.
         Therefore, if you pass in a directory, this will look for the JSON file in that directory and it's parents.
 
+        Loaded assignments are cached for the life of the process, keyed by the assignment file's absolute path. The
+        cached object is returned while the file's modification time and size are unchanged and the object has no
+        unsaved changes, so callers loading the same assignment share one object.
+
         :param filepath: Path to the JSON file or directory containing the assignment data.
+        :param use_cache: Set to False to always read the file and get an object that isn't shared.
         :raises FileNotFoundError: If the file or directory does not exist.
         :return: The loaded assignment object.
         """
@@ -587,17 +1033,36 @@ class Assignment(AssignmentData):
             if filepath is None:
                 raise FileNotFoundError(f"Could not find assignment JSON file in {orig_filepath} or any of its parents.")
 
-        if filepath.exists() and filepath.is_file():
-            data = json.loads(filepath.read_text())
-            data["assignment_directory"] = filepath.parent
-            return cls._from_json(data)
+        if not use_cache:
+            if filepath.exists() and filepath.is_file():
+                return cls.load_json(filepath, assignment_directory=filepath.parent)
+            raise FileNotFoundError(filepath)
 
-        raise FileNotFoundError(filepath)
+        filepath = filepath.absolute()
+        try:
+            stat = filepath.stat()
+        except FileNotFoundError:
+            raise FileNotFoundError(filepath) from None
+        if not filepath.is_file():
+            raise FileNotFoundError(filepath)
+        cache_key = (cls, filepath)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        cached = Assignment._load_cache.get(cache_key)
+        if cached is not None and cached[0] == stamp and not cached[1].is_dirty:
+            return cached[1]
+        ret_val = cls.load_json(filepath, assignment_directory=filepath.parent)
+        Assignment._load_cache[cache_key] = (stamp, ret_val)
+        return ret_val
 
-    def save(self, filepath: pathlib.Path | None = None, indent: int = 2):
+    def save(self, filepath: pathlib.Path | None = None, indent: int | None = json_codec.HUMAN_INDENT):
         if filepath is None:
             filepath = self._do_file
         super().save(filepath, indent)
+        if not self.__dict__.get("_batch_depth"):
+            # What was just saved is what a later load would read, so keep using this object.
+            filepath = filepath.absolute()
+            stat = filepath.stat()
+            Assignment._load_cache[(type(self), filepath)] = ((stat.st_mtime_ns, stat.st_size), self)
 
     @property
     def archive_dir(self) -> pathlib.Path:
@@ -676,13 +1141,211 @@ class Assignment(AssignmentData):
 
     @property
     def Submissions(self):
-        for submission_file in self._directory.rglob(Submission.SUBMISSION_FILE_NAME):
+        for evaluation_directory in self.submissionDirectories():
+            submission_file = evaluation_directory / Submission.SUBMISSION_FILE_NAME
             try:
-                yield Submission.load(submission_file)
+                yield Submission.load(submission_file, assignment=self)
             except Exception as e:
                 print(f"Error loading submission file {submission_file}: {e}")
                 continue
 
+    def load_submissions(
+        self, evaluation_directories: Iterable[pathlib.Path] | None = None, max_workers: int | None = None
+    ) -> tuple[list["Submission"], dict[pathlib.Path, Exception]]:
+        """Load submissions on a thread pool so that their file reads overlap.
+
+        :param evaluation_directories: The submissions to load (evaluation directories or submission files), defaults
+            to all the submissions of the assignment (see ``submissionDirectories``).
+        :param max_workers: The maximum number of threads, ``None`` uses the ``ThreadPoolExecutor`` default.
+        :return: The loaded submissions in the order of ``evaluation_directories``, and the errors for the ones that
+            couldn't be loaded keyed by their entry in ``evaluation_directories``.
+        """
+        if evaluation_directories is None:
+            evaluation_directories = self.submissionDirectories()
+        evaluation_directories = list(evaluation_directories)
+
+        def load(evaluation_directory: pathlib.Path) -> "Submission | Exception":
+            try:
+                return Submission.load(evaluation_directory, assignment=self)
+            except Exception as e:
+                return e
+
+        if len(evaluation_directories) <= 1 or max_workers == 1:
+            results = [load(cur_dir) for cur_dir in evaluation_directories]
+        else:
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agh-load") as executor:
+                results = list(executor.map(load, evaluation_directories))
+
+        submissions = []
+        errors = {}
+        for evaluation_directory, result in zip(evaluation_directories, results, strict=True):
+            if isinstance(result, Exception):
+                errors[evaluation_directory] = result
+            else:
+                submissions.append(result)
+        return submissions, errors
+
+    def submissionDirectories(self) -> list[pathlib.Path]:
+        """The evaluation directories of all the submissions, sorted by name.
+
+        These come from the submission index when it is up to date, otherwise from a scan of the evaluation directory
+        which then replaces the index.
+        """
+        index = self._loadSubmissionIndex()
+        if index is None:
+            index = self._scanSubmissions()
+            # Saved so the next call reads it. If this is the same clock tick as the change that made the index stale,
+            # _loadSubmissionIndex still won't trust it and the next call scans again. A read-only assignment (or no
+            # evaluation directory yet) just keeps scanning.
+            with contextlib.suppress(OSError):
+                self._saveSubmissionIndex(index)
+        return [self.eval_dir / entry.evaluation_directory for _, entry in sorted(index.submissions.items())]
+
+    def indexSubmission(self, submission: "Submission") -> Self:
+        """Add (or update) a submission in the submission index.
+        If the index is missing or stale it is rebuilt from the evaluation directory instead."""
+        return self.indexSubmissions([submission])
+
+    def indexSubmissions(self, submissions: Iterable["Submission"]) -> Self:
+        """Add (or update) several submissions in the submission index, reading and writing it once.
+        If the index is missing or stale it is rebuilt from the evaluation directory instead."""
+        self._indexSubmissions(submissions, self._loadSubmissionIndex())
+        return self
+
+    def _indexSubmissions(self, submissions: Iterable["Submission"], index: SubmissionIndex | None) -> SubmissionIndex:
+        """Add ``submissions`` to ``index`` and save it.
+
+        :param index: The index as loaded before the submissions' evaluation directories were created (which makes the
+            index look stale), or None to rebuild the index.
+        :return: The saved index.
+        """
+        if index is None:
+            index = self._scanSubmissions()
+        for submission in submissions:
+            submission_file = submission.evaluation_directory / Submission.SUBMISSION_FILE_NAME
+            index.submissions[submission.anon_name] = SubmissionIndexEntry(
+                evaluation_directory=pathlib.Path(submission.evaluation_directory.name),
+                mtime_ns=submission_file.stat().st_mtime_ns,
+                sha256=submission.sha256,
+            )
+        self._saveSubmissionIndex(index)
+        return index
+
+    def _warnIdenticalSubmissions(
+        self, submissions: Iterable["Submission"], index: SubmissionIndex, warning_callback: Callable[[str], Any | None] | None
+    ):
+        """Report the ``submissions`` whose submission file is byte-identical to another indexed submission's."""
+        if warning_callback is None:
+            return
+        by_digest: dict[str, list[str]] = {}
+        for name, entry in index.submissions.items():
+            if entry.sha256 is not None:
+                by_digest.setdefault(entry.sha256, []).append(name)
+        for submission in submissions:
+            others = [name for name in by_digest.get(submission.sha256, []) if name != submission.anon_name]
+            if others:
+                warning_callback(f"{submission.name} submitted a file identical to {', '.join(sorted(others))}.")
+
+    def storeSubmissionFile(self, submission_file: pathlib.Path) -> tuple[pathlib.Path | None, str]:
+        """Add a submission file to the content-addressed store in ``archive_dir``.
+
+        Files are stored once per content, by SHA-256, so a resubmission or a byte-identical submission (starter code
+        only) shares the stored file. The caller hardlinks the stored file where it needs it.
+
+        :param submission_file: The file to store. It is left where it is.
+        :return: The stored file (None if the file system can't hardlink, then nothing is stored) and its SHA-256.
+        """
+        with submission_file.open("rb") as f:
+            sha256 = hashlib.file_digest(f, "sha256").hexdigest()
+        # Only the archive suffix, not the rest of the name, so identical files submitted under different names match.
+        stored = self.archive_dir / sha256[:2] / (sha256 + archive.archive_suffix(submission_file))
+        stored.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            # Linking fails if the content is already stored, even if another process stored it a moment ago.
+            stored.hardlink_to(submission_file)
+        except FileExistsError:
+            pass
+        except OSError:
+            return None, sha256
+        return stored, sha256
+
+    def reindexSubmissions(self) -> Self:
+        """Rebuild the submission index from the evaluation directory."""
+        self._saveSubmissionIndex(self._scanSubmissions())
+        return self
+
+    def _loadSubmissionIndex(self) -> SubmissionIndex | None:
+        """Returns the submission index, or None if it is missing, unreadable, or stale."""
+        try:
+            index_mtime_ns = self._submission_index_file.stat().st_mtime_ns
+            eval_dir_mtime_ns = self.eval_dir.stat().st_mtime_ns
+            # File times are only updated every clock tick. If the index was written in the same tick as the last
+            # change to the evaluation directory, a later change in that tick wouldn't show up, so don't trust it.
+            if index_mtime_ns <= eval_dir_mtime_ns:
+                return None
+            index = SubmissionIndex.load_json(self._submission_index_file)
+        except (OSError, ValueError, TypeError, KeyError):
+            return None
+        if index.eval_dir_mtime_ns != eval_dir_mtime_ns:
+            return None
+        return index
+
+    def _saveSubmissionIndex(self, index: SubmissionIndex):
+        index.eval_dir_mtime_ns = self.eval_dir.stat().st_mtime_ns
+        json_codec.dump_file(self._submission_index_file, index.asdict(), indent=json_codec.COMPACT, atomic=True)
+
+    def _scanSubmissions(self) -> SubmissionIndex:
+        """Build a submission index by scanning the evaluation directory.
+
+        Only its immediate sub-directories are checked, the submissions' own files are never walked. The SHA-256 of each
+        submission file is kept from the previous index if the submission is unchanged, otherwise it is read from the
+        submission's metadata, so identical submissions are still reported after a rescan.
+        """
+        index = SubmissionIndex()
+        try:
+            previous = SubmissionIndex.load_json(self._submission_index_file).submissions
+        except (OSError, ValueError, TypeError, KeyError):
+            previous = {}
+        try:
+            with os.scandir(self.eval_dir) as entries:
+                for entry in entries:
+                    if entry.name.startswith(".") or not entry.is_dir(follow_symlinks=False):
+                        continue
+                    try:
+                        submission_stat = (pathlib.Path(entry.path) / Submission.SUBMISSION_FILE_NAME).stat()
+                    except OSError:
+                        continue
+                    evaluation_directory = pathlib.Path(entry.name)
+                    old_entry = previous.get(entry.name)
+                    if (
+                        old_entry is not None
+                        and old_entry.sha256 is not None
+                        and old_entry.evaluation_directory == evaluation_directory
+                        and old_entry.mtime_ns == submission_stat.st_mtime_ns
+                    ):
+                        sha256 = old_entry.sha256
+                    else:
+                        sha256 = self._readSubmissionSha256(pathlib.Path(entry.path) / Submission.SUBMISSION_FILE_NAME)
+                    index.submissions[entry.name] = SubmissionIndexEntry(
+                        evaluation_directory=evaluation_directory, mtime_ns=submission_stat.st_mtime_ns, sha256=sha256
+                    )
+        except FileNotFoundError:
+            pass
+        return index
+
+    @staticmethod
+    def _readSubmissionSha256(submission_file: pathlib.Path) -> str | None:
+        """The ``META_INTERNAL_SUB_SHA256`` stored in ``submission_file``, read without loading the submission."""
+        try:
+            value = json_codec.load_file(submission_file).get("_metadata")
+        except (OSError, ValueError, AttributeError):
+            return None
+        for key in META_INTERNAL_SUB_SHA256:
+            if not isinstance(value, dict):
+                return None
+            value = value.get(key)
+        return value if isinstance(value, str) else None
+
     class LinkProto(IntEnum):
         # Raise an error if the file exists.
         RAISE_ERROR = 0
@@ -691,80 +1354,130 @@ class Assignment(AssignmentData):
         # Overwrite the existing file if it already exists.
         LINK_OVERWRITE = 2
 
+    def linkPlan(self) -> list[LinkPlanItem]:
+        """Work out the links ``PostProcessSubmission`` creates in each evaluation directory.
+
+        The plan only depends on the assignment, so compute it once and pass it to ``PostProcessSubmission`` (or
+        ``AddSubmission``) when processing many submissions.
+        """
+
+        def plan_item(link_item: pathlib.Path, only_if_missing: bool = False) -> LinkPlanItem:
+            name = link_item.name
+            # Handle if the target is also a symlink, link to what it points to.
+            if link_item.is_symlink():
+                link_item = link_item.parent / link_item.readlink()
+            return LinkPlanItem(name=name, target=link_item.absolute(), is_dir=link_item.is_dir(), only_if_missing=only_if_missing)
+
+        # link in the tests.
+        plan = [plan_item(self.tests_dir)]
+        with os.scandir(self.link_template_dir) as entries:
+            plan.extend(plan_item(pathlib.Path(entry.path)) for entry in entries)
+        for link_item in self._optional_files.values():
+            if link_item.copy_to_sub_if_missing:
+                ret_path = link_item.path
+                if not ret_path.exists():
+                    ret_path = self.link_template_dir / link_item.path.name
+                plan.append(plan_item(ret_path, only_if_missing=True))
+        return plan
+
     def PostProcessSubmission(
         self,
         submission_file: "pathlib.Path|Submission",
         exists_protocol: LinkProto = LinkProto.RAISE_ERROR,
-        warning_callback: Callable[[str], None | Any] | None = None,
+        warning_callback: Callable[[str], Any | None] | None = None,
+        link_plan: list[LinkPlanItem] | None = None,
     ) -> "Submission":
+        """Link the assignment's tests and templates into a submission's evaluation directory and set up its output.
+
+        :param submission_file: The submission, or the path to load it from.
+        :param exists_protocol: What to do when something other than the planned link is in the way.
+        :param warning_callback: A callback function to be called when a warning is encountered.
+        :param link_plan: The result of ``linkPlan``, computed here if not given.
+        :return: The submission.
+        """
         ret_val: Submission = submission_file
         if isinstance(submission_file, pathlib.Path):
-            ret_val = Submission.load(filepath=submission_file)
-
-        # link in the tests.
-
-        def all_linked_files() -> Generator[Path]:
-            """Internal generator to get all the files to be linked."""
-            yield self.tests_dir
-            for link_item in self.link_template_dir.iterdir():
-                yield link_item
-            for link_item in self._optional_files.values():
-                if link_item.copy_to_sub_if_missing and not (ret_val.evaluation_directory / link_item.path.name).exists():
-                    ret_path = link_item.path
-                    if not ret_path.exists():
-                        ret_path = self.link_template_dir / link_item.path.name
-                    yield ret_path
-
-        for link_item in all_linked_files():
-            link_tgt = ret_val.evaluation_directory / link_item.name
-
-            # Handle if the target is also a symlink
-            if link_item.is_symlink():
-                link_item = link_item.readlink()
+            ret_val = Submission.load(filepath=submission_file, assignment=self)
+        if link_plan is None:
+            link_plan = self.linkPlan()
+
+        # What is in the evaluation directory: a DirEntry from the scan, or the target of a link created below.
+        current: dict[str, os.DirEntry | str] = {}
+        with os.scandir(ret_val.evaluation_directory) as entries:
+            for entry in entries:
+                current[entry.name] = entry
+
+        def current_link_target(name: str) -> str | None:
+            cur_val = current[name]
+            if isinstance(cur_val, str):
+                return cur_val
+            return str(pathlib.Path(cur_val.path).readlink()) if cur_val.is_symlink() else None
+
+        for item in link_plan:
+            link_tgt = ret_val.evaluation_directory / item.name
+            target = str(item.target)
 
             # Depending on the protocol handle if there is already an existing link.
-            if link_tgt.exists(follow_symlinks=False):
-                # Handle if the link exists but is pointing to the correct target already - continue.
-                if link_tgt.is_symlink() and link_tgt.readlink() == link_item:
-                    link_tgt.unlink(missing_ok=True)
-                else:
-                    match exists_protocol:
-                        case self.LinkProto.RAISE_ERROR:
-                            raise FileExistsError(link_tgt)
-                        case self.LinkProto.SKIP_FILE:
-                            continue
-                        case self.LinkProto.LINK_OVERWRITE:
-                            link_tgt.unlink(missing_ok=True)
-                        case _:
-                            raise NotImplementedError("New existing link protocol added, but code not added")
-
-            link_tgt.symlink_to(link_item.absolute(), target_is_directory=link_item.is_dir())
+            if item.name in current:
+                # The link exists and is pointing to the correct target already.
+                if current_link_target(item.name) == target:
+                    continue
+                if item.only_if_missing:
+                    continue
+                match exists_protocol:
+                    case self.LinkProto.RAISE_ERROR:
+                        raise FileExistsError(link_tgt)
+                    case self.LinkProto.SKIP_FILE:
+                        continue
+                    case self.LinkProto.LINK_OVERWRITE:
+                        link_tgt.unlink(missing_ok=True)
+                    case _:
+                        raise NotImplementedError("New existing link protocol added, but code not added")
+
+            link_tgt.symlink_to(target, target_is_directory=item.is_dir)
+            current[item.name] = target
 
         # Now start linking the output stuff together.
         return self.postProcessSubmissionRender(ret_val, warning_callback=warning_callback)
 
     def postProcessSubmissionRender(
-        self, submission: "Submission", warning_callback: Callable[[str], None | Any] | None = None
+        self, submission: "Submission", warning_callback: Callable[[str], Any | None] | None = None
     ) -> "Submission":
         for output_file in self._options.output_files:
             output_in_sub_dir = submission.evaluation_directory / output_file
             output_file = self.complete_eval_dir / (submission.evaluation_directory.name + output_in_sub_dir.suffix)
-            submission.setMetadata(*META_INTERNAL_SUB_OUTPUT_COMPLETE, value=str(output_file))
+            submission.setMetadataPath(META_INTERNAL_SUB_OUTPUT_COMPLETE, value=str(output_file))
             output_not_anon = self.d2l_named_dir / (submission.original_name + output_in_sub_dir.suffix)
-            submission.setMetadata(*META_INTERNAL_SUB_OUTPUT_NON_ANON, value=str(output_not_anon))
+            submission.setMetadataPath(META_INTERNAL_SUB_OUTPUT_NON_ANON, value=str(output_not_anon))
             output_graded = self.graded_output_dir / output_file.name
-            submission.setMetadata(*META_INTERNAL_SUB_OUTPUT_GRADED, value=str(output_graded))
+            submission.setMetadataPath(META_INTERNAL_SUB_OUTPUT_GRADED, value=str(output_graded))
+            source_key = metadataKey(*META_INTERNAL_SUB_OUTPUT_GRADED_SOURCE, output_in_sub_dir.name)
             try:
                 # Copy output_in_sub_dir to output_graded if needed
-                if (not output_graded.exists()) or (
-                    output_graded.exists() and output_graded.stat().st_ctime_ns == output_graded.stat().st_mtime_ns
+                source_stat = output_in_sub_dir.stat()
+                source_fingerprint = [source_stat.st_size, source_stat.st_mtime_ns]
+                try:
+                    graded_stat = output_graded.stat()
+                except FileNotFoundError:
+                    graded_stat = None
+                # The copy is made with ctime == mtime, once it is edited they differ.
+                graded_unmodified = graded_stat is None or graded_stat.st_ctime_ns == graded_stat.st_mtime_ns
+                if (
+                    graded_stat is not None
+                    and graded_unmodified
+                    and graded_stat.st_size == source_stat.st_size
+                    and submission.getMetadataPath(source_key) == source_fingerprint
                 ):
+                    # The graded copy was made from the current output already.
+                    pass
+                elif graded_unmodified:
                     output_graded.parent.mkdir(parents=True, exist_ok=True)
 
                     #  This is to ensure that ctime == mtime!
                     output_graded.unlink(missing_ok=True)
 
-                    output_graded.write_bytes(output_in_sub_dir.read_bytes())
+                    file_copy.copy_file(output_in_sub_dir, output_graded)
+                    submission.setMetadataPath(source_key, value=source_fingerprint)
                 elif warning_callback is not None:
                     warning_callback(
                         f'The graded output file "{output_graded}" already exists and appears modified. '
@@ -773,11 +1486,10 @@ class Assignment(AssignmentData):
                     # stats = output_graded.stat()
                     # warning_callback(f'The graded output file info a:{stats.st_atime_ns}, c: {stats.st_ctime_ns},
                     # m: {stats.st_mtime_ns}.')
-
-                output_file.unlink(missing_ok=True)
-                output_not_anon.unlink(missing_ok=True)
             except FileNotFoundError:
                 pass
+            output_file.unlink(missing_ok=True)
+            output_not_anon.unlink(missing_ok=True)
             # Create symbolic links
             output_file.symlink_to(
                 output_in_sub_dir.relative_to(output_file.parent, walk_up=True), target_is_directory=output_file.is_dir()
@@ -791,7 +1503,12 @@ class Assignment(AssignmentData):
         return submission
 
     def AddSubmission(
-        self, submission_file: pathlib.Path, override_anon: bool | None = None, warning_callback: Callable[[str], None | Any] | None = None
+        self,
+        submission_file: pathlib.Path,
+        override_anon: bool | None = None,
+        warning_callback: Callable[[str], Any | None] | None = None,
+        link_plan: list[LinkPlanItem] | None = None,
+        triage: bool = False,
     ) -> "Submission":
         """Add a new submission to the assignment.
         :param submission_file: The path to the submission file to add.
@@ -799,12 +1516,108 @@ class Assignment(AssignmentData):
         If True then make it anonymous even if assignment is default non-anonymous.
         If False then make it non-anonymous even if assignment is default anonymous.
         :param warning_callback: A callback function to be called when a warning is encountered.
+        :param link_plan: The result of ``linkPlan``, pass it when adding many submissions.
+        :param triage: Only extract the required and optional files from an archive now, the rest when the submission
+            is fixed or first built (see ``Submission.extractDeferred``).
         :return: The new submission.
         :rtype: "Submission"
         """
-        ret_val = Submission.new(self, submission_file=submission_file, override_anon=override_anon)
+        index = self._loadSubmissionIndex()
+        ret_val = self._ingestSubmission(submission_file, override_anon, warning_callback, link_plan, triage)
+        self._warnIdenticalSubmissions([ret_val], self._indexSubmissions([ret_val], index), warning_callback)
+        return ret_val
+
+    def AddSubmissions(
+        self,
+        submission_files: Iterable[pathlib.Path],
+        override_anon: bool | None = None,
+        jobs: int | None = None,
+        warning_callback: Callable[[str], Any | None] | None = None,
+        progress_callback: Callable[[pathlib.Path, "Submission | Exception"], Any | None] | None = None,
+        triage: bool = False,
+    ) -> tuple[list["Submission"], dict[pathlib.Path, Exception]]:
+        """Add many submissions, extracting and linking them in parallel worker processes.
+
+        Each worker only touches its own submission's evaluation directory. The assignment level state (the submission
+        index) is updated once here after all the workers finish. A submission that fails doesn't stop the others.
+
+        :param submission_files: The paths to the submission files to add.
+        :param override_anon: See ``AddSubmission``.
+        :param jobs: The number of worker processes, ``None`` for one per CPU. With one job (or one file) the
+            submissions are added in this process.
+        :param warning_callback: A callback function to be called when a warning is encountered.
+        :param progress_callback: Called with the submission file and the new submission (or the exception raised
+            while adding it) as each one finishes.
+        :param triage: See ``AddSubmission``.
+        :return: The added submissions in the order of ``submission_files``, and the errors for the ones that couldn't
+            be added keyed by submission file.
+        """
+        submission_files = list(submission_files)
+        index = self._loadSubmissionIndex()
+        link_plan = self.linkPlan()
+        results: dict[pathlib.Path, Submission | Exception] = {}
+
+        def finished(submission_file: pathlib.Path, result: "Submission | Exception"):
+            results[submission_file] = result
+            if progress_callback is not None:
+                progress_callback(submission_file, result)
+
+        if jobs is None:
+            jobs = os.cpu_count() or 1
+        jobs = min(jobs, len(submission_files))
+        if jobs <= 1:
+            for submission_file in submission_files:
+                try:
+                    result = self._ingestSubmission(submission_file, override_anon, warning_callback, link_plan, triage)
+                except Exception as e:
+                    result = e
+                finished(submission_file, result)
+        else:
+            # The workers load the assignment from its file.
+            self.save()
+            with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("spawn")) as executor:
+                futures = {
+                    executor.submit(
+                        _ingestSubmissionWorker, self.root_directory, submission_file, override_anon, link_plan, triage
+                    ): submission_file
+                    for submission_file in submission_files
+                }
+                for future in as_completed(futures):
+                    try:
+                        evaluation_directory, warnings = future.result()
+                        if warning_callback is not None:
+                            for warning in warnings:
+                                warning_callback(warning)
+                        result = Submission.load(evaluation_directory / Submission.SUBMISSION_FILE_NAME, assignment=self)
+                    except Exception as e:
+                        result = e
+                    finished(futures[future], result)
+
+        submissions = []
+        errors = {}
+        for submission_file in submission_files:
+            result = results[submission_file]
+            if isinstance(result, Exception):
+                errors[submission_file] = result
+            else:
+                submissions.append(result)
+        self._warnIdenticalSubmissions(submissions, self._indexSubmissions(submissions, index), warning_callback)
+        return submissions, errors
+
+    def _ingestSubmission(
+        self,
+        submission_file: pathlib.Path,
+        override_anon: bool | None,
+        warning_callback: Callable[[str], Any | None] | None,
+        link_plan: list[LinkPlanItem] | None,
+        triage: bool = False,
+    ) -> "Submission":
+        """Create, save and link a new submission, everything ``AddSubmission`` does except updating the index."""
+        ret_val = Submission.new(self, submission_file=submission_file, override_anon=override_anon, triage=triage)
         ret_val.save()
-        return self.PostProcessSubmission(ret_val, exists_protocol=self.LinkProto.RAISE_ERROR, warning_callback=warning_callback)
+        return self.PostProcessSubmission(
+            ret_val, exists_protocol=self.LinkProto.RAISE_ERROR, warning_callback=warning_callback, link_plan=link_plan
+        ).save()
 
     # def __pytest_cmd(self):
     #     return "pytest ./ -p shell-utilities -p agh"
@@ -840,6 +1653,7 @@ class Assignment(AssignmentData):
             This assignment object with the new required file added for chaining if desired.
         """
         self._required_files[str(new_file.path)] = new_file
+        self.markDirty("_required_files")
         return self
 
     @property
@@ -852,6 +1666,7 @@ class Assignment(AssignmentData):
         :param new_file: The new optional file to add.
         """
         self._optional_files[str(new_file.path)] = new_file
+        self.markDirty("_optional_files")
         return self
 
     @property
@@ -996,6 +1811,13 @@ class Submission(SubmissionData):
     SUBMISSION_FILE_NAME = "submission.json"
     AS_SUBMITTED_DIR_NAME = "as_submitted"
 
+    # Metadata changes are appended to this file (when journaling is enabled) instead of rewriting SUBMISSION_FILE_NAME.
+    JOURNAL_FILE_NAME = "submission.journal"
+    # Once the journal grows past this many bytes it is folded back into SUBMISSION_FILE_NAME.
+    JOURNAL_COMPACT_SIZE = 64 * 1024
+    # The output of the last pytest run on the submission, gzip compressed JSON (see agh.cli.RunOutputInfo).
+    RUN_LOG_FILE_NAME = "run_output.json.gz"
+
     # def __init__(self, compiled_initially=None, **kwargs):
     def __init__(self, **kwargs):
         """
@@ -1010,13 +1832,109 @@ class Submission(SubmissionData):
         super().__init__(**kwargs)
 
         self._as_submitted_dir = self.evaluation_directory / "as_submitted"
+        self._assignment: Assignment | None = None
 
         self.__post_init__()
 
+    @property
+    def assignment(self) -> Assignment:
+        """The assignment this submission belongs to.
+        Unless it was given when the submission was loaded or created, it is loaded from the evaluation directory."""
+        if self._assignment is None:
+            self._assignment = Assignment.load(self.evaluation_directory)
+        return self._assignment
+
+    @assignment.setter
+    def assignment(self, value: Assignment | None):
+        self._assignment = value
+
+    @property
+    def file(self) -> pathlib.Path:
+        """The JSON file this submission is stored in."""
+        return self.evaluation_directory / self.SUBMISSION_FILE_NAME
+
+    @property
+    def journal_file(self) -> pathlib.Path:
+        """The append-only metadata journal stored next to the submission file."""
+        return self.evaluation_directory / self.JOURNAL_FILE_NAME
+
+    @property
+    def run_log_file(self) -> pathlib.Path:
+        """The log of the last pytest run (agh run/test/build/render) on this submission."""
+        return self.evaluation_directory / self.RUN_LOG_FILE_NAME
+
+    def enableJournal(self, enabled: bool = True) -> Self:
+        """Turn the append-only metadata journal on or off for this object.
+
+        While enabled, metadata changes (``setMetadata`` and the error/warning helpers) are appended to
+        ``journal_file`` by ``save`` as small delta records instead of rewriting the whole submission file.
+        ``load`` replays the journal, and it is folded back into the submission file by ``compactJournal``, when it
+        grows past ``JOURNAL_COMPACT_SIZE``, or whenever anything other than metadata needs saving.
+
+        :param enabled: Whether to journal metadata changes.
+        :return: This object for chaining.
+        """
+        self.__dict__["_journal_enabled"] = enabled
+        return self
+
+    def _metadataChanged(self, metadata_key: MetadataKey, value: Any) -> Self:
+        if not self.__dict__.get("_journal_enabled", False):
+            return super()._metadataChanged(metadata_key, value)
+        self.__dict__.setdefault("_journal_pending", []).append({"set": metadata_key, "value": value})
+        return self
+
+    @property
+    def is_dirty(self) -> bool:
+        return super().is_dirty or bool(self.__dict__.get("_journal_pending"))
+
     def save(self) -> Self:
-        super().save(self.evaluation_directory / self.SUBMISSION_FILE_NAME)
+        if self._deferSave():
+            return self
+        pending = self.__dict__.get("_journal_pending")
+        if pending and not super().is_dirty and self.__dict__.get("_clean_file") == self.file.absolute():
+            # Only metadata changed since the submission file was written, append the changes to the journal.
+            records = b"".join(json_codec.dumps(record, indent=json_codec.COMPACT) + b"\n" for record in pending)
+            with self.journal_file.open("ab") as f:
+                f.write(records)
+                journal_size = f.tell()
+            pending.clear()
+            if journal_size > self.JOURNAL_COMPACT_SIZE:
+                self.compactJournal()
+            return self
+
+        super().save(self.file)
+        self.__dict__.pop("_journal_pending", None)
+        # The submission file now holds everything, replaying an old journal over it would undo newer changes.
+        self.journal_file.unlink(missing_ok=True)
         return self
 
+    def compactJournal(self) -> Self:
+        """Fold the metadata journal back into the submission file and remove the journal.
+
+        The submission file is replaced atomically so a crash part way through leaves either the old file and journal
+        or the new file.
+        """
+        if not self.journal_file.exists() and not self.__dict__.get("_journal_pending"):
+            return self
+        json_codec.dump_file(self.file, self.asdict(), atomic=True)
+        self._markClean(self.file)
+        self.__dict__.pop("_journal_pending", None)
+        self.journal_file.unlink(missing_ok=True)
+        return self
+
+    def _replayJournal(self, journal_file: pathlib.Path) -> None:
+        """Apply the records in ``journal_file`` to the loaded metadata.
+        A torn record at the end (from a crash while appending) is ignored."""
+        for line in journal_file.read_bytes().splitlines():
+            try:
+                record = json_codec.loads(line)
+            except ValueError:
+                break
+            cur_metadata = self._metadata
+            for key in record["set"][:-1]:
+                cur_metadata = cur_metadata.setdefault(key, {})
+            cur_metadata[record["set"][-1]] = record["value"]
+
     @classmethod
     def get_anon_name(cls, assignment: Assignment, submission_file: pathlib.Path):
         """Generate an anonymous name for the submission.
@@ -1031,7 +1949,7 @@ class Submission(SubmissionData):
         return anonymizer.anonymize(submission_file.name, assignment.name, str(assignment.year), assignment.grade_period, assignment.course)
 
     @classmethod
-    def load(cls, filepath: pathlib.Path | None = None):
+    def load(cls, filepath: pathlib.Path | None = None, assignment: Assignment | None = None):
         """Load a submission from a JSON file or a directory.
 
         These objects are stored in JSON files in the same directory as the assignment.
@@ -1039,6 +1957,7 @@ class Submission(SubmissionData):
         Therefore, if you pass in a directory, this will look for the JSON file in that directory and it's parents.
 
         :param filepath: Path to the JSON file or directory containing the assignment data.
+        :param assignment: The assignment the submission belongs to, if the caller already has it loaded.
         :raises FileNotFoundError: If the file or directory does not exist.
         :return: The loaded assignment object.
         """
@@ -1053,17 +1972,22 @@ class Submission(SubmissionData):
                 raise FileNotFoundError(f"Could not find submission JSON file in {orig_filepath} or any of its parents.")
 
         if filepath.exists() and filepath.is_file():
-            data = json.loads(filepath.read_text())
-            return cls._from_json(data)
+            ret_val = cls.load_json(filepath)
+            ret_val.assignment = assignment
+            journal_file = filepath.parent / cls.JOURNAL_FILE_NAME
+            if journal_file.exists():
+                ret_val._replayJournal(journal_file)
+            return ret_val
 
         raise FileNotFoundError(filepath)
 
     @classmethod
-    def new(cls, assignment: Assignment, submission_file: pathlib.Path, override_anon: bool | None = None):
+    def new(cls, assignment: Assignment, submission_file: pathlib.Path, override_anon: bool | None = None, triage: bool = False):
         """
         _Submission.new: Create a brand-new submission from a submission file.
 
         Create a brand-new submission from a submission file.
+        With ``triage`` only the required and optional files are extracted from an archive, see ``__post_process_new__``.
         """
 
         # This is a brand-new submission. Create the evaluation directories and move the submission file there.
@@ -1099,8 +2023,14 @@ class Submission(SubmissionData):
         if base_file_name_set:
             my_submission_file = as_submitted_dir / (base_file_name + "".join(submission_file.suffixes))
 
-        # my_submission_file.symlink_to(submission_file)
-        submission_file.rename(my_submission_file)
+        # Keep one copy of each distinct submission file, hardlinked into each as submitted directory that has it.
+        stored, sha256 = assignment.storeSubmissionFile(submission_file)
+        if stored is None:
+            submission_file.rename(my_submission_file)
+        else:
+            my_submission_file.unlink(missing_ok=True)
+            my_submission_file.hardlink_to(stored)
+            submission_file.unlink()
 
         ret_val = cls(
             submission_file=my_submission_file,
@@ -1108,7 +2038,9 @@ class Submission(SubmissionData):
             anon_name=anon_name,
             original_name=submission_file.name,
         )
-        ret_val.__post_process_new__(assignment)
+        ret_val.assignment = assignment
+        ret_val.setMetadataPath(META_INTERNAL_SUB_SHA256, value=sha256)
+        ret_val.__post_process_new__(assignment, triage=triage)
         return ret_val
 
     def __post_init__(self):
@@ -1130,51 +2062,186 @@ class Submission(SubmissionData):
         """
         return self._as_submitted_dir
 
-    def fix(self, assignment: Assignment):
-        """Try to fix errors in the submission directory."""
-        self.__post_process_new__(assignment)
+    def fix(self, assignment: Assignment, index: bool = True):
+        """Try to fix errors in the submission directory.
+
+        If the submission file is unchanged (same SHA-256) only what is missing is restored, see ``_fixIncrementally``.
+        Otherwise the submission is post-processed again from scratch.
 
-    def __post_process_new__(self, assignment: Assignment, base_file_name: str | None = None):
+        :param index: Update the assignment's submission index. Fixing many submissions, pass False and index them all
+            at once with ``Assignment.indexSubmissions``.
+        """
+        if not self._fixIncrementally(assignment):
+            self.__post_process_new__(assignment)
+            with contextlib.suppress(OSError), self.submission_file.open("rb") as f:
+                self.setMetadataPath(META_INTERNAL_SUB_SHA256, value=hashlib.file_digest(f, "sha256").hexdigest())
+        self.save()
+        if index:
+            assignment.indexSubmission(self)
+
+    def _fixIncrementally(self, assignment: Assignment) -> bool:
+        """Restore the as submitted files that are missing or differ from when they were extracted (size or mtime),
+        and copy the required and optional files missing from the evaluation directory back.
+        Files the grader changed in the evaluation directory are left alone.
+
+        :return: False if it can't be done incrementally: no snapshot of the extracted files, the extraction was deferred,
+            or the submission file changed.
+        """
+        snapshot: dict[str, list[int]] | None = self.getMetadataPath(META_INTERNAL_SUB_AS_SUBMITTED)
+        if snapshot is None or self.sha256 is None or self.getMetadataPath(META_INTERNAL_SUB_EXTRACTION_DEFERRED, default=False):
+            return False
+        try:
+            with self.submission_file.open("rb") as f:
+                if hashlib.file_digest(f, "sha256").hexdigest() != self.sha256:
+                    return False
+        except OSError:
+            return False
+
+        stale = set()
+        for name, (size, mtime_ns) in snapshot.items():
+            try:
+                st = (self.as_submitted_dir / name).lstat()
+            except FileNotFoundError:
+                stale.add(name)
+                continue
+            if not stat.S_ISREG(st.st_mode) or st.st_size != size or st.st_mtime_ns != mtime_ns:
+                stale.add(name)
+        if stale:
+            self._extractSubmissionFile(assignment, only=stale)
+            for name in stale:
+                restored = self.as_submitted_dir / name
+                if restored.is_file():
+                    restored.chmod(0o400)
+
+        for name in assignment.required_files.keys() | assignment._optional_files.keys():
+            src = self.as_submitted_dir / name
+            dst = self.evaluation_directory / name
+            if src.is_file() and not dst.exists() and not dst.is_symlink():
+                file_copy.copy_file(src, dst)
+        return True
+
+    def __post_process_new__(self, assignment: Assignment, base_file_name: str | None = None, triage: bool = False):
         """Post-process a brand-new submission.
         This method should be overridden by subclasses to perform any post-processing required for brand-new
         submissions.
 
         **Subclasses should call the super method.**
+
+        :param triage: Only extract the assignment's required and optional files from an archive submission. The rest is
+            extracted by ``extractDeferred``, which ``fix`` and the first build run.
         """
-        if "tar" in self.submission_file.name:
-            # If it is a tar file, we need to untar it.
-            os.system(f'tar -xf "{self.submission_file.absolute()}" -C "{self.as_submitted_dir.absolute()}"')
-        elif "zip" in self.submission_file.name:
-            os.system(f'cd "{self.as_submitted_dir.absolute()}" && unzip "{self.submission_file.absolute()}"')
+        copy_names = assignment.required_files.keys() | assignment._optional_files.keys()
+        copied: set[str] = set()
+        if archive.archive_kind(self.submission_file) is not None:
+            # Extract in one pass, writing the required/optional files to the evaluation directory as they stream by.
+            copied = self._extractSubmissionFile(assignment, copy_names, only=copy_names if triage else None)
+            if triage or self.getMetadataPath(META_INTERNAL_SUB_EXTRACTION_DEFERRED, default=False):
+                self.setMetadataPath(META_INTERNAL_SUB_EXTRACTION_DEFERRED, value=triage)
         elif base_file_name is not None:
-            os.system(f'cp "{self.submission_file.absolute()}" "{self.evaluation_directory.absolute()}/{base_file_name}"')
+            dst = self.evaluation_directory / base_file_name
+            dst.unlink(missing_ok=True)
+            file_copy.copy_file(self.submission_file, dst)
 
-        self._missing_files_initially = self.check_missing_files(assignment)
+        snapshot = self.asSubmittedSnapshot()
+        self._missing_files_initially = self.check_missing_files(assignment, snapshot)
+        if self.initial_missing_files is None:
+            self.initial_missing_files = [f.name for f in self._missing_files_initially]
 
         # Make the submission file(s) private and readonly.
-        # Also copy them to the evaluation directory if they are part of the required files.
-        for f in self.as_submitted_dir.iterdir():
-            if f.name in assignment.required_files.keys() or f.name in assignment._optional_files.keys():
-                os.system(f'cp "{f.absolute()}" "{self.evaluation_directory.absolute()}"')
+        # Also copy them to the evaluation directory if they are part of the required files (and extraction didn't).
+        for name in snapshot.files:
+            f = self.as_submitted_dir / name
+            if name in copy_names and name not in copied:
+                dst = self.evaluation_directory / f.name
+                dst.unlink(missing_ok=True)
+                file_copy.copy_file(f, dst)
             f.chmod(0o400)
 
-    def check_missing_files(self, assignment: Assignment) -> list[Path]:
+    def extractDeferred(self, assignment: Assignment | None = None) -> bool:
+        """Finish extracting a submission added in triage mode (see ``__post_process_new__``), and save it.
+        The evaluation directory isn't touched, the required and optional files were copied there by the triage.
+
+        :param assignment: The assignment this submission belongs to, defaults to ``self.assignment``.
+        :return: True if there was anything left to extract.
+        """
+        if not self.getMetadataPath(META_INTERNAL_SUB_EXTRACTION_DEFERRED, default=False):
+            return False
+        self._extractSubmissionFile(assignment or self.assignment)
+        self.setMetadataPath(META_INTERNAL_SUB_EXTRACTION_DEFERRED, value=False)
+        for name in self.asSubmittedSnapshot().files:
+            (self.as_submitted_dir / name).chmod(0o400)
+        self.save()
+        return True
+
+    def _extractSubmissionFile(
+        self, assignment: Assignment, copy_names: Container[str] = (), only: Container[str] | None = None
+    ) -> set[str]:
+        """Extract the submission archive into the as submitted directory, recording problems as an error or warning.
+        See ``archive.extract`` for the parameters.
+        :return: The ``copy_names`` written to the evaluation directory."""
+        # Snapshot the extracted files for ``_fixIncrementally``, a partial extraction adds to the snapshot.
+        snapshot = {} if only is None else dict(self.getMetadataPath(META_INTERNAL_SUB_AS_SUBMITTED, default={}))
+        try:
+            report = archive.extract(
+                self.submission_file,
+                self.as_submitted_dir,
+                copy_names,
+                self.evaluation_directory,
+                limits=assignment._options.extractionLimits(),
+                only=only,
+            )
+        except (OSError, EOFError, tarfile.TarError, zipfile.BadZipFile) as e:
+            self._setErrWarnItem("errors", "extraction", f"Could not extract '{self.submission_file.name}': {e}")
+            self.setMetadataPath(META_INTERNAL_SUB_AS_SUBMITTED, value=None)
+            return set()
+
+        for name in report.extracted:
+            st = (self.as_submitted_dir / name).lstat()
+            if stat.S_ISREG(st.st_mode):
+                snapshot[name] = [st.st_size, st.st_mtime_ns]
+        self.setMetadataPath(META_INTERNAL_SUB_AS_SUBMITTED, value=snapshot)
+
+        self._delErrWarnItem("errors", "extraction")
+        if report.skipped or report.stopped:
+            skipped = "".join(f"\n* `{name}`: {reason}" for name, reason in report.skipped.items())
+            stopped = f"\n\n{report.stopped} The rest was not extracted." if report.stopped else ""
+            self._setErrWarnItem("warnings", "extraction", f"Some archive members were not extracted:{skipped}{stopped}")
+        else:
+            self._delErrWarnItem("warnings", "extraction")
+        return {name for name in report.extracted if name in copy_names}
+
+    def check_missing_files(self, assignment: Assignment, snapshot: dir_snapshot.DirSnapshot | None = None) -> list[Path]:
         """Check if the submission is missing required files.
         :param assignment: The assignment this submission belongs to.
+        :param snapshot: The ``asSubmittedSnapshot`` if the caller already has it.
         :return: A list of missing required file names, or an empty list if the submission is missing no required files.
         """
-        as_sub_files = [f.name for f in self.as_submitted_dir.iterdir()]
+        if snapshot is None:
+            snapshot = self.asSubmittedSnapshot()
         return [
             (self.as_submitted_dir / required_file)
             for required_file in assignment.required_files.keys()
-            if required_file not in as_sub_files
+            if required_file not in snapshot.names
         ]
 
+    def asSubmittedSnapshot(self) -> dir_snapshot.DirSnapshot:
+        """A snapshot of the as submitted directory's entries.
+        It is kept on this object and only retaken when the directory changes."""
+        snapshot = self.__dict__.get("_as_submitted_snapshot")
+        snapshot = dir_snapshot.DirSnapshot.take(self.as_submitted_dir) if snapshot is None else snapshot.current()
+        self.__dict__["_as_submitted_snapshot"] = snapshot
+        return snapshot
+
     @property
     def name(self):
         """The name of the submission."""
         return self.anon_name
 
+    @property
+    def sha256(self) -> str | None:
+        """The SHA-256 of the submission file as submitted, None for submissions added before it was recorded."""
+        return self.getMetadataPath(META_INTERNAL_SUB_SHA256)
+
     @property
     def main_output_files(self) -> list[Path | None]:
         """Return the submission's output files.
@@ -1183,16 +2250,15 @@ class Submission(SubmissionData):
         <output-file-with-anon-name-in-output-directory>, <output-file-with-anon-name-in-GRADED-output-directory>,
         <output-file-with-NON-anon-name-in-output-directory>]``
         """
-        assign = Assignment.load()
         rendered = None
-        for output_file in assign._options.output_files:
+        for output_file in self.assignment._options.output_files:
             output_file = self.evaluation_directory / output_file
             if output_file.exists():
                 rendered = output_file
 
-        main = self.getMetadata(*META_INTERNAL_SUB_OUTPUT_COMPLETE)
-        graded = self.getMetadata(*META_INTERNAL_SUB_OUTPUT_GRADED)
-        non_anon: None | str | Path = self.getMetadata(*META_INTERNAL_SUB_OUTPUT_NON_ANON)
+        main = self.getMetadataPath(META_INTERNAL_SUB_OUTPUT_COMPLETE)
+        graded = self.getMetadataPath(META_INTERNAL_SUB_OUTPUT_GRADED)
+        non_anon: str | Path | None = self.getMetadataPath(META_INTERNAL_SUB_OUTPUT_NON_ANON)
 
         if main is not None:
             main = Path(main)
@@ -1205,30 +2271,31 @@ class Submission(SubmissionData):
 
     # The next three methods have to do with getting, setting, and clearing errors or warnings.
     def _getErrWarnList(self, type: Literal["errors", "warnings"]) -> list[str]:
-        return list(self.getMetadata(*META_INTERNAL_SUB_KEYS, type, default={}).values())
+        return list(self.getMetadataPath(_ERR_WARN_KEYS[type], default={}).values())
 
     def _setErrWarnItem(self, type: Literal["errors", "warnings"], key: str, txt_or_markdown: str) -> Self:
-        keys = list(META_INTERNAL_SUB_KEYS)
-        keys.append(type)
-        keys.append(key)
-        return self.setMetadata(*keys, value=txt_or_markdown)
+        return self.setMetadataPath(metadataKey(*_ERR_WARN_KEYS[type], key), value=txt_or_markdown)
 
     def _delErrWarnItem(self, type: Literal["errors", "warnings"], key: str) -> Self:
-        exist_md_dict: dict[Any, Any] = self.getMetadata(*META_INTERNAL_SUB_KEYS, type, default={})
-        exist_md_dict.pop(key, None)
-        return self.setMetadata(*META_INTERNAL_SUB_KEYS, type, value=exist_md_dict)
+        exist_md_dict: dict[Any, Any] = self.getMetadataPath(_ERR_WARN_KEYS[type], default={})
+        if key not in exist_md_dict:
+            # Nothing to delete, don't mark the submission as changed.
+            return self
+        exist_md_dict.pop(key)
+        return self.setMetadataPath(_ERR_WARN_KEYS[type], value=exist_md_dict)
 
     @property
-    def errors(self) -> None | list[str]:
+    def errors(self) -> list[str] | None:
         """Check if the submission has errors.
         These are NOT testing errors, but anything preventing the submission from being tested.
         """
         errors: list[str] = self._getErrWarnList("errors")
-        if not self.as_submitted_dir.exists():
+        snapshot = self.asSubmittedSnapshot()
+        if not snapshot.exists:
             errors.append(f"Submission directory '{self.as_submitted_dir.absolute()}' does not exist.")
             return errors
 
-        missing_files = self.check_missing_files(Assignment.load())
+        missing_files = self.check_missing_files(self.assignment, snapshot)
         if len(missing_files) > 0:
             errors.append(f"Missing required file{'s' if len(missing_files) > 1 else ''}: {[mf.name for mf in missing_files]}")
 
@@ -1252,7 +2319,7 @@ class Submission(SubmissionData):
         return self._delErrWarnItem("errors", key).save()
 
     @property
-    def warnings(self) -> None | list[str]:
+    def warnings(self) -> list[str] | None:
         """Check if the submission has warnings.
         These are NOT testing warnings, but anything possibly preventing the submission from being tested.
         """
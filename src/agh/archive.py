@@ -0,0 +1,326 @@
+"""In-process extraction of submission archives.
+
+Archives are read with :mod:`tarfile` (any compression it supports) and :mod:`zipfile`, and each member is streamed
+straight to its place on disk. Top level files named in ``copy_names`` (an assignment's required and optional files)
+are written to a second directory from the same read, so they don't have to be copied afterwards.
+
+Member names are sanitized the same way for both formats: absolute paths, paths leaving the destination, and links
+pointing outside of it are skipped and reported, never extracted.
+
+``ExtractionLimits`` guards against hostile or broken archives (build outputs, core files, ``.git`` directories, zip
+bombs). The limits are checked while streaming, using the bytes actually written rather than the sizes the archive
+claims.
+"""
+
+import contextlib
+import fnmatch
+import os
+import pathlib
+import posixpath
+import shutil
+import stat
+import tarfile
+import time
+import zipfile
+from collections.abc import Container
+from collections.abc import Sequence
+from dataclasses import dataclass
+from dataclasses import field
+from typing import BinaryIO
+from typing import Literal
+
+_TAR_SUFFIXES = frozenset({".tar", ".tgz", ".tbz", ".tbz2", ".txz", ".tzst"})
+
+
+@dataclass(frozen=True)
+class ExtractionLimits:
+    """Limits enforced by ``extract``. None means no limit."""
+
+    # The most bytes written to the destination directory.
+    max_bytes: int | None = None
+    # The most archive members looked at; extraction stops after that.
+    max_members: int | None = None
+    # The most bytes written per byte of archive file.
+    max_ratio: float | None = None
+    # fnmatch patterns; members with any path component matching one are skipped.
+    ignore: Sequence[str] = ()
+    # fnmatch patterns; regular files whose base name matches one are skipped. Directories are never matched, so a
+    # pattern like "core" drops a core dump without dropping a "core/" source directory.
+    ignore_files: Sequence[str] = ()
+
+    def byteBudget(self, archive_size: int) -> tuple[int | None, str]:
+        """The most bytes that may be written extracting an archive of ``archive_size`` bytes, and the limit setting it."""
+        budget, reason = self.max_bytes, f"more than {self.max_bytes} bytes in total"
+        if self.max_ratio is not None:
+            ratio_budget = int(max(archive_size, 1) * self.max_ratio)
+            if budget is None or ratio_budget < budget:
+                budget, reason = ratio_budget, f"more than {self.max_ratio:g} times the archive size"
+        return budget, reason
+
+    def ignoredPrefix(self, name: str) -> str | None:
+        """The leading part of ``name`` up to the first ignored component, or None if ``name`` isn't ignored."""
+        parts = name.split("/")
+        for i, part in enumerate(parts):
+            if any(fnmatch.fnmatchcase(part, pattern) for pattern in self.ignore):
+                return "/".join(parts[: i + 1])
+        return None
+
+    def ignoredFile(self, name: str) -> bool:
+        """Whether the regular file ``name`` is skipped by ``ignore_files``."""
+        base_name = posixpath.basename(name)
+        return any(fnmatch.fnmatchcase(base_name, pattern) for pattern in self.ignore_files)
+
+
+class _LimitExceeded(Exception):
+    pass
+
+
+@dataclass
+class ExtractionReport:
+    """What ``extract`` did."""
+
+    # Names (archive paths) of the members that were extracted.
+    extracted: list[str] = field(default_factory=list)
+    # Names of the members that were not extracted, with the reason.
+    skipped: dict[str, str] = field(default_factory=dict)
+    # Uncompressed bytes written to the destination directory.
+    bytes_written: int = 0
+    # Why extraction stopped before the end of the archive, None if it didn't.
+    stopped: str | None = None
+    # Number of members left out because they weren't in ``only``.
+    deferred: int = 0
+
+
+def archive_kind(archive_file: pathlib.Path) -> Literal["tar", "zip"] | None:
+    """Returns the kind of archive ``archive_file`` is, going by its suffixes, or None if it isn't one."""
+    suffixes = [suffix.lower() for suffix in archive_file.suffixes]
+    if not suffixes:
+        return None
+    if ".tar" in suffixes or suffixes[-1] in _TAR_SUFFIXES:
+        return "tar"
+    if suffixes[-1] == ".zip":
+        return "zip"
+    return None
+
+
+def archive_suffix(archive_file: pathlib.Path) -> str:
+    """The suffix that identifies the kind of archive ``archive_file`` is (``.zip``, ``.tgz``, ``.tar.gz``...), lower
+    case, without the dotted parts of the name before it. Empty if it isn't an archive."""
+    kind = archive_kind(archive_file)
+    if kind is None:
+        return ""
+    last = archive_file.suffix.lower()
+    if kind == "zip" or last in _TAR_SUFFIXES:
+        return last
+    # A compressed tar, like ".tar.gz".
+    return ".tar" + last
+
+
+def extract(
+    archive_file: pathlib.Path,
+    dest_dir: pathlib.Path,
+    copy_names: Container[str] = (),
+    copy_dir: pathlib.Path | None = None,
+    limits: ExtractionLimits | None = None,
+    only: Container[str] | None = None,
+) -> ExtractionReport:
+    """Extract ``archive_file`` into ``dest_dir``.
+
+    Existing files are replaced, even read-only ones (they are unlinked first, never written through).
+
+    :param archive_file: A tar (optionally compressed) or zip archive, see ``archive_kind``.
+    :param dest_dir: The directory to extract into.
+    :param copy_names: Names of top level files to also write to ``copy_dir``.
+    :param copy_dir: Where to write the ``copy_names`` files.
+    :param limits: Limits to enforce. Members over a limit are skipped (and reported), partially written files removed.
+        Ignored paths are reported once, by their ignored prefix, ignored files by their name.
+    :param only: If given, extract just the members with these names and count the rest in ``report.deferred``.
+        Zip members are picked from the central directory without reading the others; a tar stream still has to be
+        read (decompressed) to the end, but nothing else is written.
+    :raises ValueError: If ``archive_file`` isn't an archive.
+    :raises tarfile.TarError, zipfile.BadZipFile: If the archive is corrupt.
+    :return: What was extracted and skipped.
+    """
+    kind = archive_kind(archive_file)
+    if kind is None:
+        raise ValueError(f"'{archive_file}' is not a tar or zip archive.")
+    dest_dir = dest_dir.absolute()
+    guard = _Guard(limits or ExtractionLimits(), archive_file.stat().st_size, ExtractionReport(), only)
+    if kind == "tar":
+        _extractTar(archive_file, dest_dir, copy_names, copy_dir, guard)
+    else:
+        _extractZip(archive_file, dest_dir, copy_names, copy_dir, guard)
+    return guard.report
+
+
+class _Guard:
+    """Applies ``ExtractionLimits`` to one extraction, recording what it skips in the report."""
+
+    def __init__(self, limits: ExtractionLimits, archive_size: int, report: ExtractionReport, only: Container[str] | None):
+        self.limits = limits
+        self.report = report
+        self.only = only
+        self.budget, self.budget_reason = limits.byteBudget(archive_size)
+        self.members_seen = 0
+
+    def admit(self, name: str) -> bool:
+        """Whether to extract member ``name``. Sets ``report.stopped`` when the member limit is reached."""
+        if self.only is not None and name not in self.only:
+            self.report.deferred += 1
+            return False
+        self.members_seen += 1
+        max_members = self.limits.max_members
+        if max_members is not None and self.members_seen > max_members:
+            self.report.stopped = f"The archive has more than {max_members} members."
+            return False
+        ignored = self.limits.ignoredPrefix(name)
+        if ignored is not None:
+            self.report.skipped[ignored] = "ignored"
+            return False
+        return True
+
+    def admitFile(self, name: str) -> bool:
+        """Whether to extract the regular file ``name``, once ``admit`` let it through."""
+        if self.limits.ignoredFile(name):
+            self.report.skipped[name] = "ignored"
+            return False
+        return True
+
+    def remaining(self) -> int | None:
+        return None if self.budget is None else self.budget - self.report.bytes_written
+
+    def write(self, name: str, src: BinaryIO, targets: list[pathlib.Path], mode: int, mtime: float | None) -> bool:
+        try:
+            self.report.bytes_written += _writeMember(src, targets, mode, mtime, self.remaining())
+        except _LimitExceeded:
+            self.report.skipped[name] = f"Extracting it would write {self.budget_reason}."
+            return False
+        return True
+
+
+def _targets(dest_dir: pathlib.Path, name: str, copy_names: Container[str], copy_dir: pathlib.Path | None) -> list[pathlib.Path]:
+    targets = [dest_dir / name]
+    if copy_dir is not None and "/" not in name and name in copy_names:
+        targets.append(copy_dir / name)
+    return targets
+
+
+def _writeMember(src: BinaryIO, targets: list[pathlib.Path], mode: int, mtime: float | None, limit: int | None = None) -> int:
+    """Stream ``src`` to each of ``targets``.
+
+    :raises _LimitExceeded: If ``src`` has more than ``limit`` bytes. The targets are removed.
+    :return: The number of bytes read from ``src``.
+    """
+    written = 0
+    with contextlib.ExitStack() as stack:
+        outs = []
+        for target in targets:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.unlink(missing_ok=True)
+            outs.append(stack.enter_context(target.open("wb")))
+        while chunk := src.read(shutil.COPY_BUFSIZE):
+            written += len(chunk)
+            if limit is not None and written > limit:
+                stack.close()
+                for target in targets:
+                    target.unlink(missing_ok=True)
+                raise _LimitExceeded
+            for out in outs:
+                out.write(chunk)
+    for target in targets:
+        target.chmod(mode)
+        if mtime is not None:
+            os.utime(target, (mtime, mtime))
+    return written
+
+
+def _memberName(name: str) -> str:
+    """``name`` without a leading ``./`` or trailing ``/``, as it will be found in the destination directory."""
+    return posixpath.normpath(name)
+
+
+def _extractTar(
+    archive_file: pathlib.Path, dest_dir: pathlib.Path, copy_names: Container[str], copy_dir: pathlib.Path | None, guard: _Guard
+):
+    report = guard.report
+    # Stream mode ("r|*") reads the archive front to back once.
+    with tarfile.open(archive_file, mode="r|*") as tar:
+        for member in tar:
+            name = _memberName(member.name)
+            if not guard.admit(name):
+                if report.stopped:
+                    break
+                continue
+            try:
+                safe_member = tarfile.data_filter(member, str(dest_dir))
+            except tarfile.FilterError as e:
+                report.skipped[member.name] = str(e)
+                continue
+            if safe_member is None:
+                report.skipped[member.name] = "filtered"
+                continue
+            # The filter makes absolute names relative.
+            name = _memberName(safe_member.name)
+
+            if safe_member.isfile():
+                if not guard.admitFile(name):
+                    continue
+                targets = _targets(dest_dir, name, copy_names, copy_dir)
+                with tar.extractfile(member) as src:
+                    if not guard.write(name, src, targets, safe_member.mode, safe_member.mtime):
+                        continue
+            elif safe_member.isdir() or safe_member.issym() or safe_member.islnk():
+                if not safe_member.isdir():
+                    (dest_dir / name).unlink(missing_ok=True)
+                try:
+                    tar.extract(member, dest_dir, filter="data")
+                except (tarfile.TarError, OSError) as e:
+                    report.skipped[member.name] = str(e)
+                    continue
+            else:
+                report.skipped[member.name] = "not a regular file, directory or link"
+                continue
+            report.extracted.append(name)
+
+
+def _extractZip(
+    archive_file: pathlib.Path, dest_dir: pathlib.Path, copy_names: Container[str], copy_dir: pathlib.Path | None, guard: _Guard
+):
+    report = guard.report
+    with zipfile.ZipFile(archive_file) as zf:
+        # The central directory lists every member, members not extracted are never read.
+        for info in zf.infolist():
+            name = _memberName(info.filename)
+            if not guard.admit(name):
+                if report.stopped:
+                    break
+                continue
+            parts = pathlib.PurePosixPath(name).parts
+            if not parts or info.filename.startswith("/") or ".." in parts or "\\" in name or ":" in parts[0]:
+                report.skipped[info.filename] = "path is absolute or outside the destination"
+                continue
+            unix_mode = info.external_attr >> 16
+            if info.is_dir():
+                (dest_dir / name).mkdir(parents=True, exist_ok=True)
+            elif stat.S_IFMT(unix_mode) and not stat.S_ISREG(unix_mode):
+                report.skipped[info.filename] = "not a regular file or directory"
+                continue
+            elif not guard.admitFile(name):
+                continue
+            else:
+                # Like the tar data filter: no special bits, no group/other write, the owner can always read/write.
+                mode = (stat.S_IMODE(unix_mode) & 0o755 | 0o600) if unix_mode else 0o644
+                targets = _targets(dest_dir, name, copy_names, copy_dir)
+                mtime = _zipMtime(info)
+                with zf.open(info) as src:
+                    if not guard.write(name, src, targets, mode, mtime):
+                        continue
+            report.extracted.append(name)
+
+
+def _zipMtime(info: zipfile.ZipInfo) -> float | None:
+    try:
+        # Zip times are local times.
+        return time.mktime((*info.date_time, 0, 0, -1))
+    except (ValueError, OverflowError):
+        return None
@@ -18,15 +18,24 @@ Why does this file exist, and why not put this in __main__?
 
 import argparse
 import asyncio
+import contextlib
 import datetime
 import functools
-import re
+import gzip
+import json
+import os
+import shlex
+import signal
 import sys
 from asyncio import CancelledError
+from collections.abc import AsyncIterator
+from collections.abc import Awaitable
+from collections.abc import Iterable
 from dataclasses import dataclass
 from dataclasses import field
 from pathlib import Path
 from typing import Literal
+from typing import TypeVar
 from urllib import parse
 
 import argcomplete
@@ -38,13 +47,19 @@ from rich_argparse import RichHelpFormatter
 from agh import Assignment
 from agh import Submission
 from agh import __version__
+from agh import json_codec
 from agh import main_console
+from agh import pytest_pool
+from agh.agh_data import PYTEST_EVENTS_FD_ENV
 from agh.agh_data import DataclassJson
 from agh.agh_data import GraderOptions
 from agh.agh_data import SubmissionFileData
+from agh.agh_data import metadataKey
 
 META_KEY_RUN_OUTPUT = "Execution output"
 
+T = TypeVar("T")
+
 console = main_console
 print = console.print
 
@@ -123,7 +138,8 @@ def SubFileCompleter(property: str, prefix: str, **kwargs):
 def submissionCompleter(*args, **kwargs):
     # return ['Bob','Tom']
     try:
-        ret_val = [str(subm.evaluation_directory.resolve().relative_to(Path.cwd(), walk_up=True)) for subm in Assignment.load().Submissions]
+        submissions, _ = Assignment.load().load_submissions()
+        ret_val = [str(subm.evaluation_directory.resolve().relative_to(Path.cwd(), walk_up=True)) for subm in submissions]
         return ret_val
     except Exception as e:
         argcomplete.warn("No assignment found. Cannot complete submission files.")
@@ -147,6 +163,13 @@ parser.add_argument(
     "from crashes. [b red u]THIS MUST BE CALLED WITH ROOT PERMISSIONS.[/b red u]Ex: `sudo agh -D`",
     default=False,
 )
+parser.add_argument(
+    "--reindex",
+    action="store_true",
+    dest="reindex",
+    help="Rebuild the submission index from the evaluation directory before running the command.",
+    default=False,
+)
 parser.add_argument(
     "--restore-default-core-location",
     action="store_true",
@@ -396,6 +419,22 @@ sub_add_subparser.add_argument(
     help="Override the assignment default and make this submission anonymous.",
     default=None,
 )
+sub_add_subparser.add_argument(
+    "-j",
+    "--jobs",
+    dest="jobs",
+    type=int,
+    help="Number of submissions to add in parallel (default: one per CPU).",
+    default=None,
+)
+sub_add_subparser.add_argument(
+    "-t",
+    "--triage",
+    dest="triage",
+    action="store_true",
+    help="Only extract the required and optional files now; the rest is extracted by 'fix' or the first build.",
+    default=False,
+)
 sub_add_subparser.add_argument(
     "-n",
     "--non-anonymous",
@@ -409,7 +448,8 @@ sub_add_subparser.add_argument(
 sub_fix_subparser = sub_subparsers.add_parser(
     "fix", help="Fix a submission. Try this if you accidentally deleted something. This may re-create links etc."
 )
-sub_fix_subparser.add_argument("submissions", nargs="+", help="Submissions to fix", type=str).completer = submissionCompleter
+sub_fix_subparser.add_argument("submissions", nargs="*", help="Submissions to fix", type=str).completer = submissionCompleter
+sub_fix_subparser.add_argument("-a", "--all", dest="all", action="store_true", help="Fix all submissions.", default=False)
 
 ################################################################################
 ################################################################################
@@ -422,6 +462,23 @@ run_parser.add_argument(
     "-s", "--submission", dest="submissions", nargs="+", help="Submissions to run (build, test, render).", type=Path, default=None
 ).completer = submissionCompleter
 run_parser.add_argument("-v", "--verbose", dest="verbose", action="store_true", help="Verbose output.", default=False)
+run_parser.add_argument(
+    "-j", "--jobs", dest="jobs", type=int, help="Number of submissions to work on at once (default: one per CPU).", default=None
+)
+run_parser.add_argument(
+    "--pool",
+    dest="pool",
+    action=argparse.BooleanOptionalAction,
+    help="Run pytest in forks of a pre-started server instead of a new process each time (default: the pytest_pool option).",
+    default=None,
+)
+run_parser.add_argument(
+    "--single-session",
+    dest="single_session",
+    action=argparse.BooleanOptionalAction,
+    help="Collect the tests once per job and run them on several submissions (default: the pytest_single_session option).",
+    default=None,
+)
 
 # Add test command
 test_parser = subparsers.add_parser("test", help="Test submission files. This just runs the tests for the given submissions.")
@@ -429,6 +486,23 @@ test_parser.add_argument(
     "-s", "--submission", dest="submissions", nargs="+", help="Submissions to run (build, test, render).", type=Path, default=None
 ).completer = submissionCompleter
 test_parser.add_argument("-v", "--verbose", dest="verbose", action="store_true", help="Verbose output.", default=False)
+test_parser.add_argument(
+    "-j", "--jobs", dest="jobs", type=int, help="Number of submissions to work on at once (default: one per CPU).", default=None
+)
+test_parser.add_argument(
+    "--pool",
+    dest="pool",
+    action=argparse.BooleanOptionalAction,
+    help="Run pytest in forks of a pre-started server instead of a new process each time (default: the pytest_pool option).",
+    default=None,
+)
+test_parser.add_argument(
+    "--single-session",
+    dest="single_session",
+    action=argparse.BooleanOptionalAction,
+    help="Collect the tests once per job and run them on several submissions (default: the pytest_single_session option).",
+    default=None,
+)
 
 # Add build command
 build_parser = subparsers.add_parser("build", help="Build submission files")
@@ -436,6 +510,23 @@ build_parser.add_argument(
     "-s", "--submission", dest="submissions", nargs="+", help="Submissions to run (build, test, render).", type=Path, default=None
 ).completer = submissionCompleter
 build_parser.add_argument("-v", "--verbose", dest="verbose", action="store_true", help="Verbose output.", default=False)
+build_parser.add_argument(
+    "-j", "--jobs", dest="jobs", type=int, help="Number of submissions to work on at once (default: one per CPU).", default=None
+)
+build_parser.add_argument(
+    "--pool",
+    dest="pool",
+    action=argparse.BooleanOptionalAction,
+    help="Run pytest in forks of a pre-started server instead of a new process each time (default: the pytest_pool option).",
+    default=None,
+)
+build_parser.add_argument(
+    "--single-session",
+    dest="single_session",
+    action=argparse.BooleanOptionalAction,
+    help="Collect the tests once per job and run them on several submissions (default: the pytest_single_session option).",
+    default=None,
+)
 
 # Add render command
 render_parser = subparsers.add_parser("render", help="Render submission files")
@@ -443,6 +534,23 @@ render_parser.add_argument(
     "-s", "--submission", dest="submissions", nargs="+", help="Submissions to run (build, test, render).", type=Path, default=None
 ).completer = submissionCompleter
 render_parser.add_argument("-v", "--verbose", dest="verbose", action="store_true", help="Verbose output.", default=False)
+render_parser.add_argument(
+    "-j", "--jobs", dest="jobs", type=int, help="Number of submissions to work on at once (default: one per CPU).", default=None
+)
+render_parser.add_argument(
+    "--pool",
+    dest="pool",
+    action=argparse.BooleanOptionalAction,
+    help="Run pytest in forks of a pre-started server instead of a new process each time (default: the pytest_pool option).",
+    default=None,
+)
+render_parser.add_argument(
+    "--single-session",
+    dest="single_session",
+    action=argparse.BooleanOptionalAction,
+    help="Collect the tests once per job and run them on several submissions (default: the pytest_single_session option).",
+    default=None,
+)
 
 argcomplete.autocomplete(parser)
 
@@ -476,8 +584,8 @@ def displayAssignmentInfo(cli_args: argparse.Namespace):
     assignment = Assignment.load()
     console.print(f'[label]Assignment "{assignment.name}"')
     console.print(f"[label]Course:[/] {assignment.course}, [label]Term:[/] {assignment._grade_period}, [label]Year:[/] {assignment.year}")
-    submissions = list(assignment.Submissions)
-    console.print(f"[label]Submissions:[/] {len(submissions)}")
+    submission_directories = assignment.submissionDirectories()
+    console.print(f"[label]Submissions:[/] {len(submission_directories)}")
     console.print(
         f"[label]Directories:[/] "
         f"{printableLinkWithIcon(assignment.root_directory, link_text='Root')} :diamonds: "
@@ -515,7 +623,18 @@ def displayAssignmentInfo(cli_args: argparse.Namespace):
     console.print(files_table)
 
     if cli_args.details:
+        submissions, load_errors = assignment.load_submissions(submission_directories)
         console.log(assignment, submissions)
+        printLoadErrors(load_errors)
+
+
+def printLoadErrors(load_errors: dict[Path, Exception]):
+    """Print the errors returned by ``Assignment.load_submissions``."""
+    for submission, error in load_errors.items():
+        if isinstance(error, FileNotFoundError):
+            console.print(f"[error]No submission found for {submission}")
+        else:
+            console.print(f"[error]Error loading submission {submission}: {error}")
 
 
 def displaySubmissionInfo(cli_args: argparse.Namespace, assignment: Assignment):
@@ -526,7 +645,8 @@ def displaySubmissionInfo(cli_args: argparse.Namespace, assignment: Assignment):
     submission_table.add_column("Name", justify="left")
     submission_table.add_column("Grading Output", justify="center")
 
-    for submission in assignment.Submissions:
+    submissions, load_errors = assignment.load_submissions()
+    for submission in submissions:
         # For warnings and errors build 'links' that are just text so that there is
         #  information when the user hovers over the link in the terminal.
         warnings = submission.warnings
@@ -577,6 +697,7 @@ def displaySubmissionInfo(cli_args: argparse.Namespace, assignment: Assignment):
         )
 
     console.print(submission_table)
+    printLoadErrors(load_errors)
 
 
 def getCurrentAssignment() -> Assignment:
@@ -654,34 +775,52 @@ def handleSubmissionCmd(cli_args: argparse.Namespace):
                 assignment = getCurrentAssignment()
                 console.print(f"Adding {len(cli_args.files)} submissions.")
                 # console.log(cli_args, style="error")
-                for cur_file in cli_args.files:
-                    console.print(f"Adding {cur_file}")
-                    try:
-                        assignment.AddSubmission(
-                            cur_file,
-                            override_anon=cli_args.override_anon,
-                            warning_callback=lambda warn: console.print(warn, style="warning"),
-                        ).save()
-                    except Exception as e:
-                        console.print(f"[error]Error adding submission '{cur_file}': {e}")
+                done_count = 0
+
+                def progress(cur_file: Path, result: Submission | Exception):
+                    nonlocal done_count
+                    done_count += 1
+                    if isinstance(result, Exception):
+                        console.print(f"[{done_count}/{len(cli_args.files)}] [error]Error adding submission '{cur_file}': {result}")
+                    else:
+                        console.print(f"[{done_count}/{len(cli_args.files)}] Added {cur_file} as {result.name}")
+
+                assignment.AddSubmissions(
+                    cli_args.files,
+                    override_anon=cli_args.override_anon,
+                    jobs=cli_args.jobs,
+                    warning_callback=lambda warn: console.print(warn, style="warning"),
+                    progress_callback=progress,
+                    triage=cli_args.triage,
+                )
                 assignment.save()
         case "fix":
+            if not cli_args.all and not cli_args.submissions:
+                sub_fix_subparser.error("give the submissions to fix, or -a/--all to fix them all")
             with console.status("Fixing submissions...", spinner="dots"):
                 console.print("Loading assignment.")
                 assignment = getCurrentAssignment()
+                if cli_args.all:
+                    cli_args.submissions = [cur_dir.name for cur_dir in assignment.submissionDirectories()]
                 console.print(f"Fixing {len(cli_args.submissions)} submissions.")
+                link_plan = assignment.linkPlan()
+                fixed = []
                 for cur_file in cli_args.submissions:
                     console.print(f"Fixing {cur_file}")
                     cur_subm_dir = assignment.eval_dir / cur_file
                     if not cur_subm_dir.exists():
                         console.print(f"[error]No submission directory found for {cur_file}.")
-                    cur_subm = Submission.load(cur_subm_dir)
-                    cur_subm.fix(assignment=assignment)
+                    cur_subm = Submission.load(cur_subm_dir, assignment=assignment)
+                    cur_subm.fix(assignment=assignment, index=False)
                     assignment.PostProcessSubmission(
                         cur_subm,
                         exists_protocol=assignment.LinkProto.SKIP_FILE,
                         warning_callback=lambda warn: console.print(warn, style="warning"),
+                        link_plan=link_plan,
                     ).save()
+                    fixed.append(cur_subm)
+                # One index update for all of them, not one per submission.
+                assignment.indexSubmissions(fixed)
         case _:
             console.log(cli_args, style="error")
 
@@ -694,6 +833,43 @@ class RunOutputInfo(DataclassJson):
     error: list[str] | None = field(default_factory=list)
     collected: int | None = None
     return_code: int | None = None
+    # The outcome of each test (see AghPtPlugin), by node id.
+    outcomes: dict[str, str] | None = field(default_factory=dict)
+    # The submission's agh warnings and errors, as the last test changing them left them.
+    agh_warnings: dict[str, str] | None = field(default_factory=dict)
+    agh_errors: dict[str, str] | None = field(default_factory=dict)
+
+    def writeLog(self, log_file: Path):
+        """Write to ``log_file`` as gzip compressed JSON."""
+        # Logs are written every run and seldom read, so compress fast rather than small.
+        json_codec.write_file(log_file, gzip.compress(json_codec.dumps(self.asdict(), indent=json_codec.COMPACT), compresslevel=1))
+
+    @classmethod
+    def readLog(cls, log_file: Path) -> "RunOutputInfo | None":
+        """Read a log written by ``writeLog``, None if there is none (or it can't be read)."""
+        try:
+            return cls._from_json(json_codec.loads(gzip.decompress(log_file.read_bytes())))
+        except (OSError, ValueError, EOFError):
+            return None
+
+
+@dataclass(kw_only=True)
+class RunOutputIndex(DataclassJson):
+    """What the assignment keeps of a submission's run, the output itself is in the run log (see ``RunOutputInfo``)."""
+
+    # The run log, relative to the evaluation directory.
+    log: str | None = None
+    collected: int | None = None
+    return_code: int | None = None
+    # How many tests had each outcome.
+    outcomes: dict[str, int] | None = field(default_factory=dict)
+
+    @classmethod
+    def of(cls, output_info: RunOutputInfo, log: str) -> "RunOutputIndex":
+        outcomes: dict[str, int] = {}
+        for outcome in output_info.outcomes.values():
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        return cls(log=log, collected=output_info.collected, return_code=output_info.return_code, outcomes=outcomes)
 
 
 def verbose_print(cli_args: argparse.Namespace, *args, **kwargs) -> None:
@@ -701,10 +877,106 @@ def verbose_print(cli_args: argparse.Namespace, *args, **kwargs) -> None:
         console.print(*args, **kwargs)
 
 
+async def start_pytest(
+    assignment: Assignment, pytest_args: list[str], pool: pytest_pool.ForkServer | None = None
+) -> tuple[asyncio.subprocess.Process | pytest_pool.PooledPytest, asyncio.StreamReader]:
+    """Start pytest in the assignment's evaluation directory, in its own session (process group).
+
+    :param pytest_args: The pytest arguments.
+    :param pool: Run pytest in this fork server instead of starting a new process.
+    :raises CancelledError: If cancelled before pytest is started, it is killed if it was already forked (asyncio does
+        that for a subprocess, ``ForkServer.run`` for a pooled run).
+    :return: The pytest process, and the stream of its ``AghPtPlugin`` events.
+    """
+    events_r, events_w = os.pipe()
+    try:
+        if pool is not None:
+            proc = await pool.run(pytest_args, cwd=assignment.eval_dir.absolute(), fd_env={PYTEST_EVENTS_FD_ENV: events_w})
+        else:
+            proc = await asyncio.create_subprocess_exec(
+                "pytest",
+                *pytest_args,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=assignment.eval_dir.absolute(),
+                start_new_session=True,
+                pass_fds=(events_w,),
+                env={**os.environ, PYTEST_EVENTS_FD_ENV: str(events_w)},
+            )
+    except BaseException:
+        os.close(events_r)
+        raise
+    finally:
+        # Only pytest has the write end now, so the events end when it exits.
+        os.close(events_w)
+    return proc, await pytest_pool.read_pipe(events_r)
+
+
 async def parse_pytest_output(
-    assignment: Assignment, submission: Submission, proc: asyncio.subprocess.Process, progress: rich.progress.Progress, task_id
-):
-    output_info = RunOutputInfo()
+    assignment: Assignment,
+    submissions: list[Submission],
+    proc: asyncio.subprocess.Process | pytest_pool.PooledPytest,
+    events: asyncio.StreamReader,
+    progress: rich.progress.Progress,
+    task_ids: dict[str, int],
+) -> dict[str, bool]:
+    """Follow a pytest run on one or more submissions (``--agh-submission``) until it exits, and record its output.
+
+    Each submission's output goes to its ``run_log_file``, with a ``RunOutputIndex`` entry in the assignment's metadata.
+    The assignment isn't saved, that is left to the caller.
+
+    Progress and results come from the ``AghPtPlugin`` events. An event for a test not parametrized over the
+    submissions counts for all of them. Stdout is only kept as a log: a line goes to the submission named by its
+    ``agh=<name>`` test id, else to the submission named last, or to all of them before any is named. Stderr goes to all.
+
+    :param submissions: The submissions tested by the run.
+    :param proc: The pytest process.
+    :param events: Its event stream, see ``start_pytest``.
+    :param task_ids: The progress task of each submission, by evaluation directory name.
+    :return: Whether each submission passed, by evaluation directory name.
+    """
+    outputs = {submission.evaluation_directory.absolute().name: RunOutputInfo() for submission in submissions}
+    # Longest first, so a submission "bob" doesn't claim the lines of "bob-2".
+    sub_ids = sorted(outputs, key=len, reverse=True)
+
+    def lineSubmission(line: str) -> str | None:
+        for sub_id in sub_ids:
+            if f"agh={sub_id}]" in line or f"agh={sub_id}-" in line:
+                return sub_id
+        return None
+
+    def eventSubmissions(event: dict) -> list[str]:
+        sub_id = event.get("submission")
+        return [sub_id] if sub_id in outputs else list(outputs)
+
+    async def event_collector():
+        while True:
+            line = await events.readline()
+            if not line:
+                break
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            match event.get("event"):
+                case "collected":
+                    per_submission = event.get("submissions", {})
+                    # Tests not parametrized over the submissions run once, but count for all of them.
+                    shared = event["count"] - sum(per_submission.values())
+                    for sub_id, output_info in outputs.items():
+                        output_info.collected = per_submission.get(sub_id, 0) + shared
+                        progress.update(task_ids[sub_id], total=output_info.collected)
+                case "start":
+                    for sub_id in eventSubmissions(event):
+                        progress.update(task_ids[sub_id], description=event["nodeid"])
+                case "finish":
+                    for sub_id in eventSubmissions(event):
+                        outputs[sub_id].outcomes[event["nodeid"]] = event["outcome"]
+                        progress.update(task_ids[sub_id], advance=1, description=f"{event['nodeid']} {event['outcome'].upper()}")
+                case "agh":
+                    for sub_id in eventSubmissions(event):
+                        outputs[sub_id].agh_warnings = event["warnings"]
+                        outputs[sub_id].agh_errors = event["errors"]
 
     async def error_collector():
         while True:
@@ -712,47 +984,88 @@ async def parse_pytest_output(
             if not error_line:
                 break
             error_line = error_line.decode().strip()
-            output_info.error.append(error_line)
-
-    err_coll_task = asyncio.create_task(error_collector(), name=f"{submission.name} error stream collector.")
-    while True:
-        line = await proc.stdout.readline()
-        if not line:
-            break
-        line = line.decode().strip()
-        output_info.output.append(line)
-        if "collecting ..." in line and "selected" in line:
-            match = re.search(r"collected \d+ items / \d+ deselected / (\d+) selected", line)
-            if match:
-                output_info.collected = int(match.group(1))
-                progress.update(
-                    task_id,
-                    total=output_info.collected,
-                    name=printableLinkWithIcon(submission.evaluation_directory, link_text=submission.name),
-                )
-        elif "collecting ..." in line:
-            match = re.search(r"collected (\d+) items", line)
-            if match:
-                output_info.collected = int(match.group(1))
-                progress.update(
-                    task_id,
-                    total=output_info.collected,
-                    name=printableLinkWithIcon(submission.evaluation_directory, link_text=submission.name),
-                )
-        elif " PASSED " in line or " FAILED " in line or " SKIPPED " in line:
-            progress.update(task_id, advance=1, name=printableLinkWithIcon(submission.evaluation_directory, link_text=submission.name))
-        elif line == "":
-            continue
-        progress.update(task_id, description=line, name=printableLinkWithIcon(submission.evaluation_directory, link_text=submission.name))
-    await proc.wait()
-    await err_coll_task
+            for output_info in outputs.values():
+                output_info.error.append(error_line)
 
-    output_info.return_code = proc.returncode
-
-    # Set the metadata for this run in the assignment.
-    assignment.setMetadata(META_KEY_RUN_OUTPUT, submission.name, value=output_info.asdict())
-    assignment.save()
-    return proc.returncode
+    event_task = asyncio.create_task(event_collector(), name="pytest event collector.")
+    err_coll_task = asyncio.create_task(error_collector(), name="pytest error stream collector.")
+    try:
+        current = None
+        while True:
+            line = await proc.stdout.readline()
+            if not line:
+                break
+            line = line.decode().strip()
+            current = lineSubmission(line) or current
+            for sub_id in [current] if current is not None else outputs:
+                outputs[sub_id].output.append(line)
+        await proc.wait()
+        await err_coll_task
+        await event_task
+    finally:
+        event_task.cancel()
+        err_coll_task.cancel()
+
+    failed = {sub_id for sub_id, output_info in outputs.items() if {"failed", "error"} & set(output_info.outcomes.values())}
+    passed = {}
+    for sub_id, output_info in outputs.items():
+        # Pytest failing only because of other submissions' tests is a pass.
+        passed[sub_id] = proc.returncode == 0 or (proc.returncode == 1 and bool(failed) and sub_id not in failed)
+        output_info.return_code = 0 if passed[sub_id] else (1 if proc.returncode in (0, 1) else proc.returncode)
+    for submission in submissions:
+        output_info = outputs[submission.evaluation_directory.absolute().name]
+        output_info.writeLog(submission.run_log_file)
+        # Set the metadata for this run in the assignment.
+        index = RunOutputIndex.of(output_info, log=f"{submission.evaluation_directory.name}/{submission.run_log_file.name}")
+        assignment.setMetadataPath(metadataKey(META_KEY_RUN_OUTPUT, submission.name), value=index.asdict())
+    return passed
+
+
+async def _runPytest(
+    assignment: Assignment,
+    submissions: list[Submission],
+    pytest_args: list[str],
+    progress: rich.progress.Progress,
+    task_ids: dict[str, int],
+    pool: pytest_pool.ForkServer | None,
+) -> list[tuple[Submission, bool]]:
+    """Run pytest on ``submissions`` and follow it with ``parse_pytest_output``, killing it if cancelled."""
+    proc = None
+    passed = {}
+    try:
+        proc, events = await start_pytest(assignment, pytest_args, pool)
+        passed = await parse_pytest_output(assignment, submissions, proc, events, progress, task_ids)
+    except CancelledError:
+        # Without proc, start_pytest was cancelled and has already killed whatever it started.
+        if proc is not None and proc.returncode is None:
+            # Kill pytest, and whatever the tests started (make, the student's program, quarto...).
+            with contextlib.suppress(ProcessLookupError):
+                os.killpg(proc.pid, signal.SIGKILL)
+            await proc.wait()
+        for task_id in task_ids.values():
+            progress.update(task_id, description="[error]Cancelled.")
+    results = []
+    for submission in submissions:
+        if submission.journal_file.exists():
+            # Fold the metadata changes made during the run back into submission.json.
+            submission = Submission.load(submission.evaluation_directory, assignment=assignment).compactJournal()
+        results.append((submission, passed.get(submission.evaluation_directory.absolute().name, False)))
+    return results
+
+
+def _checkTestsDirectory(tests_path: Path, submission: Submission, progress: rich.progress.Progress) -> bool:
+    """Whether the submission's tests directory exists. If not, the submission is reported as not runnable."""
+    if tests_path.exists():
+        return True
+    task_id = progress.add_task("Testing...", total=1, name=printableLinkWithIcon(submission.evaluation_directory, link_text=submission.name))
+    progress.update(
+        task_id,
+        advance=1,
+        completed=True,
+        description=f"[error]Tests directory '{tests_path.absolute()}'not found. Perhaps run fix on {submission.name} first?",
+        name=printableLinkWithIcon(submission.evaluation_directory, link_text=submission.name),
+    )
+    return False
 
 
 async def run_pytest(
@@ -761,6 +1074,7 @@ async def run_pytest(
     progress: rich.progress.Progress,
     cli_args: argparse.Namespace,
     extra_pytest_args: str = "",
+    pool: pytest_pool.ForkServer | None = None,
 ) -> tuple[Submission, bool]:
     """Run pytest on the given submission.
 
@@ -769,6 +1083,7 @@ async def run_pytest(
     :param submission: The submission object that is being tested.
     :param progress: The progress bar object.
     :param extra_pytest_args: Extra pytest arguments to pass to pytest. Used for -m "not build and not render" etc.
+    :param pool: Run pytest in this fork server instead of starting a new process.
     :return: A tuple containing the submission object and a boolean indicating whether the test was successful.
     :rtype: tuple[Submission, bool]
     """
@@ -777,46 +1092,112 @@ async def run_pytest(
     # directory.
     # This resolves that path relative to the submission directory.
     tests_path = submission.evaluation_directory / assignment.tests_dir.name
-    if not tests_path.exists():
-        task_id = progress.add_task(
-            "Testing...", total=1, name=printableLinkWithIcon(submission.evaluation_directory, link_text=submission.name)
-        )
-        progress.update(
-            task_id,
-            advance=1,
-            completed=True,
-            description=f"[error]Tests directory '{tests_path.absolute()}'not found. Perhaps run fix on {submission.name} first?",
-            name=printableLinkWithIcon(submission.evaluation_directory, link_text=submission.name),
-        )
+    if not _checkTestsDirectory(tests_path, submission, progress):
         return submission, False
 
-    cmd_str: str = f"pytest -v -p agh-pytest-plugin --agh {extra_pytest_args} {tests_path.absolute()}/*"
-    # verbose_print(cli_args, 'Running pytest...', cmd_str)
+    if assignment.GraderOptions.journal_metadata:
+        extra_pytest_args = f"--agh-journal {extra_pytest_args}"
+    # Everything in the tests directory, like the shell would expand "tests/*".
+    test_paths = sorted(str(path) for path in tests_path.absolute().glob("[!.]*"))
+    pytest_args = ["-v", "-p", "agh-pytest-plugin", "--agh", *shlex.split(extra_pytest_args), *test_paths]
     # Setup the progress bar.
     task_id = progress.add_task(
         f"Testing {tests_path.absolute()}...",
         total=None,
         name=printableLinkWithIcon(submission.evaluation_directory, link_text=submission.name),
     )
+    task_ids = {submission.evaluation_directory.absolute().name: task_id}
+    [result] = await _runPytest(assignment, [submission], pytest_args, progress, task_ids, pool)
+    return result
 
-    try:
-        # Run pytest.
-        proc = await asyncio.create_subprocess_shell(
-            cmd_str,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-            cwd=assignment.eval_dir.absolute(),
+
+async def run_pytest_session(
+    assignment: Assignment,
+    submissions: list[Submission],
+    progress: rich.progress.Progress,
+    cli_args: argparse.Namespace,
+    extra_pytest_args: str = "",
+    pool: pytest_pool.ForkServer | None = None,
+) -> list[tuple[Submission, bool]]:
+    """Run pytest once on several submissions.
+
+    The assignment's tests are collected once, from the assignment's tests directory, and the plugin parametrizes them
+    over the submissions (``--agh-submission``), so collection doesn't grow with the number of submissions.
+
+    :param assignment: The current assignment object.
+    :param submissions: The submissions to test.
+    :param progress: The progress bar object.
+    :param extra_pytest_args: Extra pytest arguments to pass to pytest. Used for -m "not build and not render" etc.
+    :param pool: Run pytest in this fork server instead of starting a new process.
+    :return: Each submission, with whether its tests were successful.
+    """
+    # Like run_pytest, a submission without its tests directory isn't runnable. It is left out of the session, where it
+    # would only show up as collection or fixture errors.
+    runnable = []
+    not_runnable = []
+    for submission in submissions:
+        if _checkTestsDirectory(submission.evaluation_directory / assignment.tests_dir.name, submission, progress):
+            runnable.append(submission)
+        else:
+            not_runnable.append((submission, False))
+    if not runnable:
+        return not_runnable
+    submissions = runnable
+    if assignment.GraderOptions.journal_metadata:
+        extra_pytest_args = f"--agh-journal {extra_pytest_args}"
+    test_paths = sorted(str(path) for path in assignment.tests_dir.absolute().glob("[!.]*"))
+    submission_args = [arg for submission in submissions for arg in ("--agh-submission", str(submission.evaluation_directory.absolute()))]
+    pytest_args = ["-v", "-p", "agh-pytest-plugin", "--agh", *shlex.split(extra_pytest_args), *submission_args, *test_paths]
+    task_ids = {
+        submission.evaluation_directory.absolute().name: progress.add_task(
+            f"Testing {assignment.tests_dir.absolute()}...",
+            total=None,
+            name=printableLinkWithIcon(submission.evaluation_directory, link_text=submission.name),
         )
-        return_code = await parse_pytest_output(assignment, submission, proc, progress, task_id)
-    except CancelledError:
-        return_code = -1
-    return submission, return_code == 0
+        for submission in submissions
+    }
+    return await _runPytest(assignment, submissions, pytest_args, progress, task_ids, pool) + not_runnable
+
+
+async def as_completed_bounded(awaitables: Iterable[Awaitable[T]], jobs: int) -> AsyncIterator[T]:
+    """Await ``awaitables`` with at most ``jobs`` of them running at once, yielding their results as they finish.
+
+    When the iteration stops early (use ``contextlib.aclosing``) or is cancelled, the ones not finished are cancelled
+    and waited for, and the ones not started never start.
+
+    :param awaitables: Coroutines etc. to run, they are started in order.
+    :param jobs: The most to run at once.
+    """
+    awaitables = list(awaitables)
+    semaphore = asyncio.Semaphore(max(jobs, 1))
+
+    async def bounded(awaitable: Awaitable[T]) -> T:
+        async with semaphore:
+            return await awaitable
+
+    tasks = [asyncio.ensure_future(bounded(awaitable)) for awaitable in awaitables]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Close the coroutines cancelled before they started, so they aren't reported as never awaited.
+        for awaitable in awaitables:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
 
 
 async def execute_pytest_on_submissions(cli_args: argparse.Namespace, assignment: Assignment, extra_pytest_args: str = ""):
     """This function asynchronously runs pytest on all submissions specified.
 
     It provides a progress bar for each submission to indicate the progress of the tests.
+    At most ``cli_args.jobs`` submissions (default ``GraderOptions.test_jobs``, else one per CPU) are run at once, and
+    the result of each is printed as soon as it finishes. When cancelled (Ctrl-C) the runs in progress are killed.
+    With ``cli_args.pool`` (default ``GraderOptions.pytest_pool``) pytest runs in a ``pytest_pool.ForkServer``.
+    With ``cli_args.single_session`` (default ``GraderOptions.pytest_single_session``) each job is one pytest session
+    testing a share of the submissions, see ``run_pytest_session``.
 
     :param cli_args: The command line arguments.
     :param assignment: The assignment object.
@@ -825,23 +1206,12 @@ async def execute_pytest_on_submissions(cli_args: argparse.Namespace, assignment
     """
     # If there are no submissions specified, run on all submissions.
     if cli_args.submissions is None:
-        cli_args.submissions = list(assignment.Submissions)
-        cli_args.submissions.sort(key=lambda x: x.name)
+        cli_args.submissions, load_errors = assignment.load_submissions()
     else:
         # The CLI submissions provide the directory for the submission. We convert
         #  to the submission objects and report any that don't exist.
-        submission_list = []
-        cli_args.submissions.sort()
-        for submission in cli_args.submissions:
-            try:
-                submission_list.append(Submission.load(submission))
-            except FileNotFoundError:
-                console.print(f"[error]No submission found for {submission}")
-                continue
-            except Exception as e:
-                console.print(f"[error]Error loading submission {submission}: {e}")
-                continue
-        cli_args.submissions = submission_list
+        cli_args.submissions, load_errors = assignment.load_submissions(sorted(cli_args.submissions))
+    printLoadErrors(load_errors)
 
     if len(cli_args.submissions) == 0:
         console.print("[error]No submissions found.")
@@ -849,34 +1219,64 @@ async def execute_pytest_on_submissions(cli_args: argparse.Namespace, assignment
     else:
         console.print(f"Running tests on {len(cli_args.submissions)} submissions.")
 
+    jobs = cli_args.jobs or assignment.GraderOptions.test_jobs or os.cpu_count() or 1
+    use_pool = assignment.GraderOptions.pytest_pool if cli_args.pool is None else cli_args.pool
+    use_session = assignment.GraderOptions.pytest_single_session if cli_args.single_session is None else cli_args.single_session
+    results: list[tuple[Submission, bool]] = []
     with rich.progress.Progress(
         rich.progress.SpinnerColumn(spinner_name="dots"),
         rich.progress.TextColumn("{task.fields[name]}", style="label", justify="center"),
         *rich.progress.Progress.get_default_columns(),
     ) as progress:
-        try:
-            tasks = [
-                run_pytest(assignment, submission, progress, cli_args, extra_pytest_args=extra_pytest_args)
-                for submission in cli_args.submissions
+        pool = await pytest_pool.ForkServer().start() if use_pool else None
+        if use_session:
+            sessions = min(jobs, len(cli_args.submissions))
+            runs = [
+                run_pytest_session(
+                    assignment, cli_args.submissions[i::sessions], progress, cli_args, extra_pytest_args=extra_pytest_args, pool=pool
+                )
+                for i in range(sessions)
             ]
-            results = await asyncio.gather(*tasks)
-        except KeyboardInterrupt:
-            # sys.exit(0)
-            pass
-    for submission, success in results:
-        if success:
-            console.print(f"[green]Tests passed for {submission.name}[/green]")
         else:
-            console.print(f"[red]Tests failed for {submission.name}[/red]")
-        if cli_args.verbose:
-            console.print("[bold label]Output:[/]")
-            for line in assignment.getMetadata(META_KEY_RUN_OUTPUT, submission.name, "output", default=[]):
-                console.print(line)
-            console.print("[bold label]Errors:[/]")
-            err_lines = assignment.getMetadata(META_KEY_RUN_OUTPUT, submission.name, "error", default=[])
-            if err_lines:
-                for line in err_lines:
-                    console.print(line, style="error")
+            runs = [
+                run_pytest(assignment, submission, progress, cli_args, extra_pytest_args=extra_pytest_args, pool=pool)
+                for submission in cli_args.submissions
+            ]
+        try:
+            async with contextlib.aclosing(as_completed_bounded(runs, jobs)) as finished_runs:
+                async for finished in finished_runs:
+                    for submission, success in finished if use_session else [finished]:
+                        results.append((submission, success))
+                        if success:
+                            console.print(f"[green]Tests passed for {submission.name}[/green]")
+                        else:
+                            console.print(f"[red]Tests failed for {submission.name}[/red]")
+        except CancelledError:
+            console.print(f"[error]Interrupted, {len(results)} of {len(cli_args.submissions)} submissions finished.")
+        finally:
+            if pool is not None:
+                await pool.close()
+            # Once for the whole run, the runs only update the run output index.
+            assignment.save()
+    if not cli_args.verbose:
+        return
+    for submission, _success in results:
+        console.rule(submission.name)
+        output_info = RunOutputInfo.readLog(submission.run_log_file)
+        if output_info is None:
+            console.print(f"[error]No run log found at '{submission.run_log_file}'.")
+            continue
+        console.print("[bold label]Output:[/]")
+        for line in output_info.output:
+            console.print(line)
+        console.print("[bold label]Errors:[/]")
+        for line in output_info.error:
+            console.print(line, style="error")
+        # The agh warnings and errors the tests left, as reported by the plugin.
+        for key, message in output_info.agh_warnings.items():
+            console.print(f"{key}: {message}", style="warning")
+        for key, message in output_info.agh_errors.items():
+            console.print(f"{key}: {message}", style="error")
 
 
 def run(args=None):
@@ -892,6 +1292,9 @@ def run(args=None):
     if cli_args.debug_core_files or cli_args.restore_default_core_location:
         handleCore(cli_args)
 
+    if cli_args.reindex:
+        getCurrentAssignment().reindexSubmissions()
+
     # Command handling.
     match cli_args.command:
         case "status":
@@ -902,21 +1305,17 @@ def run(args=None):
             handleAssignmentCmd(cli_args)
         case "submission":
             handleSubmissionCmd(cli_args)
-        case "run":
-            assignment = getCurrentAssignment()
-            try:
-                asyncio.run(execute_pytest_on_submissions(cli_args, assignment))
-            except KeyboardInterrupt:
-                pass
-        case "test":
-            assignment = getCurrentAssignment()
-            asyncio.run(execute_pytest_on_submissions(cli_args, assignment, extra_pytest_args='-m "not build and not render"'))
-        case "build":
-            assignment = getCurrentAssignment()
-            asyncio.run(execute_pytest_on_submissions(cli_args, assignment, extra_pytest_args='-m "build"'))
-        case "render":
+        case "run" | "test" | "build" | "render":
+            extra_pytest_args = {
+                "run": "",
+                "test": '-m "not build and not render"',
+                "build": '-m "build"',
+                "render": '-m "render"',
+            }[cli_args.command]
             assignment = getCurrentAssignment()
-            asyncio.run(execute_pytest_on_submissions(cli_args, assignment, extra_pytest_args='-m "render"'))
+            # Ctrl-C cancels the run (killing the pytest processes in progress), then asyncio.run raises this.
+            with contextlib.suppress(KeyboardInterrupt):
+                asyncio.run(execute_pytest_on_submissions(cli_args, assignment, extra_pytest_args=extra_pytest_args))
         case _:
             console.log(cli_args, style="error")
     # print(start(args))
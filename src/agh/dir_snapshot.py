@@ -0,0 +1,65 @@
+"""Cheap, cached listings of a directory.
+
+A ``DirSnapshot`` is the result of one ``os.scandir`` of a directory: the names in it, and which of them are regular
+files. The file types come from the directory entries themselves, so no file is stat'ed. Whether a snapshot is still
+current is checked with a single ``stat`` of the directory: adding, removing or renaming an entry changes its mtime.
+"""
+
+import os
+import pathlib
+import time
+from dataclasses import dataclass
+
+# File systems only update times every clock tick (up to 2 seconds on FAT). A directory changed within this long of a
+# snapshot might change again without its mtime changing, so such a snapshot is never trusted.
+_RACY_NS = 2_000_000_000
+
+
+@dataclass(frozen=True)
+class DirSnapshot:
+    """The entries of a directory at one point in time, see ``take``."""
+
+    directory: pathlib.Path
+    # Modification time of the directory when the snapshot was taken, None if it didn't exist.
+    mtime_ns: int | None
+    # When the snapshot was taken (``time.time_ns``).
+    taken_ns: int
+    # The names of all the entries.
+    names: frozenset[str]
+    # The names of the regular files (not symlinks to them).
+    files: frozenset[str]
+
+    @classmethod
+    def take(cls, directory: pathlib.Path) -> "DirSnapshot":
+        """Snapshot ``directory``. A missing directory gives an empty snapshot that doesn't ``exists``."""
+        taken_ns = time.time_ns()
+        try:
+            # Stat first: a change during the scan then makes the snapshot stale rather than silently wrong.
+            mtime_ns = directory.stat().st_mtime_ns
+            names = set()
+            files = set()
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    names.add(entry.name)
+                    if entry.is_file(follow_symlinks=False):
+                        files.add(entry.name)
+        except (FileNotFoundError, NotADirectoryError):
+            return cls(directory, None, taken_ns, frozenset(), frozenset())
+        return cls(directory, mtime_ns, taken_ns, frozenset(names), frozenset(files))
+
+    @property
+    def exists(self) -> bool:
+        """Whether the directory existed."""
+        return self.mtime_ns is not None
+
+    def isCurrent(self) -> bool:
+        """Whether the directory still has the entries in this snapshot."""
+        try:
+            mtime_ns = self.directory.stat().st_mtime_ns
+        except (FileNotFoundError, NotADirectoryError):
+            return self.mtime_ns is None
+        return mtime_ns == self.mtime_ns and mtime_ns < self.taken_ns - _RACY_NS
+
+    def current(self) -> "DirSnapshot":
+        """This snapshot if it is current, otherwise a new one."""
+        return self if self.isCurrent() else self.take(self.directory)
@@ -0,0 +1,89 @@
+"""Copying files without reading them into Python memory.
+
+``copy_file`` has the kernel do the copy. It tries, in order:
+
+* a reflink (``FICLONE``), which shares the data blocks on copy-on-write file systems such as btrfs and XFS,
+* ``os.copy_file_range``, which can copy on the server for NFS and inside the kernel elsewhere,
+* ``os.sendfile``,
+
+and falls back to a buffered ``shutil.copyfileobj`` when none of them work for the two files.
+"""
+
+import errno
+import os
+import pathlib
+import shutil
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - depends on the platform.
+    fcntl = None
+
+#: ``FICLONE`` from ``linux/fs.h``.
+_FICLONE = 0x40049409
+
+# Errors meaning a copy method doesn't work for these files (file system, kernel or file types), try the next one.
+_UNSUPPORTED_ERRNOS = frozenset(
+    {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTTY, errno.EBADF, errno.ETXTBSY, errno.EPERM}
+)
+
+
+def _copy_file_range(src_fd: int, dst_fd: int, size: int) -> None:
+    offset = 0
+    while offset < size:
+        copied = os.copy_file_range(src_fd, dst_fd, size - offset, offset, offset)
+        if copied == 0:
+            break
+        offset += copied
+
+
+def _sendfile(src_fd: int, dst_fd: int, size: int) -> None:
+    offset = 0
+    while offset < size:
+        copied = os.sendfile(dst_fd, src_fd, offset, size - offset)
+        if copied == 0:
+            break
+        offset += copied
+
+
+_KERNEL_COPIES = [
+    (name, method)
+    for name, method, available in (
+        ("copy_file_range", _copy_file_range, hasattr(os, "copy_file_range")),
+        ("sendfile", _sendfile, hasattr(os, "sendfile")),
+    )
+    if available
+]
+
+
+def copy_file(src: pathlib.Path, dst: pathlib.Path) -> str:
+    """Copy the contents of ``src`` to ``dst``, creating or truncating ``dst``.
+
+    :return: The method that did the copy: ``"reflink"``, ``"copy_file_range"``, ``"sendfile"`` or ``"read/write"``.
+    """
+    with src.open("rb") as fsrc, dst.open("wb") as fdst:
+        src_fd = fsrc.fileno()
+        dst_fd = fdst.fileno()
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(dst_fd, _FICLONE, src_fd)
+                return "reflink"
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED_ERRNOS:
+                    raise
+
+        size = os.fstat(src_fd).st_size
+        for name, method in _KERNEL_COPIES:
+            try:
+                method(src_fd, dst_fd, size)
+                return name
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED_ERRNOS:
+                    raise
+                # Throw away anything partially copied before trying the next method.
+                os.ftruncate(dst_fd, 0)
+
+        fsrc.seek(0)
+        fdst.seek(0)
+        shutil.copyfileobj(fsrc, fdst)
+        return "read/write"
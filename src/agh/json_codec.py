@@ -0,0 +1,102 @@
+"""JSON encoding and decoding for the files agh reads and writes.
+
+`orjson <https://github.com/ijl/orjson>`_ is used when it is installed (``pip install agh[fast]``), otherwise the
+standard library :mod:`json` module is used. Both backends produce and accept the same documents, so files written by
+one can be read by the other.
+
+Encoding always returns ``bytes`` and decoding accepts ``bytes`` directly so files never need to be decoded into an
+intermediate ``str``.
+"""
+
+import json
+import os
+import pathlib
+import stat
+import tempfile
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment.
+    orjson = None
+
+#: The indentation used for files meant to be read and edited by people.
+HUMAN_INDENT = 2
+
+#: Pass as ``indent`` for machine-only files: no indentation and no whitespace between tokens.
+COMPACT = None
+
+# The process umask, read once (it can only be read by setting it) for the mode of new files written by write_file.
+_UMASK = os.umask(0o022)
+os.umask(_UMASK)
+
+
+def backend() -> str:
+    """Returns the name of the JSON library in use."""
+    return "orjson" if orjson is not None else "json"
+
+
+def dumps(data: Any, indent: int | None = HUMAN_INDENT) -> bytes:
+    """Encode ``data`` as UTF-8 JSON.
+
+    :param data: JSON-ready data (see ``DataclassJson.asdict``).
+    :param indent: Number of spaces to indent nested structures, or ``COMPACT`` (``None``) for the smallest output.
+        orjson only supports an indent of 2, other values are handled by the standard library.
+    :return: The encoded document.
+    """
+    if orjson is not None and indent in (COMPACT, 0, 2):
+        option = orjson.OPT_NON_STR_KEYS
+        if indent == 2:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, option=option)
+    if not indent:
+        return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode()
+    return json.dumps(data, indent=indent, ensure_ascii=False).encode()
+
+
+def loads(raw: bytes | str) -> Any:
+    """Decode a JSON document from ``bytes`` (or ``str``)."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def load_file(filepath: pathlib.Path) -> Any:
+    """Read and decode a JSON file without decoding it to text first."""
+    return loads(filepath.read_bytes())
+
+
+def dump_file(filepath: pathlib.Path, data: Any, indent: int | None = HUMAN_INDENT, atomic: bool = False) -> None:
+    """Encode ``data`` and write it to ``filepath``.
+
+    The data is fully encoded before the file is opened so an encoding error never leaves a truncated file behind.
+
+    :param atomic: See ``write_file``.
+    """
+    raw = dumps(data, indent=indent)
+    if not atomic:
+        filepath.write_bytes(raw)
+        return
+    write_file(filepath, raw)
+
+
+def write_file(filepath: pathlib.Path, raw: bytes) -> None:
+    """Write ``raw`` to a temporary file in the same directory and rename it over ``filepath`` so readers (and a crash
+    part way through) only ever see the old or the new contents."""
+    # mkstemp, not a fixed name, so concurrent writers (threads or processes) never share a temporary file.
+    fd, tmp_name = tempfile.mkstemp(dir=filepath.parent, prefix=f".{filepath.name}.", suffix=".tmp")
+    tmp_file = pathlib.Path(tmp_name)
+    try:
+        with os.fdopen(fd, "wb") as tmp_stream:
+            # mkstemp creates the file readable by its owner only: keep the mode of the file being replaced, or give a
+            # new file the mode open() would have.
+            try:
+                mode = stat.S_IMODE(filepath.stat().st_mode)
+            except FileNotFoundError:
+                mode = 0o666 & ~_UMASK
+            os.fchmod(tmp_stream.fileno(), mode)
+            tmp_stream.write(raw)
+        tmp_file.replace(filepath)
+    except BaseException:
+        tmp_file.unlink(missing_ok=True)
+        raise
@@ -1,3 +1,5 @@
+import contextlib
+import json
 import os
 import signal
 from collections.abc import Callable
@@ -7,32 +9,138 @@ import pytest
 from pytestshellutils.shell import ProcessResult
 from pytestshellutils.shell import ScriptSubprocess
 
+from .agh_data import META_INTERNAL_SUB_ERRORS
+from .agh_data import META_INTERNAL_SUB_WARNINGS
+from .agh_data import PYTEST_EVENTS_FD_ENV
 from .agh_data import Assignment
 from .agh_data import OutputSectionData
 from .agh_data import Submission
 from .agh_data import SubmissionFileData
+from .agh_data import metadataKey
 
 TEST_MD_KEY = "TEST_INFO"
+TEST_MD_INITIAL_BUILD_SUCCESS = metadataKey(TEST_MD_KEY, "initial_build_success")
+TEST_MD_EXE_FAULT = metadataKey(TEST_MD_KEY, "EXE_FAULT")
 
 CORE_DUMP_FILE_NAME = "aghAssignmentCoreDump.core"
 
+# Test outcomes reported in events, least to most severe. A test's outcome is the most severe of its phases.
+EVENT_OUTCOMES = ("passed", "xpassed", "xfailed", "skipped", "failed", "error")
+
+
+def _reportOutcome(report: pytest.TestReport) -> str:
+    if hasattr(report, "wasxfail"):
+        return "xpassed" if report.passed else "xfailed"
+    if report.passed:
+        return "passed"
+    if report.skipped:
+        return "skipped"
+    return "failed" if report.when == "call" else "error"
+
+
+def _itemSubmission(item: pytest.Item) -> str | None:
+    """The name of the ``--agh-submission`` directory ``item`` runs on, None if it isn't parametrized over them."""
+    callspec = getattr(item, "callspec", None)
+    if callspec is None or "agh_submission_dir" not in callspec.params:
+        return None
+    return callspec.params["agh_submission_dir"].name
+
 
 class AghPtPlugin:
+    """The ``--agh`` extensions.
+
+    With ``--agh-events FD`` (default: the ``AGH_EVENTS_FD`` environment variable) the run is reported to the agh CLI
+    as JSON lines written to file descriptor ``FD``, one event per line:
+
+    - ``{"event": "collected", "count": n, "submissions": {name: n, ...}}`` once the tests are collected.
+    - ``{"event": "start", "nodeid": ..., "submission": name}`` when a test starts.
+    - ``{"event": "finish", "nodeid": ..., "submission": name, "outcome": ..., "duration": seconds}`` when it is done,
+      ``outcome`` is one of ``EVENT_OUTCOMES``.
+    - ``{"event": "agh", "nodeid": ..., "submission": name, "warnings": {...}, "errors": {...}}`` when a test changed
+      the submission's agh warnings or errors, with all of them.
+
+    ``submission`` is the ``--agh-submission`` directory name, or None.
+    """
+
     def __init__(self, config):
         self.config = config
         self.test_dirs = []
         self.results = {}
-
-    def pytest_report_header(config, start_path, startdir):
+        self.events = None
+        events_fd = config.getoption("agh_events")
+        if events_fd:
+            self.events = os.fdopen(int(events_fd), "w", buffering=1)
+            os.set_inheritable(self.events.fileno(), False)
+        self._submissions: dict[str, str | None] = {}
+        self._outcomes: dict[str, tuple[str, float]] = {}
+
+    def emit(self, event: dict):
+        """Write ``event`` to the events channel, if there is one."""
+        if self.events is not None:
+            # The CLI may be gone (interrupted); the run goes on regardless.
+            with contextlib.suppress(OSError):
+                self.events.write(json.dumps(event) + "\n")
+
+    def pytest_report_header(self, config, start_path):
         return "AGH Loaded"
 
+    def pytest_collection_finish(self, session: pytest.Session):
+        self._submissions = {item.nodeid: _itemSubmission(item) for item in session.items}
+        counts: dict[str, int] = {}
+        for submission in self._submissions.values():
+            if submission is not None:
+                counts[submission] = counts.get(submission, 0) + 1
+        self.emit({"event": "collected", "count": len(session.items), "submissions": counts})
+
+    def pytest_runtest_logstart(self, nodeid, location):
+        self._outcomes[nodeid] = ("passed", 0.0)
+        self.emit({"event": "start", "nodeid": nodeid, "submission": self._submissions.get(nodeid)})
+
+    def pytest_runtest_logreport(self, report: pytest.TestReport):
+        outcome, duration = self._outcomes.get(report.nodeid, ("passed", 0.0))
+        outcome = max(outcome, _reportOutcome(report), key=EVENT_OUTCOMES.index)
+        self._outcomes[report.nodeid] = (outcome, duration + report.duration)
+
+    def pytest_runtest_logfinish(self, nodeid, location):
+        outcome, duration = self._outcomes.pop(nodeid, ("passed", 0.0))
+        self.emit(
+            {"event": "finish", "nodeid": nodeid, "submission": self._submissions.get(nodeid), "outcome": outcome, "duration": duration}
+        )
+
     def pytest_terminal_summary(self, terminalreporter, exitstatus, config):
         terminalreporter.write_line("[purple]AGH[/] Test run complete.")
         # terminalreporter.write_line("JSON report saved to rich_parallel_report.json")
 
+    def pytest_unconfigure(self, config):
+        if self.events is not None:
+            with contextlib.suppress(OSError):
+                self.events.close()
+            self.events = None
+
 
 def pytest_addoption(parser):
     parser.addoption("--agh", action="store_true", help="Enable AGH, assignment grading helper, extensions.")
+    parser.addoption(
+        "--agh-journal",
+        action="store_true",
+        help="Append submission metadata changes to the submission's journal instead of rewriting submission.json.",
+    )
+    parser.addoption(
+        "--agh-submission",
+        action="append",
+        dest="agh_submissions",
+        default=[],
+        metavar="DIR",
+        help="Run the tests on the submission in DIR (repeatable). The tests are collected once and parametrized over the "
+        "submissions, instead of being run from each submission's own tests directory.",
+    )
+    parser.addoption(
+        "--agh-events",
+        dest="agh_events",
+        default=os.environ.get(PYTEST_EVENTS_FD_ENV),
+        metavar="FD",
+        help=f"Report the run as JSON lines on file descriptor FD (default: ${PYTEST_EVENTS_FD_ENV}). Used by the agh CLI.",
+    )
 
 
 def pytest_configure(config):
@@ -43,15 +151,58 @@ def pytest_configure(config):
         config.addinivalue_line("markers", "render: This marks anything related to rendering a submission's documentation.")
 
 
+def pytest_generate_tests(metafunc: pytest.Metafunc):
+    submission_dirs = metafunc.config.getoption("agh_submissions", default=None)
+    if submission_dirs and "agh_submission_dir" in metafunc.fixturenames:
+        # Session scope groups the tests by submission, so each submission's tests run together and in file order.
+        metafunc.parametrize(
+            "agh_submission_dir",
+            [Path(submission_dir).absolute() for submission_dir in submission_dirs],
+            indirect=True,
+            ids=[f"agh={Path(submission_dir).absolute().name}" for submission_dir in submission_dirs],
+            scope="session",
+        )
+
+
+@pytest.fixture
+def agh_submission_dir(request) -> Path:
+    """The directory of the submission under test: the ``--agh-submission`` parameter, else the test file's directory."""
+    if hasattr(request, "param"):
+        return request.param
+    return request.path.parent
+
+
+def _warningsAndErrors(submission: Submission) -> tuple[dict, dict]:
+    """Copies of the submission's agh warnings and errors, by key."""
+    warnings = submission.getMetadataPath(META_INTERNAL_SUB_WARNINGS, default={})
+    errors = submission.getMetadataPath(META_INTERNAL_SUB_ERRORS, default={})
+    return dict(warnings), dict(errors)
+
+
 @pytest.fixture
-def agh_submission(request):
-    return Submission.load(request.path.parent)
+def agh_submission(request, agh_submission_dir):
+    _useOutputSectionsOf(agh_submission_dir)
+    submission = Submission.load(agh_submission_dir).enableJournal(request.config.getoption("--agh-journal"))
+    before = _warningsAndErrors(submission)
+    yield submission
+    plugin = request.config.pluginmanager.get_plugin("agh_plugin")
+    after = _warningsAndErrors(submission)
+    if plugin is not None and after != before:
+        plugin.emit(
+            {
+                "event": "agh",
+                "nodeid": request.node.nodeid,
+                "submission": _itemSubmission(request.node),
+                "warnings": after[0],
+                "errors": after[1],
+            }
+        )
 
 
 @pytest.fixture
-def agh_assignment(request):
-    print(request.path)
-    return Assignment.load(request.path.parent)
+def agh_assignment(agh_submission_dir):
+    print(agh_submission_dir)
+    return Assignment.load(agh_submission_dir)
 
 
 @pytest.fixture
@@ -77,6 +228,17 @@ def storeRunOutErr(tgt_name: str, res, resultsDir):
 
 evaluationDataOS = OutputSectionData(path=Path("eval_data_section.md"), title="Evaluation Data", heading_level=1)
 instructor_out_data = OutputSectionData(path=Path("instructor_data_section.md"), title="Instructor Data", heading_level=1)
+_output_sections_dir: Path | None = None
+
+
+def _useOutputSectionsOf(submission_dir: Path):
+    """Start new output sections when the tests move on to another submission (one pytest session can test several)."""
+    global _output_sections_dir
+    if _output_sections_dir is not None and _output_sections_dir != submission_dir:
+        # Reset in place, so modules that imported the sections keep seeing the current ones.
+        evaluationDataOS.__init__(path=Path("eval_data_section.md"), title="Evaluation Data", heading_level=1)
+        instructor_out_data.__init__(path=Path("instructor_data_section.md"), title="Instructor Data", heading_level=1)
+    _output_sections_dir = submission_dir
 
 
 def _make_sections(resultsDir: Path, agh_assignment: Assignment, agh_submission: Submission):
@@ -122,11 +284,14 @@ def agh_build_makefile(agh_submission, shell, cache, request, resultsDir) -> Cal
     request.applymarker(pytest.mark.build)
 
     def build(target: str | None = None, include_build_in_eval: bool = True):
+        # Finish extracting a submission added in triage mode.
+        agh_submission.extractDeferred()
+
         # Check to see if this is the first time we're building this submission.
         first_build = False
-        if agh_submission.getMetadata(TEST_MD_KEY, "initial_build_success", default=None) is None:
+        if agh_submission.getMetadataPath(TEST_MD_INITIAL_BUILD_SUCCESS, default=None) is None:
             first_build = True
-            agh_submission.setMetadata(TEST_MD_KEY, "initial_build_success", value=False)
+            agh_submission.setMetadataPath(TEST_MD_INITIAL_BUILD_SUCCESS, value=False)
 
         # Build the submission.
         cmd = ["make"]
@@ -136,7 +301,7 @@ def agh_build_makefile(agh_submission, shell, cache, request, resultsDir) -> Cal
 
         # Update permanent cache state for initial build ok.
         if first_build:
-            agh_submission.setMetadata(TEST_MD_KEY, "initial_build_success", value=res.returncode == 0)
+            agh_submission.setMetadataPath(TEST_MD_INITIAL_BUILD_SUCCESS, value=res.returncode == 0)
 
         build_out_section = OutputSectionData(path=Path("build_data.md"), title="Build Output")
         if include_build_in_eval:
@@ -239,8 +404,9 @@ def agh_run_executable(
 
         # Handle core dumps. We now in ubuntu need to search for CORE_DUMP_FILE_NAME.pid.
         # core_dump_file = agh_submission.evaluation_directory / CORE_DUMP_FILE_NAME
-        agh_submission.delWarning("crash_detected")
-        agh_submission.delError("crash_detection_issue")
+        with agh_submission.batch():
+            agh_submission.delWarning("crash_detected")
+            agh_submission.delError("crash_detection_issue")
 
         core_dump_files = [*agh_submission.evaluation_directory.glob(f"{CORE_DUMP_FILE_NAME}.*")]
         core_dump_file = core_dump_files[0] if len(core_dump_files) > 0 else None
@@ -291,7 +457,7 @@ def agh_run_executable(
                 except ValueError:
                     pass
 
-                agh_submission.setMetadata(TEST_MD_KEY, "EXE_FAULT", value=True)
+                agh_submission.setMetadataPath(TEST_MD_EXE_FAULT, value=True)
                 current_out_section.addError(
                     "Crash Likely", f"Exit Code: {err_code}\n\nExe exited with signal {sig_name}: {err_code - 128}"
                 )
@@ -417,7 +583,8 @@ def agh_render_output(
             cmd.extend(args)
 
         # Clear all render specific errors and warnings
-        agh_submission.delWarning("render warning").delError("render error").delWarning("render issue").save()
+        with agh_submission.batch():
+            agh_submission.delWarning("render warning").delError("render error").delWarning("render issue")
 
         try:
             cmd_str = " ".join(cmd)
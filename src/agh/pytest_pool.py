@@ -0,0 +1,297 @@
+"""A fork server for running pytest on many submissions.
+
+Every ``pytest`` run pays for starting an interpreter and importing pytest, its plugins and ``agh.pytest_plugin``
+before any test runs. The fork server pays for that once: it imports them, then forks a child per run, which only has
+to call ``pytest.main``. A fork (rather than reusing one process for several runs) keeps each run's imported test modules,
+plugin state and working directory separate, just like separate ``pytest`` processes.
+
+The CLI starts the server with ``ForkServer`` and gets a ``PooledPytest`` per run, which looks enough like an
+``asyncio.subprocess.Process`` for ``agh.cli`` to use either.
+
+Protocol, over a Unix socket, one connection per run: the client sends a JSON line ``{"args": [...], "cwd": "..."}``
+with the write ends of its stdout and stderr pipes attached (``SCM_RIGHTS``), followed by any other descriptors for
+the run, whose numbers in the child are put in the environment variables listed in ``"fd_env"``. The server answers ``{"pid": ...}`` once
+the child is started (it leads its own process group, kill the group to stop the run), and
+``{"returncode": ...}`` when it exits. A client closing the connection before then kills the run's process group, so
+a run is never left behind by a client that went away. The server exits when its stdin is closed.
+"""
+
+import asyncio
+import contextlib
+import importlib.metadata
+import io
+import json
+import os
+import pathlib
+import selectors
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import traceback
+from collections.abc import Mapping
+
+# How often to check for exited children when ``os.pidfd_open`` isn't available.
+_POLL_INTERVAL = 0.05
+# The most file descriptors a job can pass.
+_MAX_FDS = 16
+
+
+def _preload():
+    """Import what every pytest run needs, so the forked children already have it."""
+    import pytest  # noqa: F401, PLC0415
+
+    import agh.pytest_plugin  # noqa: F401, PLC0415
+
+    for entry_point in importlib.metadata.entry_points(group="pytest11"):
+        with contextlib.suppress(Exception):
+            entry_point.load()
+
+
+def _runChild(job: dict, stdout_fd: int, stderr_fd: int, *env_fds: int) -> int:
+    """Run one job in a forked child. Never returns normally to the server's code, see ``serve``."""
+    import pytest  # noqa: PLC0415
+
+    os.setpgid(0, 0)
+    for name, fd in zip(job.get("fd_env", []), env_fds, strict=True):
+        os.environ[name] = str(fd)
+    os.dup2(stdout_fd, 1)
+    os.dup2(stderr_fd, 2)
+    os.close(stdout_fd)
+    os.close(stderr_fd)
+    # Line buffered, so the CLI sees each line as pytest writes it.
+    sys.stdout = io.TextIOWrapper(io.FileIO(1, "w", closefd=False), line_buffering=True)
+    sys.stderr = io.TextIOWrapper(io.FileIO(2, "w", closefd=False), line_buffering=True)
+    os.chdir(job["cwd"])
+    try:
+        # The plugins were imported before pytest could mark them for assertion rewriting, which it would warn about.
+        return int(pytest.main(["-W", "ignore::pytest.PytestAssertRewriteWarning", *job["args"]]))
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+
+def _recvJob(conn: socket.socket) -> tuple[dict, list[int]]:
+    data, fds, _flags, _addr = socket.recv_fds(conn, 65536, _MAX_FDS)
+    while not data.endswith(b"\n"):
+        more = conn.recv(65536)
+        if not more:
+            break
+        data += more
+    return json.loads(data), fds
+
+
+def _send(conn: socket.socket, message: dict):
+    with contextlib.suppress(OSError):
+        conn.sendall(json.dumps(message).encode() + b"\n")
+
+
+def serve(socket_path: pathlib.Path):
+    """Run the fork server on ``socket_path`` until stdin is closed."""
+    _preload()
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(str(socket_path))
+    listener.listen()
+    sel = selectors.DefaultSelector()
+    sel.register(listener, selectors.EVENT_READ, "accept")
+    sel.register(sys.stdin, selectors.EVENT_READ, "stdin")
+    # Running children, pid -> (connection, pidfd or None).
+    children: dict[int, tuple[socket.socket, int | None]] = {}
+    print("ready", flush=True)
+
+    def reap(pid: int, status: int):
+        conn, pidfd = children.pop(pid)
+        if pidfd is not None:
+            sel.unregister(pidfd)
+            os.close(pidfd)
+        with contextlib.suppress(KeyError):
+            sel.unregister(conn)
+        _send(conn, {"returncode": os.waitstatus_to_exitcode(status)})
+        conn.close()
+
+    while True:
+        for key, _events in sel.select(timeout=None if hasattr(os, "pidfd_open") else _POLL_INTERVAL):
+            if key.data == "stdin":
+                if not sys.stdin.buffer.read1(4096):
+                    return
+            elif isinstance(key.data, tuple):
+                # The client sends nothing after the job, so this is it closing the connection.
+                _client, pid = key.data
+                with contextlib.suppress(OSError):
+                    if not key.fileobj.recv(4096):
+                        sel.unregister(key.fileobj)
+                        with contextlib.suppress(ProcessLookupError):
+                            os.killpg(pid, signal.SIGKILL)
+            elif key.data == "accept":
+                conn, _addr = listener.accept()
+                try:
+                    job, fds = _recvJob(conn)
+                except (OSError, ValueError):
+                    conn.close()
+                    continue
+                pid = os.fork()
+                if pid == 0:
+                    returncode = 1
+                    try:
+                        listener.close()
+                        conn.close()
+                        returncode = _runChild(job, *fds)
+                    except BaseException:
+                        traceback.print_exc()
+                    finally:
+                        os._exit(returncode)
+                # Both the child and the server put the child in its own process group, so that it is in it before the
+                # client gets the pid, whichever runs first.
+                with contextlib.suppress(OSError):
+                    os.setpgid(pid, pid)
+                for fd in fds:
+                    os.close(fd)
+                pidfd = os.pidfd_open(pid) if hasattr(os, "pidfd_open") else None
+                children[pid] = (conn, pidfd)
+                if pidfd is not None:
+                    sel.register(pidfd, selectors.EVENT_READ, pid)
+                _send(conn, {"pid": pid})
+                sel.register(conn, selectors.EVENT_READ, ("client", pid))
+            else:
+                _pid, status = os.waitpid(key.data, 0)
+                reap(key.data, status)
+        if not hasattr(os, "pidfd_open"):
+            for pid in list(children):
+                waited_pid, status = os.waitpid(pid, os.WNOHANG)
+                if waited_pid:
+                    reap(pid, status)
+
+
+async def read_pipe(fd: int) -> asyncio.StreamReader:
+    """A stream reading the read end ``fd`` of a pipe (which it takes over and closes at EOF)."""
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(loop=loop)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader, loop=loop), open(fd, "rb", 0))
+    return reader
+
+
+class PooledPytest:
+    """A pytest run in a child of the fork server. It has the parts of ``asyncio.subprocess.Process`` the CLI uses."""
+
+    def __init__(
+        self,
+        pid: int,
+        stdout: asyncio.StreamReader,
+        stderr: asyncio.StreamReader,
+        control: tuple[asyncio.StreamReader, asyncio.StreamWriter],
+    ):
+        self.pid = pid
+        self.stdout = stdout
+        self.stderr = stderr
+        self.returncode: int | None = None
+        self._control = control
+
+    async def wait(self) -> int:
+        """Wait for the run to finish.
+        :return: The exit code, negative for the signal that killed it (-1 if the server went away)."""
+        if self.returncode is None:
+            reader, writer = self._control
+            line = await reader.readline()
+            self.returncode = json.loads(line)["returncode"] if line else -1
+            writer.close()
+            await writer.wait_closed()
+        return self.returncode
+
+
+class ForkServer:
+    """Starts the fork server and runs pytest in it. Use it as an async context manager."""
+
+    def __init__(self):
+        self._proc: asyncio.subprocess.Process | None = None
+        self._dir: pathlib.Path | None = None
+
+    @property
+    def socket_path(self) -> pathlib.Path:
+        return self._dir / "pytest.sock"
+
+    async def start(self) -> "ForkServer":
+        self._dir = pathlib.Path(tempfile.mkdtemp(prefix="agh-pytest-"))
+        self._proc = await asyncio.create_subprocess_exec(
+            sys.executable,
+            "-m",
+            "agh.pytest_pool",
+            str(self.socket_path),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            # Not in the CLI's process group, so Ctrl-C reaches the CLI only and it can shut the runs down itself.
+            start_new_session=True,
+        )
+        ready = await self._proc.stdout.readline()
+        if ready.strip() != b"ready":
+            await self.close()
+            raise RuntimeError("The pytest fork server failed to start.")
+        return self
+
+    async def close(self):
+        if self._proc is not None:
+            self._proc.stdin.close()
+            await self._proc.wait()
+            self._proc = None
+        if self._dir is not None:
+            shutil.rmtree(self._dir, ignore_errors=True)
+            self._dir = None
+
+    async def __aenter__(self) -> "ForkServer":
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def run(self, args: list[str], cwd: pathlib.Path, fd_env: Mapping[str, int] | None = None) -> PooledPytest:
+        """Start ``pytest args`` in ``cwd``.
+
+        :param args: The pytest arguments (no shell expansion is done).
+        :param cwd: The working directory of the run.
+        :param fd_env: Other file descriptors to give the run, by the environment variable that tells it their number.
+            They stay open here, close them once the run is started.
+        :return: The run, read its output from ``stdout`` and ``stderr`` and ``wait`` for it.
+        """
+        loop = asyncio.get_running_loop()
+        fd_env = fd_env or {}
+        stdout_r, stdout_w = os.pipe()
+        stderr_r, stderr_w = os.pipe()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        read_fds = [stdout_r, stderr_r]
+        control = None
+        pid = None
+        try:
+            try:
+                await loop.sock_connect(sock, str(self.socket_path))
+                message = json.dumps({"args": args, "cwd": str(cwd), "fd_env": list(fd_env)}).encode() + b"\n"
+                sent = socket.send_fds(sock, [message], [stdout_w, stderr_w, *fd_env.values()])
+                await loop.sock_sendall(sock, message[sent:])
+            finally:
+                os.close(stdout_w)
+                os.close(stderr_w)
+            control = await asyncio.open_unix_connection(sock=sock)
+            line = await control[0].readline()
+            if not line:
+                raise RuntimeError("The pytest fork server closed the connection.")
+            pid = json.loads(line)["pid"]
+            stdout = await read_pipe(read_fds.pop(0))
+            stderr = await read_pipe(read_fds.pop(0))
+        except BaseException:
+            # Cancelled or failed part way. The run isn't in our process group, so Ctrl-C doesn't reach it: kill it here
+            # once its pid is known. Before that, closing the connection has the server kill it.
+            if pid is not None:
+                with contextlib.suppress(ProcessLookupError):
+                    os.killpg(pid, signal.SIGKILL)
+            if control is not None:
+                control[1].close()
+            else:
+                sock.close()
+            for fd in read_fds:
+                os.close(fd)
+            raise
+        return PooledPytest(pid, stdout, stderr, control)
+
+
+if __name__ == "__main__":
+    serve(pathlib.Path(sys.argv[1]))
@@ -91,3 +91,54 @@ class TestDataclassJson(unittest.TestCase):
             tdc2 = CheckDataclass5.load_json(fs)
             self.assertEqual(tdc2, tdclass)
             self.assertEqual(asdict(tdc2), check_val)
+
+
+@dataclass(kw_only=True)
+class CheckDataclass6(DataclassJson):
+    a: Path
+    b: list[Path] = field(default_factory=list)
+    c: list["CheckDataclass6"] = field(default_factory=list)
+    d: Path | None = None
+
+
+class TestDataclassJsonPlan(unittest.TestCase):
+    def test_plan_cached_per_class(self):
+        plan = CheckDataclass4._json_plan()
+        self.assertIs(plan, CheckDataclass4._json_plan())
+        self.assertIsNot(plan, CheckDataclass5._json_plan())
+        self.assertEqual([name for name, _ in plan.decoders], ["a"])
+        self.assertEqual(CheckDataclass._json_plan().decoders, ())
+        self.assertEqual([name for name, _ in CheckDataclass._json_plan().encoders], ["a", "b"])
+
+    def test_paths_and_forward_refs(self):
+        tdclass = CheckDataclass6(a=Path("x"), b=[Path("y")], c=[CheckDataclass6(a=Path("z"), d=Path("w"))])
+        check_val = {
+            "a": "x",
+            "b": ["y"],
+            "c": [{"a": "z", "b": [], "c": [], "d": "w"}],
+            "d": None,
+        }
+        self.assertEqual(tdclass.asdict(), check_val)
+        with tempfile.TemporaryDirectory() as td:
+            fs = Path(td) / "test.json"
+            tdclass.save(fs)
+            tdc2 = CheckDataclass6.load_json(fs)
+            self.assertEqual(tdc2, tdclass)
+            self.assertIsInstance(tdc2.c[0], CheckDataclass6)
+            self.assertIsInstance(tdc2.c[0].d, Path)
+
+    def test_asdict_does_not_mutate(self):
+        inner = CheckDataclass(a=5, b="5")
+        tdclass = CheckDataclass6(a=Path("x"), b=[Path("y")], c=[CheckDataclass6(a=Path("z"))])
+        nested = CheckDataclass5(a={"1": inner})
+        as_dict = tdclass.asdict()
+        self.assertIsInstance(tdclass.a, Path)
+        self.assertIsInstance(tdclass.b[0], Path)
+        self.assertIsInstance(tdclass.c[0], CheckDataclass6)
+        self.assertIs(nested.a["1"], inner)
+
+        # The result must not share containers with the object.
+        as_dict["b"].append("q")
+        self.assertEqual(tdclass.b, [Path("y")])
+        nested.asdict()["a"]["1"]["a"] = 6
+        self.assertEqual(inner.a, 5)
@@ -0,0 +1,191 @@
+import io
+import tarfile
+import zipfile
+
+import pytest
+
+from agh import archive
+
+
+def _make_tar(path, members: dict[str, bytes], symlinks: dict[str, str] | None = None):
+    with tarfile.open(path, "w:gz") as tar:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mode = 0o644
+            tar.addfile(info, io.BytesIO(data))
+        for name, target in (symlinks or {}).items():
+            info = tarfile.TarInfo(name)
+            info.type = tarfile.SYMTYPE
+            info.linkname = target
+            tar.addfile(info)
+
+
+def _make_zip(path, members: dict[str, bytes]):
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+
+
+@pytest.mark.parametrize(
+    ("file_name", "kind"),
+    [
+        ("a.tar", "tar"),
+        ("a.tar.gz", "tar"),
+        ("a.TGZ", "tar"),
+        ("a.tar.xz", "tar"),
+        ("a.zip", "zip"),
+        ("a.c", None),
+        ("startup.py", None),
+        ("noext", None),
+    ],
+)
+def test_archive_kind(tmp_path, file_name, kind):
+    assert archive.archive_kind(tmp_path / file_name) == kind
+
+
+@pytest.mark.parametrize(
+    ("file_name", "suffix"),
+    [
+        ("alice.smith_hw1.zip", ".zip"),
+        ("bob.jones_hw1.TAR.GZ", ".tar.gz"),
+        ("a.tgz", ".tgz"),
+        ("a.tar", ".tar"),
+        ("a.tar.xz", ".tar.xz"),
+        ("alice.smith_main.c", ""),
+    ],
+)
+def test_archive_suffix(tmp_path, file_name, suffix):
+    assert archive.archive_suffix(tmp_path / file_name) == suffix
+
+
+@pytest.mark.parametrize("kind", ["tar", "zip"])
+def test_extract(tmp_path, kind):
+    members = {"main.c": b"int main() {}", "sub/notes.txt": b"notes", "extra.c": b"// extra"}
+    archive_file = tmp_path / f"sub.{'tar.gz' if kind == 'tar' else 'zip'}"
+    (_make_tar if kind == "tar" else _make_zip)(archive_file, members)
+    dest = tmp_path / "as_submitted"
+    dest.mkdir()
+    copy_dir = tmp_path / "eval"
+    copy_dir.mkdir()
+    # A read-only leftover is replaced, not written through.
+    (dest / "main.c").write_text("old")
+    (dest / "main.c").chmod(0o400)
+
+    report = archive.extract(archive_file, dest, copy_names={"main.c", "notes.txt"}, copy_dir=copy_dir)
+
+    assert sorted(report.extracted) == sorted(members)
+    assert report.skipped == {}
+    assert report.bytes_written == sum(len(data) for data in members.values())
+    for name, data in members.items():
+        assert (dest / name).read_bytes() == data
+    # Only top level copy names are copied.
+    assert [f.name for f in copy_dir.iterdir()] == ["main.c"]
+    assert (copy_dir / "main.c").read_bytes() == members["main.c"]
+
+
+def test_extract_unsafe_tar(tmp_path):
+    archive_file = tmp_path / "evil.tar"
+    _make_tar(archive_file, {"../escape.txt": b"x", "/abs.txt": b"y", "ok.txt": b"z"}, symlinks={"link": "/etc/passwd"})
+    dest = tmp_path / "dest"
+    dest.mkdir()
+
+    report = archive.extract(archive_file, dest)
+
+    assert report.extracted == ["abs.txt", "ok.txt"]
+    assert set(report.skipped) == {"../escape.txt", "link"}
+    assert not (tmp_path / "escape.txt").exists()
+    assert not (dest / "link").exists()
+
+
+def test_extract_unsafe_zip(tmp_path):
+    archive_file = tmp_path / "evil.zip"
+    _make_zip(archive_file, {"../escape.txt": b"x", "ok.txt": b"z"})
+    dest = tmp_path / "dest"
+    dest.mkdir()
+
+    report = archive.extract(archive_file, dest)
+
+    assert report.extracted == ["ok.txt"]
+    assert set(report.skipped) == {"../escape.txt"}
+    assert not (tmp_path / "escape.txt").exists()
+
+
+def test_extract_not_an_archive(tmp_path):
+    with pytest.raises(ValueError, match="not a tar or zip"):
+        archive.extract(tmp_path / "main.c", tmp_path)
+
+
+def test_extract_limits_ignore(tmp_path):
+    archive_file = tmp_path / "sub.tar.gz"
+    _make_tar(
+        archive_file,
+        {"main.c": b"x", "main.o": b"obj", "proj/.git/HEAD": b"ref", "proj/.git/objects/ab": b"blob", "core": b"dump", "core.c": b"c"},
+    )
+    dest = tmp_path / "dest"
+    dest.mkdir()
+
+    report = archive.extract(archive_file, dest, limits=archive.ExtractionLimits(ignore=(".git", "*.o", "core")))
+
+    assert sorted(report.extracted) == ["core.c", "main.c"]
+    assert report.skipped == {"main.o": "ignored", "proj/.git": "ignored", "core": "ignored"}
+    assert not (dest / "proj" / ".git").exists()
+
+
+@pytest.mark.parametrize("kind", ["tar", "zip"])
+def test_extract_limits_ignore_files(tmp_path, kind):
+    archive_file = tmp_path / f"sub.{'tar.gz' if kind == 'tar' else 'zip'}"
+    (_make_tar if kind == "tar" else _make_zip)(
+        archive_file, {"core": b"dump", "core.1234": b"dump", "core/main.c": b"x", "src/core": b"dump", "src/main.o": b"obj"}
+    )
+    dest = tmp_path / "dest"
+    dest.mkdir()
+
+    report = archive.extract(archive_file, dest, limits=archive.ExtractionLimits(ignore_files=("core", "core.[0-9]*", "*.o")))
+
+    # A "core" directory is the student's code, only files named like core dumps are dropped.
+    assert report.extracted == ["core/main.c"]
+    assert report.skipped == {"core": "ignored", "core.1234": "ignored", "src/core": "ignored", "src/main.o": "ignored"}
+    assert (dest / "core" / "main.c").read_bytes() == b"x"
+
+
+@pytest.mark.parametrize("kind", ["tar", "zip"])
+def test_extract_limits_bytes(tmp_path, kind):
+    archive_file = tmp_path / f"sub.{'tar.gz' if kind == 'tar' else 'zip'}"
+    (_make_tar if kind == "tar" else _make_zip)(archive_file, {"small.txt": b"s" * 10, "big.bin": b"\0" * 100_000, "last.txt": b"l"})
+    dest = tmp_path / "dest"
+    dest.mkdir()
+
+    report = archive.extract(archive_file, dest, limits=archive.ExtractionLimits(max_bytes=50_000))
+    assert sorted(report.extracted) == ["last.txt", "small.txt"]
+    assert "50000 bytes" in report.skipped["big.bin"]
+    assert not (dest / "big.bin").exists()
+    assert report.bytes_written == 11
+
+    # Zeros compress very well, so the expansion ratio catches them too.
+    report = archive.extract(archive_file, dest, limits=archive.ExtractionLimits(max_ratio=10))
+    assert "10 times" in report.skipped["big.bin"]
+
+
+def test_extract_limits_members(tmp_path):
+    archive_file = tmp_path / "sub.zip"
+    _make_zip(archive_file, {f"f{i}.txt": b"x" for i in range(10)})
+    dest = tmp_path / "dest"
+    dest.mkdir()
+
+    report = archive.extract(archive_file, dest, limits=archive.ExtractionLimits(max_members=4))
+    assert report.extracted == ["f0.txt", "f1.txt", "f2.txt", "f3.txt"]
+    assert "4 members" in report.stopped
+
+
+@pytest.mark.parametrize("kind", ["tar", "zip"])
+def test_extract_only(tmp_path, kind):
+    archive_file = tmp_path / f"sub.{'tar.gz' if kind == 'tar' else 'zip'}"
+    (_make_tar if kind == "tar" else _make_zip)(archive_file, {"./main.c": b"m", "assets/a.png": b"a", "b.png": b"b"})
+    dest = tmp_path / "dest"
+    dest.mkdir()
+
+    report = archive.extract(archive_file, dest, only={"main.c", "util.c"})
+    assert report.extracted == ["main.c"]
+    assert report.deferred == 2
+    assert [f.name for f in dest.iterdir()] == ["main.c"]
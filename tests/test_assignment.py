@@ -1,6 +1,9 @@
 # test_assignment.py
+import os
+import shutil
 import tempfile
 import unittest
+import zipfile
 from email.mime import base
 from pathlib import Path
 import pytest
@@ -331,6 +334,256 @@ def test_pps_links_test_files(temp_assignment, temp_submission_file):
     assert new_submission.submission_file.read_text() == "Hello, world!"
 
 
+def test_assignment_dirty_tracking(temp_assignment):
+    """Test that the assignment tracks changes to itself and its nested options."""
+    loaded = Assignment.load(temp_assignment.root_directory)
+    assert not loaded.is_dirty
+    loaded._options.anonymize_names = False
+    assert loaded.is_dirty
+    loaded.save()
+    assert not loaded.is_dirty
+    # Assigning the value a field already has isn't a change.
+    loaded._options.anonymize_names = False
+    loaded._name = str(loaded._name)
+    assert not loaded.is_dirty
+    loaded.addRequiredFile(SubmissionFileData(path="a.c"))
+    assert loaded.is_dirty
+    loaded.save()
+    assert Assignment.load(temp_assignment.root_directory) == loaded
+
+
+def test_submission_index(temp_assignment):
+    """Test that submissions are listed from the index, and from the evaluation directory when it is stale."""
+    for name in ("c.txt", "a.txt", "b.txt"):
+        (temp_assignment.unprocessed_dir / name).write_text(name)
+        temp_assignment.AddSubmission(temp_assignment.unprocessed_dir / name, override_anon=False)
+    # A submission file inside a submission is not a submission.
+    (temp_assignment.eval_dir / "a" / "as_submitted" / Submission.SUBMISSION_FILE_NAME).write_text("{}")
+    assert [s.name for s in temp_assignment.Submissions] == ["a", "b", "c"]
+
+    # Make sure the index isn't written in the same clock tick as the last change to the evaluation directory.
+    os.utime(temp_assignment.eval_dir, ns=(0, 0))
+    temp_assignment.reindexSubmissions()
+    assert temp_assignment._loadSubmissionIndex() is not None
+    assert temp_assignment.submissionDirectories() == [temp_assignment.eval_dir / name for name in ("a", "b", "c")]
+
+    # Directories added outside agh make the index stale.
+    (temp_assignment.eval_dir / "d").mkdir()
+    shutil.copy(temp_assignment.eval_dir / "a" / Submission.SUBMISSION_FILE_NAME, temp_assignment.eval_dir / "d")
+    assert temp_assignment._loadSubmissionIndex() is None
+    assert [d.name for d in temp_assignment.submissionDirectories()] == ["a", "b", "c", "d"]
+
+
+def test_submission_index_rebuilt(temp_assignment, monkeypatch):
+    """Test that listing the submissions with a stale index saves the rebuilt index, so the next listing reads it."""
+    for name in ("a.txt", "b.txt"):
+        (temp_assignment.unprocessed_dir / name).write_text(name)
+        temp_assignment.AddSubmission(temp_assignment.unprocessed_dir / name, override_anon=False)
+    (temp_assignment.eval_dir / "d").mkdir()
+    shutil.copy(temp_assignment.eval_dir / "a" / Submission.SUBMISSION_FILE_NAME, temp_assignment.eval_dir / "d")
+    # Make sure the index isn't written in the same clock tick as the last change to the evaluation directory.
+    os.utime(temp_assignment.eval_dir, ns=(0, 0))
+
+    scans = []
+    scan = temp_assignment._scanSubmissions
+    monkeypatch.setattr(temp_assignment, "_scanSubmissions", lambda: scans.append(1) or scan())
+    expected = [temp_assignment.eval_dir / name for name in ("a", "b", "d")]
+    assert temp_assignment.submissionDirectories() == expected
+    assert len(scans) == 1
+    assert temp_assignment.submissionDirectories() == expected
+    assert len(scans) == 1
+
+
+def test_fix_submissions_indexed_once(temp_assignment, monkeypatch):
+    """Test that fixing several submissions updates the submission index once."""
+    for name in ("a.txt", "b.txt", "c.txt"):
+        (temp_assignment.unprocessed_dir / name).write_text(name)
+    submissions, _ = temp_assignment.AddSubmissions(sorted(temp_assignment.unprocessed_dir.iterdir()), override_anon=False, jobs=1)
+
+    saves = []
+    save_index = temp_assignment._saveSubmissionIndex
+    monkeypatch.setattr(temp_assignment, "_saveSubmissionIndex", lambda index: saves.append(index) or save_index(index))
+    for submission in submissions:
+        submission.fix(temp_assignment, index=False)
+    assert saves == []
+    temp_assignment.indexSubmissions(submissions)
+    assert len(saves) == 1
+    assert sorted(saves[0].submissions) == ["a", "b", "c"]
+
+
+def test_load_submissions(temp_assignment):
+    """Test that submissions are loaded in a stable order with errors collected per submission."""
+    for idx in range(8):
+        (temp_assignment.unprocessed_dir / f"s{idx}.txt").write_text(str(idx))
+        temp_assignment.AddSubmission(temp_assignment.unprocessed_dir / f"s{idx}.txt", override_anon=False)
+    (temp_assignment.eval_dir / "s3" / Submission.SUBMISSION_FILE_NAME).write_text("not json")
+    missing = temp_assignment.eval_dir / "missing"
+
+    submissions, errors = temp_assignment.load_submissions(max_workers=4)
+    assert [s.name for s in submissions] == [f"s{idx}" for idx in range(8) if idx != 3]
+    assert list(errors) == [temp_assignment.eval_dir / "s3"]
+
+    directories = [temp_assignment.eval_dir / "s5", missing, temp_assignment.eval_dir / "s1"]
+    submissions, errors = temp_assignment.load_submissions(directories)
+    assert [s.name for s in submissions] == ["s5", "s1"]
+    assert isinstance(errors[missing], FileNotFoundError)
+
+
+def test_assignment_load_cache(temp_assignment, temp_submission_file):
+    """Test that loading an unchanged assignment reuses the loaded object."""
+    root = temp_assignment.root_directory
+    loaded = Assignment.load(root / "submissions")
+    assert Assignment.load(root) is loaded
+    assert Assignment.load(root, use_cache=False) is not loaded
+
+    # Unsaved changes aren't shared with later loads.
+    loaded.name = "changed"
+    assert Assignment.load(root).name == "assignment"
+
+    # A saved assignment is what later loads get.
+    other = Assignment.load(root, use_cache=False)
+    other.name = "renamed"
+    other.save()
+    assert Assignment.load(root) is other
+
+    # Changes made to the file on disk are picked up.
+    assignment_file = root / Assignment.ASSIGNMENT_FILE_NAME
+    assignment_file.write_text(assignment_file.read_text().replace("renamed", "renamed elsewhere"))
+    reloaded = Assignment.load(root)
+    assert reloaded is not other
+    assert reloaded.name == "renamed elsewhere"
+
+    submission = reloaded.AddSubmission(temp_submission_file)
+    assert submission.assignment is reloaded
+    assert Submission.load(submission.evaluation_directory).assignment is Assignment.load(root)
+
+
+def test_link_plan(temp_assignment, temp_submission_file, monkeypatch):
+    """Test that a link plan links the tests and templates once and leaves correct links alone."""
+    (temp_assignment.link_template_dir / "Makefile").write_text("all:")
+    (temp_assignment.link_template_dir / "real.h").write_text("")
+    (temp_assignment.link_template_dir / "alias.h").symlink_to("real.h")
+    temp_assignment.addOptionalFile(SubmissionFileData(path=Path("real.h")))
+    link_plan = temp_assignment.linkPlan()
+    assert {item.name for item in link_plan} == {"tests", "Makefile", "real.h", "alias.h"}
+    assert all(item.target.is_absolute() for item in link_plan)
+
+    submission = temp_assignment.AddSubmission(temp_submission_file, link_plan=link_plan)
+    eval_dir = submission.evaluation_directory
+    assert (eval_dir / "alias.h").readlink() == temp_assignment.link_template_dir.absolute() / "real.h"
+    assert (eval_dir / "tests").is_symlink()
+
+    symlinks = []
+    orig_symlink_to = Path.symlink_to
+    monkeypatch.setattr(Path, "symlink_to", lambda self, *args, **kwargs: symlinks.append(self) or orig_symlink_to(self, *args, **kwargs))
+    temp_assignment.PostProcessSubmission(submission, exists_protocol=LinkProto.RAISE_ERROR, link_plan=link_plan)
+    assert all(link.parent != eval_dir for link in symlinks)
+
+    (eval_dir / "Makefile").unlink()
+    (eval_dir / "Makefile").write_text("student")
+    with pytest.raises(FileExistsError):
+        temp_assignment.PostProcessSubmission(submission, exists_protocol=LinkProto.RAISE_ERROR, link_plan=link_plan)
+    temp_assignment.PostProcessSubmission(submission, exists_protocol=LinkProto.LINK_OVERWRITE, link_plan=link_plan)
+    assert (eval_dir / "Makefile").is_symlink()
+
+
+def test_graded_output_copy(temp_assignment, temp_submission_file, monkeypatch):
+    """Test that the graded output is copied only when the rendered output changed."""
+    from agh import file_copy
+
+    submission = temp_assignment.AddSubmission(temp_submission_file)
+    rendered = submission.evaluation_directory / "index.pdf"
+    rendered.write_bytes(b"%PDF first")
+
+    copies = []
+    orig_copy_file = file_copy.copy_file
+    monkeypatch.setattr(file_copy, "copy_file", lambda src, dst: copies.append(dst) or orig_copy_file(src, dst))
+    temp_assignment.postProcessSubmissionRender(submission)
+    graded = Path(submission.getMetadata("AGH_INTERNAL", "SUBMISSION", "OUTPUT_INFO", "GRADED"))
+    assert graded.read_bytes() == b"%PDF first"
+    temp_assignment.postProcessSubmissionRender(submission)
+    assert len(copies) == 1
+
+    rendered.write_bytes(b"%PDF again")
+    temp_assignment.postProcessSubmissionRender(submission)
+    assert len(copies) == 2
+    assert graded.read_bytes() == b"%PDF again"
+
+    # A graded copy that was edited is never overwritten.
+    os.utime(graded, ns=(0, 0))
+    rendered.write_bytes(b"%PDF third")
+    warnings = []
+    temp_assignment.postProcessSubmissionRender(submission, warning_callback=warnings.append)
+    assert len(copies) == 2
+    assert len(warnings) == 1
+
+
+@pytest.mark.parametrize("jobs", [1, 3])
+def test_add_submissions(temp_assignment, jobs):
+    """Test adding many submissions at once, in this process and in worker processes."""
+    sub_files = []
+    for idx in range(4):
+        sub_files.append(temp_assignment.unprocessed_dir / f"s{idx}.txt")
+        sub_files[-1].write_text(str(idx))
+    sub_files.insert(2, temp_assignment.unprocessed_dir / "missing.txt")
+
+    progress = []
+    submissions, errors = temp_assignment.AddSubmissions(
+        sub_files, override_anon=False, jobs=jobs, progress_callback=lambda sub_file, result: progress.append(sub_file)
+    )
+    assert [s.name for s in submissions] == ["s0", "s1", "s2", "s3"]
+    assert list(errors) == [temp_assignment.unprocessed_dir / "missing.txt"]
+    assert sorted(progress) == sorted(sub_files)
+    assert all((s.evaluation_directory / "tests").is_symlink() for s in submissions)
+    assert [s.name for s in temp_assignment.Submissions] == ["s0", "s1", "s2", "s3"]
+
+
+def test_identical_submissions_stored_once(temp_assignment):
+    """Test that byte-identical submission files share one stored file and are reported."""
+    for name in ("alice.c", "bob.c", "carol.c"):
+        (temp_assignment.unprocessed_dir / name).write_text("starter code" if name != "carol.c" else "own work")
+    warnings = []
+    submissions, errors = temp_assignment.AddSubmissions(
+        sorted(temp_assignment.unprocessed_dir.iterdir()), override_anon=False, jobs=1, warning_callback=warnings.append
+    )
+    assert errors == {}
+    alice, bob, carol = submissions
+    assert alice.sha256 == bob.sha256 != carol.sha256
+    assert alice.submission_file.stat().st_ino == bob.submission_file.stat().st_ino
+    assert len(list(temp_assignment.archive_dir.glob("*/*"))) == 2
+    assert warnings == ["alice submitted a file identical to bob.", "bob submitted a file identical to alice."]
+    assert Submission.load(alice.evaluation_directory).sha256 == alice.sha256
+
+
+def test_identical_submissions_after_rescan(temp_assignment):
+    """Test that identical submissions are still reported after the submission index is rebuilt."""
+    for name in ("alice.c", "bob.c"):
+        (temp_assignment.unprocessed_dir / name).write_text("starter code")
+    temp_assignment.AddSubmissions([temp_assignment.unprocessed_dir / "alice.c"], override_anon=False, jobs=1)
+    # An outside change makes the index stale, and without the index the digests come from the submissions.
+    (temp_assignment.eval_dir / "notes").mkdir()
+    temp_assignment.submissionDirectories()
+    temp_assignment._submission_index_file.unlink()
+    temp_assignment.reindexSubmissions()
+
+    warnings = []
+    temp_assignment.AddSubmissions([temp_assignment.unprocessed_dir / "bob.c"], override_anon=False, jobs=1, warning_callback=warnings.append)
+    assert warnings == ["bob submitted a file identical to alice."]
+
+
+def test_identical_archives_stored_once(temp_assignment):
+    """Test that identical archives share one stored file whatever else is in their names."""
+    for name in ("alice.smith_hw1.zip", "bob.jones_hw1.zip"):
+        with zipfile.ZipFile(temp_assignment.unprocessed_dir / name, "w") as zf:
+            # Fixed entry times, so the archives are byte-identical.
+            zf.writestr(zipfile.ZipInfo("main.c", date_time=(2024, 1, 1, 0, 0, 0)), "int main() {}")
+    submissions, errors = temp_assignment.AddSubmissions(sorted(temp_assignment.unprocessed_dir.iterdir()), override_anon=False, jobs=1)
+    assert errors == {}
+    alice, bob = submissions
+    assert alice.submission_file.stat().st_ino == bob.submission_file.stat().st_ino
+    [stored] = temp_assignment.archive_dir.glob("*/*")
+    assert stored.name == f"{alice.sha256}.zip"
+
 
 # def test_postprocesssubmission_raises_error_if_link_exists(temp_assignment, temp_submission_file, tmp_path):
 #     """Test that PostProcessSubmission raises FileExistsError if link already exists and protocol is RAISE_ERROR."""
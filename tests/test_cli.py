@@ -1,6 +1,153 @@
+import asyncio
+import contextlib
+import json
 import subprocess
+import sys
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+from agh.cli import RunOutputInfo
+from agh.cli import as_completed_bounded
+from agh.cli import parse_pytest_output
+from agh.cli import run_pytest_session
 
 
 def test_main():
     return
     assert subprocess.check_output(["agh", "foo", "foobar"], text=True) == "foobar\n"
+
+
+async def _job(idx: int, delay: float, running: list[int], most_running: list[int]):
+    running.append(idx)
+    most_running[0] = max(most_running[0], len(running))
+    try:
+        await asyncio.sleep(delay)
+    finally:
+        running.remove(idx)
+    return idx
+
+
+@pytest.mark.parametrize("jobs", [1, 3])
+def test_as_completed_bounded(jobs):
+    running = []
+    most_running = [0]
+
+    async def collect():
+        delays = [0.05, 0.01, 0.03, 0.0, 0.02, 0.04]
+        return [idx async for idx in as_completed_bounded((_job(idx, d, running, most_running) for idx, d in enumerate(delays)), jobs)]
+
+    results = asyncio.run(collect())
+    assert sorted(results) == list(range(6))
+    assert most_running[0] == jobs
+    if jobs == 1:
+        # One at a time finishes in the order started.
+        assert results == list(range(6))
+
+
+def test_as_completed_bounded_stops_early():
+    running = []
+    most_running = [0]
+    started = []
+
+    async def collect():
+        jobs = [_job(idx, 0.01 * idx, running, most_running) for idx in range(10)]
+        async with contextlib.aclosing(as_completed_bounded(jobs, 2)) as finished:
+            async for idx in finished:
+                started.append(idx)
+                break
+
+    asyncio.run(collect())
+    assert started == [0]
+    # The running job was cancelled, the rest never started.
+    assert running == []
+    assert most_running[0] == 2
+
+
+def _stream(lines: list[str]) -> asyncio.StreamReader:
+    stream = asyncio.StreamReader()
+    stream.feed_data("".join(f"{line}\n" for line in lines).encode())
+    stream.feed_eof()
+    return stream
+
+
+def test_parse_pytest_output(tmp_path):
+    events = [
+        {"event": "collected", "count": 5, "submissions": {"bob": 2, "bob-2": 2}},
+        {"event": "finish", "nodeid": "t.py::test_build[agh=bob]", "submission": "bob", "outcome": "passed", "duration": 0.1},
+        {"event": "finish", "nodeid": "t.py::test_build[agh=bob-2]", "submission": "bob-2", "outcome": "passed", "duration": 0.1},
+        {"event": "finish", "nodeid": "t.py::test_run[1-agh=bob-2]", "submission": "bob-2", "outcome": "failed", "duration": 0.1},
+        {
+            "event": "agh",
+            "nodeid": "t.py::test_run[1-agh=bob-2]",
+            "submission": "bob-2",
+            "warnings": {},
+            "errors": {"crash": "It crashed."},
+        },
+        {"event": "finish", "nodeid": "t.py::test_run[1-agh=bob]", "submission": "bob", "outcome": "passed", "duration": 0.1},
+        {"event": "finish", "nodeid": "t.py::test_plain", "submission": None, "outcome": "passed", "duration": 0.1},
+    ]
+    stdout = ["collecting ... collected 5 items", "t.py::test_run[1-agh=bob-2] FAILED", "_____ test_run[1-agh=bob-2] _____", "assert False"]
+
+    async def parse():
+        async def wait():
+            return 1
+
+        proc = SimpleNamespace(stdout=_stream(stdout), stderr=_stream([]), returncode=1, wait=wait)
+        submissions = [
+            SimpleNamespace(name=name, evaluation_directory=tmp_path / name, run_log_file=tmp_path / f"{name}.json.gz")
+            for name in ("bob", "bob-2")
+        ]
+        event_lines = [json.dumps(event) for event in events]
+        return await parse_pytest_output(assignment, submissions, proc, _stream(event_lines), mock.Mock(), {"bob": 1, "bob-2": 2})
+
+    assignment = mock.Mock()
+    assert asyncio.run(parse()) == {"bob": True, "bob-2": False}
+    # The assignment only gets a small index entry, and saving it is left to the caller.
+    index = {call.args[0][-1]: call.kwargs["value"] for call in assignment.setMetadataPath.call_args_list}
+    assert index["bob-2"] == {"log": "bob-2/bob-2.json.gz", "collected": 3, "return_code": 1, "outcomes": {"passed": 2, "failed": 1}}
+    assignment.save.assert_not_called()
+
+    outputs = {name: RunOutputInfo.readLog(tmp_path / f"{name}.json.gz") for name in ("bob", "bob-2")}
+    # The test not parametrized over the submissions counts for both.
+    assert outputs["bob"].collected == 3
+    assert outputs["bob"].outcomes == {
+        "t.py::test_build[agh=bob]": "passed",
+        "t.py::test_run[1-agh=bob]": "passed",
+        "t.py::test_plain": "passed",
+    }
+    assert outputs["bob-2"].return_code == 1
+    assert outputs["bob-2"].agh_errors == {"crash": "It crashed."}
+    # The failure's traceback goes with the failing submission.
+    assert outputs["bob-2"].output[-1] == "assert False"
+    assert "assert False" not in outputs["bob"].output
+    assert RunOutputInfo.readLog(tmp_path / "missing.json.gz") is None
+
+
+def test_run_pytest_session_skips_unrunnable(tmp_path):
+    assignment = SimpleNamespace(tests_dir=tmp_path / "tests", GraderOptions=SimpleNamespace(journal_metadata=False))
+    (tmp_path / "tests").mkdir()
+    (tmp_path / "tests" / "test_a.py").write_text("")
+    submissions = [SimpleNamespace(name=name, evaluation_directory=tmp_path / name) for name in ("bob", "carol")]
+    (tmp_path / "bob").mkdir()
+    (tmp_path / "bob" / "tests").symlink_to(tmp_path / "tests")
+    (tmp_path / "carol").mkdir()
+
+    async def run_session(assignment, run_submissions, pytest_args, progress, task_ids, pool):
+        return [(submission, True) for submission in run_submissions]
+
+    with mock.patch("agh.cli._runPytest", side_effect=run_session) as run:
+        results = asyncio.run(run_pytest_session(assignment, submissions, mock.Mock(), None))
+
+    # carol has no tests directory: not run, and not passed to the session.
+    assert [(submission.name, passed) for submission, passed in results] == [("bob", True), ("carol", False)]
+    pytest_args = run.call_args.args[2]
+    assert str(tmp_path / "bob") in pytest_args
+    assert str(tmp_path / "carol") not in pytest_args
+
+
+def test_fix_needs_submissions(tmp_path):
+    res = subprocess.run([sys.executable, "-m", "agh", "submission", "fix"], cwd=tmp_path, capture_output=True, text=True, check=False)
+    assert res.returncode == 2
+    assert "-a/--all" in res.stderr
@@ -0,0 +1,42 @@
+import os
+
+from agh import dir_snapshot
+from agh.dir_snapshot import DirSnapshot
+
+
+def test_snapshot(tmp_path):
+    (tmp_path / "a.c").write_text("a")
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "link.c").symlink_to(tmp_path / "a.c")
+
+    snapshot = DirSnapshot.take(tmp_path)
+    assert snapshot.exists
+    assert snapshot.names == {"a.c", "sub", "link.c"}
+    assert snapshot.files == {"a.c"}
+
+
+def test_snapshot_missing_directory(tmp_path):
+    snapshot = DirSnapshot.take(tmp_path / "missing")
+    assert not snapshot.exists
+    assert snapshot.names == frozenset()
+    assert snapshot.isCurrent()
+    (tmp_path / "missing").mkdir()
+    assert not snapshot.isCurrent()
+
+
+def test_snapshot_current(tmp_path):
+    (tmp_path / "a.c").write_text("a")
+    snapshot = DirSnapshot.take(tmp_path)
+    # Just taken, the directory may still change within the same clock tick.
+    assert not snapshot.isCurrent()
+
+    # Pretend the directory was last changed long ago.
+    old_ns = snapshot.taken_ns - 10 * dir_snapshot._RACY_NS
+    os.utime(tmp_path, ns=(old_ns, old_ns))
+    snapshot = DirSnapshot.take(tmp_path)
+    assert snapshot.isCurrent()
+    assert snapshot.current() is snapshot
+
+    (tmp_path / "b.c").write_text("b")
+    assert not snapshot.isCurrent()
+    assert snapshot.current().names == {"a.c", "b.c"}
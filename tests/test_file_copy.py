@@ -0,0 +1,31 @@
+import pytest
+
+from agh import file_copy
+
+
+@pytest.fixture(params=["kernel", "read/write"])
+def copy_method(request, monkeypatch):
+    if request.param == "read/write":
+        monkeypatch.setattr(file_copy, "fcntl", None)
+        monkeypatch.setattr(file_copy, "_KERNEL_COPIES", [])
+    return request.param
+
+
+def test_copy_file(tmp_path, copy_method):
+    src = tmp_path / "src.pdf"
+    src.write_bytes(bytes(range(256)) * 4096)
+    dst = tmp_path / "dst.pdf"
+    dst.write_bytes(b"something much longer than nothing" * 1000000)
+
+    used = file_copy.copy_file(src, dst)
+    assert dst.read_bytes() == src.read_bytes()
+    if copy_method == "read/write":
+        assert used == "read/write"
+
+
+def test_copy_empty_file(tmp_path, copy_method):
+    src = tmp_path / "empty"
+    src.touch()
+    dst = tmp_path / "dst"
+    file_copy.copy_file(src, dst)
+    assert dst.read_bytes() == b""
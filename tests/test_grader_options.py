@@ -4,6 +4,7 @@ import pytest
 
 from agh import agh_data
 from agh.agh_data import GraderOptions
+from agh.agh_data import metadataKey
 
 @pytest.fixture
 def swap_actual_user_defaults():
@@ -61,3 +62,70 @@ def test_metadata_set_multi_level_list(swap_actual_user_defaults, tmp_path: Path
     assert udo2.getMetadata("test_key") == dict(bob=dict(sally='a', tom="b"))
     assert udo2.getMetadata("test_key", "bob", "tom") == "b"
     assert udo2.getMetadata("test_key", "bob") == dict(sally='a', tom="b")
+
+def test_metadata_key_path(swap_actual_user_defaults, tmp_path: Path):
+    file_key = metadataKey("test_key", "main.c")
+    assert file_key is metadataKey("test_key", "main.c")
+    with pytest.raises(ValueError):
+        metadataKey("test_key", "")
+    with pytest.raises(ValueError):
+        metadataKey()
+
+    udo = GraderOptions.loadUserDefaults()
+    udo.setMetadataPath(file_key, value="a").setMetadata("test_key", "bob", value="b")
+    save_path = tmp_path / "test_user_defaults.json"
+    udo.save(save_path)
+
+    udo2 = GraderOptions.load(save_path)
+    assert udo2.getMetadata("test_key") == {"main.c": "a", "bob": "b"}
+    assert udo2.getMetadataPath(file_key) == "a"
+    assert udo2.getMetadataPath(metadataKey("test_key", "bob")) == "b"
+    assert udo2.getMetadataPath(metadataKey("test_key", "main")) is None
+    assert udo2.getMetadataPath(metadataKey("test_key", "bob", "tom"), default="d") == "d"
+    with pytest.raises(ValueError):
+        udo2.setMetadata("test_key..bob", value="c")
+
+
+@pytest.fixture
+def user_defaults_file(tmp_path: Path, monkeypatch):
+    user_defaults_file = tmp_path / "config" / ".agh_user_defaults.json"
+    monkeypatch.setattr(agh_data, "_USER_DEFAULTS_FILE", user_defaults_file)
+    monkeypatch.setattr(GraderOptions, "_user_defaults_cache", None)
+    return user_defaults_file
+
+
+def test_user_defaults_cached(user_defaults_file: Path, monkeypatch):
+    options = GraderOptions()
+    assert options.general_editor_command == "subl $files"
+    assert not user_defaults_file.parent.exists()
+
+    user_defaults = GraderOptions.loadUserDefaults()
+    user_defaults.general_editor_command = "vim $files"
+    user_defaults.setMetadata("course", "name", value="CSCI-340").setMetadata("course", "room", value="A")
+    user_defaults.saveAsUserDefaults()
+
+    loads = []
+    orig_load_json = GraderOptions.load_json.__func__
+    monkeypatch.setattr(GraderOptions, "load_json", classmethod(lambda cls, *a, **kw: loads.append(a) or orig_load_json(cls, *a, **kw)))
+    options.setMetadata("course", "room", value="B")
+    for _ in range(3):
+        assert options.general_editor_command == "vim $files"
+        assert options.output_files == ["index.pdf"]
+        assert options.getMetadata("course") == {"name": "CSCI-340", "room": "B"}
+    assert len(loads) == 1
+
+    # Overrides and changes to the user defaults file are picked up.
+    options.general_editor_command = "emacs $files"
+    assert options.general_editor_command == "emacs $files"
+    del options.general_editor_command
+    user_defaults.general_editor_command = "nano $files"
+    user_defaults.saveAsUserDefaults()
+    assert options.general_editor_command == "nano $files"
+    assert len(loads) == 2
+
+    # Edits made by another process are noticed through the file's modification time and size.
+    user_defaults.general_editor_command = "code --wait $files"
+    user_defaults.save(user_defaults_file)
+    assert options.general_editor_command == "code --wait $files"
+    assert len(loads) == 3
+
@@ -0,0 +1,90 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from agh import json_codec
+from agh.agh_data import Assignment
+from agh.agh_data import SubmissionFileData
+
+
+@pytest.fixture(params=["orjson", "json"])
+def codec_backend(request, monkeypatch):
+    if request.param == "orjson":
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(json_codec, "orjson", None)
+    assert json_codec.backend() == request.param
+    return request.param
+
+
+DATA = {"a": [1, 2.5, None, True], "b": {"c": "dé"}, "d": ""}
+
+
+def test_round_trip(codec_backend):
+    for indent in (json_codec.HUMAN_INDENT, json_codec.COMPACT, 4):
+        raw = json_codec.dumps(DATA, indent=indent)
+        assert isinstance(raw, bytes)
+        assert json_codec.loads(raw) == DATA
+        assert json.loads(raw) == DATA
+
+
+def test_compact_has_no_whitespace(codec_backend):
+    raw = json_codec.dumps(DATA, indent=json_codec.COMPACT)
+    assert b"\n" not in raw
+    assert b": " not in raw
+    assert b"\n  " in json_codec.dumps(DATA)
+
+
+def test_assignment_save_load(codec_backend, tmp_path: Path):
+    a = Assignment(tmp_path, _name="codec")
+    a.addRequiredFile(SubmissionFileData(path=Path("main.c")))
+    a.save(indent=json_codec.COMPACT)
+    assert b"\n" not in a.file.read_bytes()
+    assert Assignment.load(tmp_path) == a
+    a.save()
+    assert Assignment.load(a.file) == a
+
+
+def test_atomic_dump_concurrent(tmp_path: Path):
+    target = tmp_path / "data.json"
+    target.write_bytes(b"{}")
+    target.chmod(0o640)
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda i: json_codec.dump_file(target, {"writer": i, **DATA}, atomic=True), range(64)))
+    assert json_codec.load_file(target)["a"] == DATA["a"]
+    assert target.stat().st_mode & 0o777 == 0o640
+    assert [p.name for p in tmp_path.iterdir()] == ["data.json"]
+
+
+def test_atomic_dump_failure_cleans_up(tmp_path: Path, monkeypatch):
+    target = tmp_path / "data.json"
+    target.write_bytes(b"{}")
+
+    def fail_replace(self, target):
+        raise OSError("no space left")
+
+    monkeypatch.setattr(Path, "replace", fail_replace)
+    with pytest.raises(OSError, match="no space left"):
+        json_codec.dump_file(target, DATA, atomic=True)
+    assert [p.name for p in tmp_path.iterdir()] == ["data.json"]
+    assert target.read_bytes() == b"{}"
+
+
+def test_save_is_atomic(tmp_path: Path, monkeypatch):
+    a = Assignment(tmp_path, _name="codec")
+    a.save()
+    saved = a.file.read_bytes()
+    assert a.file.stat().st_mode & 0o777 == 0o666 & ~json_codec._UMASK
+
+    def fail_replace(self, target):
+        raise OSError("killed")
+
+    a._name = "renamed"
+    monkeypatch.setattr(Path, "replace", fail_replace)
+    with pytest.raises(OSError, match="killed"):
+        a.save()
+    # The old contents are left whole, and no temporary file is left behind.
+    assert a.file.read_bytes() == saved
+    assert [p.name for p in tmp_path.iterdir() if p.name.endswith(".tmp")] == []
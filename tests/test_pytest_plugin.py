@@ -0,0 +1,74 @@
+import json
+import os
+import subprocess
+import sys
+
+from agh.agh_data import PYTEST_EVENTS_FD_ENV
+
+
+def test_agh_submission_parametrizes(tmp_path):
+    tests_dir = tmp_path / "tests"
+    tests_dir.mkdir()
+    (tests_dir / "test_sample.py").write_text(
+        "def test_first(agh_submission_dir):\n"
+        "    print('first', agh_submission_dir.name)\n"
+        "def test_second(agh_submission_dir):\n"
+        "    print('second', agh_submission_dir.name)\n"
+        "def test_plain():\n"
+        "    pass\n"
+    )
+    for name in ("alice", "bob"):
+        (tmp_path / name).mkdir()
+
+    res = subprocess.run(
+        [sys.executable, "-m", "pytest", "-v", "-p", "no:cacheprovider", "--agh-submission", "alice", "--agh-submission", "bob", "tests"],
+        cwd=tmp_path,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+
+    assert res.returncode == 0, res.stdout
+    ran = [line.split()[0].split("::")[1] for line in res.stdout.splitlines() if " PASSED" in line]
+    # Collected once, run per submission, grouped by submission. Tests without the agh fixtures run once.
+    assert ran == ["test_first[agh=alice]", "test_second[agh=alice]", "test_first[agh=bob]", "test_second[agh=bob]", "test_plain"]
+
+
+def test_agh_events(tmp_path):
+    (tmp_path / "test_sample.py").write_text(
+        "import pytest\n"
+        "def test_pass(agh_submission_dir):\n"
+        "    pass\n"
+        "def test_fail(agh_submission_dir):\n"
+        "    assert agh_submission_dir.name == 'alice'\n"
+        "@pytest.mark.skip\n"
+        "def test_skip():\n"
+        "    pass\n"
+    )
+    for name in ("alice", "bob"):
+        (tmp_path / name).mkdir()
+    events_r, events_w = os.pipe()
+    try:
+        subprocess.run(
+            [sys.executable, "-m", "pytest", "-p", "no:cacheprovider", "--agh", "--agh-submission", "alice", "--agh-submission", "bob"],
+            cwd=tmp_path,
+            capture_output=True,
+            check=False,
+            pass_fds=(events_w,),
+            env={**os.environ, PYTEST_EVENTS_FD_ENV: str(events_w)},
+        )
+    finally:
+        os.close(events_w)
+    with os.fdopen(events_r) as events_file:
+        events = [json.loads(line) for line in events_file]
+
+    assert events[0] == {"event": "collected", "count": 5, "submissions": {"alice": 2, "bob": 2}}
+    finished = {(event["nodeid"].split("::")[1], event["submission"]): event["outcome"] for event in events if event["event"] == "finish"}
+    assert finished == {
+        ("test_pass[agh=alice]", "alice"): "passed",
+        ("test_fail[agh=alice]", "alice"): "passed",
+        ("test_pass[agh=bob]", "bob"): "passed",
+        ("test_fail[agh=bob]", "bob"): "failed",
+        ("test_skip", None): "skipped",
+    }
+    assert [event["event"] for event in events[1:3]] == ["start", "finish"]
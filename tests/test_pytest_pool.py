@@ -0,0 +1,133 @@
+import asyncio
+import json
+import os
+import signal
+import socket
+
+import pytest
+
+from agh.agh_data import PYTEST_EVENTS_FD_ENV
+from agh.pytest_pool import ForkServer
+from agh.pytest_pool import read_pipe
+
+
+@pytest.fixture
+def test_dir(tmp_path):
+    (tmp_path / "test_sample.py").write_text(
+        "import time\ndef test_pass():\n    assert True\ndef test_fail():\n    assert False\ndef test_slow():\n    time.sleep(30)\n"
+    )
+    return tmp_path
+
+
+async def _collect(proc) -> tuple[list[str], int]:
+    lines = []
+    while line := await proc.stdout.readline():
+        lines.append(line.decode().rstrip())
+    await proc.stderr.read()
+    return lines, await proc.wait()
+
+
+def test_fork_server_runs_pytest(test_dir):
+    async def main():
+        async with ForkServer() as server:
+            runs = [
+                await server.run(["-v", "-p", "no:cacheprovider", "test_sample.py", "-k", keyword], cwd=test_dir)
+                for keyword in ("test_pass", "test_fail")
+            ]
+            return await asyncio.gather(*(_collect(run) for run in runs))
+
+    (pass_lines, pass_code), (fail_lines, fail_code) = asyncio.run(main())
+    assert pass_code == 0
+    assert any("test_pass PASSED" in line for line in pass_lines)
+    assert fail_code == 1
+    assert any("test_fail FAILED" in line for line in fail_lines)
+
+
+def test_fork_server_kill(test_dir):
+    async def main():
+        async with ForkServer() as server:
+            run = await server.run(["-p", "no:cacheprovider", "test_sample.py", "-k", "test_slow"], cwd=test_dir)
+            assert os.getpgid(run.pid) == run.pid
+            os.killpg(run.pid, signal.SIGKILL)
+            return await asyncio.wait_for(_collect(run), 10)
+
+    _lines, returncode = asyncio.run(main())
+    assert returncode == -signal.SIGKILL
+
+
+def test_fork_server_fd_env(test_dir):
+    async def main():
+        async with ForkServer() as server:
+            events_r, events_w = os.pipe()
+            try:
+                run = await server.run(
+                    ["-p", "no:cacheprovider", "--agh", "test_sample.py", "-k", "test_pass"],
+                    cwd=test_dir,
+                    fd_env={PYTEST_EVENTS_FD_ENV: events_w},
+                )
+            finally:
+                os.close(events_w)
+            events = await read_pipe(events_r)
+            _lines, returncode = await _collect(run)
+            return [json.loads(line) async for line in events], returncode
+
+    events, returncode = asyncio.run(main())
+    assert returncode == 0
+    assert [(event["event"], event.get("outcome")) for event in events] == [("collected", None), ("start", None), ("finish", "passed")]
+
+
+async def _wait_gone(pid: int):
+    for _ in range(100):
+        try:
+            os.killpg(pid, 0)
+        except ProcessLookupError:
+            return
+        await asyncio.sleep(0.1)
+    pytest.fail(f"Process group {pid} is still running.")
+
+
+def test_fork_server_cancel_after_fork(test_dir, monkeypatch):
+    killed = []
+    killpg = os.killpg
+
+    async def cancelled_read_pipe(fd):
+        # The pid is known by now: cancel as if Ctrl-C came in before the run was returned.
+        raise asyncio.CancelledError
+
+    def recording_killpg(pgid, sig):
+        killed.append(pgid)
+        killpg(pgid, sig)
+
+    async def main():
+        async with ForkServer() as server:
+            monkeypatch.setattr("agh.pytest_pool.read_pipe", cancelled_read_pipe)
+            monkeypatch.setattr("agh.pytest_pool.os.killpg", recording_killpg)
+            with pytest.raises(asyncio.CancelledError):
+                await server.run(["-p", "no:cacheprovider", "test_sample.py", "-k", "test_slow"], cwd=test_dir)
+            monkeypatch.undo()
+            assert len(killed) == 1
+            await _wait_gone(killed[0])
+
+    asyncio.run(main())
+
+
+def test_fork_server_client_disconnect(test_dir):
+    async def main():
+        async with ForkServer() as server:
+            stdout_r, stdout_w = os.pipe()
+            stderr_r, stderr_w = os.pipe()
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            with sock:
+                sock.connect(str(server.socket_path))
+                message = {"args": ["-p", "no:cacheprovider", "test_sample.py", "-k", "test_slow"], "cwd": str(test_dir), "fd_env": []}
+                socket.send_fds(sock, [json.dumps(message).encode() + b"\n"], [stdout_w, stderr_w])
+                os.close(stdout_w)
+                os.close(stderr_w)
+                pid = json.loads(sock.makefile().readline())["pid"]
+                assert os.getpgid(pid) == pid
+            # Closing the connection without waiting for the result kills the run.
+            await _wait_gone(pid)
+            os.close(stdout_r)
+            os.close(stderr_r)
+
+    asyncio.run(main())
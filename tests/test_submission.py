@@ -1,6 +1,8 @@
 import os
+import tarfile
 import tempfile
 import unittest
+import zipfile
 from dataclasses import asdict
 from pathlib import Path
 
@@ -9,6 +11,7 @@ import pytest
 from agh.agh_data import Assignment
 from agh.agh_data import Submission
 from agh.agh_data import SubmissionData
+from agh.agh_data import SubmissionFileData
 
 
 class TestSubmissionData(unittest.TestCase):
@@ -163,5 +166,216 @@ class TestTarSubmission(TestSubmission):
             )
 
 
+@pytest.fixture
+def saved_submission(tmp_path):
+    assignment = Assignment(tmp_path)
+    assignment.createMissingDirectories()
+    sub_file = assignment.unprocessed_dir / "dirty.txt"
+    sub_file.touch()
+    return Submission.new(assignment, sub_file).save()
+
+
+@pytest.fixture
+def count_writes(monkeypatch):
+    from agh import json_codec
+
+    writes = []
+    orig_dump_file = json_codec.dump_file
+
+    def dump_file(filepath, *args, **kwargs):
+        writes.append(filepath)
+        return orig_dump_file(filepath, *args, **kwargs)
+
+    monkeypatch.setattr(json_codec, "dump_file", dump_file)
+    return writes
+
+
+def test_unchanged_submission_skips_save(saved_submission, count_writes):
+    assert not saved_submission.is_dirty
+    saved_submission.delWarning("crash_detected").delError("crash_detection_issue").save()
+    assert count_writes == []
+
+    saved_submission.addWarning("crash_detected", "It crashed.")
+    saved_submission.addWarning("crash_detected", "It crashed.")
+    assert len(count_writes) == 1
+
+    saved_submission.delWarning("crash_detected")
+    saved_submission.delWarning("crash_detected")
+    assert len(count_writes) == 2
+    assert Submission.load(saved_submission.evaluation_directory).warnings == []
+
+
+def test_loaded_submission_is_clean(saved_submission, count_writes):
+    loaded = Submission.load(saved_submission.evaluation_directory)
+    assert not loaded.is_dirty
+    loaded.setMetadata("TEST_INFO", "value", value=1).save()
+    loaded.setMetadata("TEST_INFO", "value", value=1).save()
+    assert len(count_writes) == 1
+
+    loaded.section = "A"
+    assert loaded.is_dirty
+    loaded.save()
+    assert len(count_writes) == 2
+    assert Submission.load(saved_submission.evaluation_directory).section == "A"
+
+
+def test_deleted_file_is_rewritten(saved_submission, count_writes):
+    (saved_submission.evaluation_directory / Submission.SUBMISSION_FILE_NAME).unlink()
+    saved_submission.save()
+    assert len(count_writes) == 1
+
+
+def test_journal_appends_metadata(saved_submission, count_writes):
+    loaded = Submission.load(saved_submission.evaluation_directory).enableJournal()
+    loaded.addWarning("render issue", "Render failed.").addError("render error", "Quarto failed.")
+    loaded.setMetadata("TEST_INFO", "initial_build_success", value=True).save()
+    loaded.delWarning("render issue")
+    assert count_writes == []
+    assert loaded.journal_file.exists()
+
+    replayed = Submission.load(saved_submission.evaluation_directory)
+    assert replayed.warnings == []
+    assert replayed._getErrWarnList("errors") == ["Quarto failed."]
+    assert replayed.getMetadata("TEST_INFO", "initial_build_success") is True
+    assert not replayed.is_dirty
+
+    replayed.compactJournal()
+    assert not replayed.journal_file.exists()
+    assert len(count_writes) == 1
+    assert Submission.load(saved_submission.evaluation_directory) == replayed
+
+
+def test_journal_torn_record_and_full_save(saved_submission):
+    loaded = Submission.load(saved_submission.evaluation_directory).enableJournal()
+    loaded.addWarning("first", "kept")
+    with loaded.journal_file.open("ab") as f:
+        f.write(b'{"set": ["TEST_INFO", "torn"')
+    assert Submission.load(saved_submission.evaluation_directory).warnings == ["kept"]
+
+    # Changing a regular field needs a full save, which also replaces the journal.
+    loaded.section = "B"
+    loaded.addWarning("second", "also kept")
+    assert not loaded.journal_file.exists()
+    reloaded = Submission.load(saved_submission.evaluation_directory)
+    assert reloaded.section == "B"
+    assert reloaded.warnings == ["kept", "also kept"]
+
+
+def test_journal_compacts_past_threshold(saved_submission, monkeypatch):
+    monkeypatch.setattr(Submission, "JOURNAL_COMPACT_SIZE", 200)
+    loaded = Submission.load(saved_submission.evaluation_directory).enableJournal()
+    for idx in range(10):
+        loaded.addWarning(f"warning {idx}", "x" * 20)
+    assert not loaded.journal_file.exists() or loaded.journal_file.stat().st_size <= 200
+    assert len(Submission.load(saved_submission.evaluation_directory).warnings) == 10
+
+
+def test_batch_saves_once(saved_submission, count_writes):
+    with saved_submission.batch():
+        saved_submission.addWarning("render issue", "Render failed.").addError("render error", "Quarto failed.")
+        with saved_submission.batch():
+            saved_submission.setMetadata("TEST_INFO", "initial_build_success", value=False)
+        assert count_writes == []
+    assert len(count_writes) == 1
+
+    with saved_submission.batch():
+        saved_submission.delWarning("render issue").delError("render error").delWarning("render issue")
+    assert len(count_writes) == 2
+
+    with saved_submission.batch():
+        saved_submission.delWarning("render issue").save()
+    assert len(count_writes) == 2
+
+    loaded = Submission.load(saved_submission.evaluation_directory)
+    assert loaded.warnings == []
+    assert loaded.getMetadata("TEST_INFO", "initial_build_success") is False
+
+
+def test_batch_saves_on_error(saved_submission):
+    with pytest.raises(RuntimeError), saved_submission.batch():
+        saved_submission.addWarning("crash_detected", "It crashed.")
+        raise RuntimeError("test")
+    assert Submission.load(saved_submission.evaluation_directory).warnings == ["It crashed."]
+
+
+def test_extraction_limits_warning(tmp_path):
+    assignment = Assignment(tmp_path)
+    assignment.createMissingDirectories()
+    assignment._options.extract_max_bytes = 1000
+    src = tmp_path / "src"
+    (src / ".git").mkdir(parents=True)
+    (src / ".git" / "HEAD").write_text("ref")
+    (src / "main.c").write_text("int main() {}")
+    (src / "big.bin").write_bytes(os.urandom(2000))
+    sub_file = assignment.unprocessed_dir / "bob.tar.gz"
+    with tarfile.open(sub_file, "w:gz") as tar:
+        for f in sorted(src.iterdir()):
+            tar.add(f, arcname=f.name)
+
+    s1 = Submission.new(assignment, sub_file, override_anon=False)
+    assert (s1.as_submitted_dir / "main.c").exists()
+    assert not (s1.as_submitted_dir / "big.bin").exists()
+    assert not (s1.as_submitted_dir / ".git").exists()
+    [warning] = s1.warnings
+    assert "`big.bin`" in warning
+    assert "`.git`: ignored" in warning
+
+
+def test_triage(tmp_path):
+    assignment = Assignment(tmp_path)
+    assignment.createMissingDirectories()
+    assignment.addRequiredFile(SubmissionFileData(path="main.c")).addRequiredFile(SubmissionFileData(path="util.c"))
+    sub_file = assignment.unprocessed_dir / "bob.zip"
+    with zipfile.ZipFile(sub_file, "w") as zf:
+        zf.writestr("main.c", "int main() {}")
+        zf.writestr("assets/big.dat", "data")
+
+    s1 = Submission.new(assignment, sub_file, override_anon=False, triage=True).save()
+    assert s1.initial_missing_files == ["util.c"]
+    assert (s1.evaluation_directory / "main.c").read_text() == "int main() {}"
+    assert not (s1.as_submitted_dir / "assets").exists()
+
+    # The grader's fixes in the evaluation directory survive the deferred extraction.
+    (s1.evaluation_directory / "main.c").write_text("fixed")
+    loaded = Submission.load(s1.evaluation_directory, assignment=assignment)
+    assert loaded.extractDeferred()
+    assert (loaded.as_submitted_dir / "assets" / "big.dat").read_text() == "data"
+    assert (loaded.evaluation_directory / "main.c").read_text() == "fixed"
+    assert not Submission.load(s1.evaluation_directory, assignment=assignment).extractDeferred()
+    assert loaded.initial_missing_files == ["util.c"]
+
+
+def test_fix_incrementally(tmp_path):
+    assignment = Assignment(tmp_path)
+    assignment.createMissingDirectories()
+    assignment.addRequiredFile(SubmissionFileData(path="main.c")).addRequiredFile(SubmissionFileData(path="util.c"))
+    sub_file = assignment.unprocessed_dir / "bob.zip"
+    with zipfile.ZipFile(sub_file, "w") as zf:
+        zf.writestr("main.c", "int main() {}")
+        zf.writestr("util.c", "int util() {}")
+        zf.writestr("docs/readme.md", "readme")
+    s1 = Submission.new(assignment, sub_file, override_anon=False).save()
+    as_submitted = s1.as_submitted_dir
+    untouched_ino = (as_submitted / "docs" / "readme.md").stat().st_ino
+
+    (as_submitted / "util.c").unlink()
+    (s1.evaluation_directory / "util.c").unlink()
+    (s1.evaluation_directory / "main.c").write_text("fixed by the grader")
+    s1.fix(assignment)
+
+    assert (as_submitted / "util.c").read_text() == "int util() {}"
+    assert (s1.evaluation_directory / "util.c").read_text() == "int util() {}"
+    assert (s1.evaluation_directory / "main.c").read_text() == "fixed by the grader"
+    assert (as_submitted / "docs" / "readme.md").stat().st_ino == untouched_ino
+
+    # A changed submission file is post-processed from scratch.
+    s1.submission_file.chmod(0o600)
+    with zipfile.ZipFile(s1.submission_file, "w") as zf:
+        zf.writestr("main.c", "int main() { return 1; }")
+    s1.fix(assignment)
+    assert (s1.evaluation_directory / "main.c").read_text() == "int main() { return 1; }"
+    assert s1._fixIncrementally(assignment)
+
+
 if __name__ == "__main__":
     unittest.main()